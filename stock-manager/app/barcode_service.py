@@ -1,7 +1,13 @@
 import httpx
+import asyncio
+import time
+from collections import OrderedDict
 from typing import Optional, Dict, Any
 import logging
 
+from .database import db
+from .http_client import http_client
+
 logger = logging.getLogger(__name__)
 
 
@@ -17,8 +23,20 @@ def map_external_category_to_internal(external_category: str) -> str:
     Returns:
         Internal category or 'Otros' if no match found
     """
+    internal_category, keyword = match_external_category(external_category)
+    if keyword:
+        logger.info(f"Category mapping: '{external_category}' -> '{internal_category}' (matched: '{keyword}')")
+    elif external_category:
+        logger.info(f"Category mapping: '{external_category}' -> 'Otros' (no match)")
+    return internal_category
+
+
+def match_external_category(external_category: str):
+    """Silent core of map_external_category_to_internal: returns
+    (internal_category, matched_keyword or None). Used as-is by the bulk
+    OFF mirror import, where per-row logging would flood the log."""
     if not external_category:
-        return "Otros"
+        return "Otros", None
 
     category_lower = external_category.lower()
 
@@ -73,12 +91,10 @@ def map_external_category_to_internal(external_category: str) -> str:
     for internal_category, keywords in mappings.items():
         for keyword in keywords:
             if keyword in category_lower:
-                logger.info(f"Category mapping: '{external_category}' -> '{internal_category}' (matched: '{keyword}')")
-                return internal_category
+                return internal_category, keyword
 
     # No match found - return 'Otros'
-    logger.info(f"Category mapping: '{external_category}' -> 'Otros' (no match)")
-    return "Otros"
+    return "Otros", None
 
 
 OPENFOODFACTS_API = "https://world.openfoodfacts.org/api/v2/product/{barcode}.json"
@@ -90,6 +106,17 @@ HEADERS = {
     "User-Agent": "StockManager-HomeAssistant/1.0"
 }
 
+# Lookup cache. Answers are persisted in the barcode_cache table and mirrored
+# in a small in-process LRU so a rescan never leaves memory. Misses (no source
+# knows the barcode) are cached too, but for less time: OFF gets new products
+# every day. Expired entries are still served and refreshed in the background.
+CACHE_HIT_TTL = 30 * 24 * 3600
+CACHE_MISS_TTL = 24 * 3600
+_MEMO_SIZE = 1024
+
+_memo: "OrderedDict[str, tuple]" = OrderedDict()  # barcode -> (result, fetched_at)
+_refreshing: Dict[str, asyncio.Task] = {}
+
 
 async def _search_facts_api(barcode: str, client: httpx.AsyncClient, api_url: str, source_name: str) -> Dict[str, Any]:
     """Generic function to search in any Open Facts API"""
@@ -98,7 +125,7 @@ async def _search_facts_api(barcode: str, client: httpx.AsyncClient, api_url: st
         params = {"fields": "product_name,brands,categories,image_url,quantity,product_quantity,nutriments"}
 
         logger.info(f"Searching {source_name} for {barcode}...")
-        response = await client.get(url, headers=HEADERS, params=params, timeout=5.0)
+        response = await client.get(url, headers=HEADERS, params=params)
 
         if response.status_code == 404:
             logger.info(f"{source_name}: product not found (404) for {barcode}")
@@ -134,34 +161,242 @@ async def _search_facts_api(barcode: str, client: httpx.AsyncClient, api_url: st
             logger.info(f"{source_name} status is not 1 for {barcode}: {data.get('status')}")
     except Exception as e:
         logger.debug(f"{source_name} lookup failed for {barcode}: {e}")
+        # Timeouts / 5xx say nothing about the barcode — flag them so the
+        # miss isn't negative-cached.
+        return {"found": False, "error": True}
 
     return {"found": False}
 
 
-async def get_product_from_barcode(barcode: str) -> Dict[str, Any]:
+SOURCES = [
+    (OPENFOODFACTS_API, "Open Food Facts"),
+    (OPENBEAUTYFACTS_API, "Open Beauty Facts"),
+    (OPENPETFOODFACTS_API, "Open Pet Food Facts"),
+    (OPENPRODUCTFACTS_API, "Open Product Facts")
+]
+
+# Circuit breaker: after BREAKER_THRESHOLD consecutive errors a source is
+# skipped for BREAKER_COOLDOWN seconds, then gets one trial request again.
+BREAKER_THRESHOLD = 3
+BREAKER_COOLDOWN = 60.0
+
+_source_stats: Dict[str, Dict[str, Any]] = {
+    name: {
+        "requests": 0, "hits": 0, "misses": 0, "errors": 0,
+        "total_ms": 0.0, "last_ms": None,
+        "consecutive_errors": 0, "open_until": 0.0,
+    }
+    for _, name in SOURCES
+}
+
+
+# OFF asks API clients to stay under 100 product reads/min per host. Each
+# source splits that budget over two limiters: background lookups (macro
+# back-fill, stale-entry refreshes) get BACKGROUND_RATE_PER_MIN and
+# interactive scans the rest, so a scan at the till never queues behind a
+# back-fill and both together stay under the per-host limit.
+RATE_LIMIT_PER_MIN = 100
+BACKGROUND_RATE_PER_MIN = 60
+
+
+class _HostRateLimiter:
+    """Spaces request starts at least 60/per_minute seconds apart."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute
+        self._next_at = 0.0
+
+    async def acquire(self):
+        now = time.monotonic()
+        wait = self._next_at - now
+        self._next_at = max(now, self._next_at) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+_rate_limiters: Dict[str, _HostRateLimiter] = {
+    name: _HostRateLimiter(RATE_LIMIT_PER_MIN - BACKGROUND_RATE_PER_MIN) for _, name in SOURCES
+}
+_background_limiters: Dict[str, _HostRateLimiter] = {
+    name: _HostRateLimiter(BACKGROUND_RATE_PER_MIN) for _, name in SOURCES
+}
+
+
+def _source_available(source_name: str) -> bool:
+    return _source_stats[source_name]["open_until"] <= time.monotonic()
+
+
+async def _timed_search(barcode: str, client: httpx.AsyncClient, api_url: str, source_name: str,
+                        background: bool = False) -> Dict[str, Any]:
+    """_search_facts_api plus latency/error accounting and breaker state."""
+    stats = _source_stats[source_name]
+    await (_background_limiters if background else _rate_limiters)[source_name].acquire()
+    start = time.monotonic()
+    result = await _search_facts_api(barcode, client, api_url, source_name)
+    elapsed_ms = (time.monotonic() - start) * 1000
+    stats["requests"] += 1
+    stats["total_ms"] += elapsed_ms
+    stats["last_ms"] = round(elapsed_ms, 1)
+    if result.get("error"):
+        stats["errors"] += 1
+        stats["consecutive_errors"] += 1
+        if stats["consecutive_errors"] >= BREAKER_THRESHOLD:
+            stats["open_until"] = time.monotonic() + BREAKER_COOLDOWN
+            logger.warning(f"{source_name}: {stats['consecutive_errors']} consecutive errors, "
+                           f"skipping it for {BREAKER_COOLDOWN:.0f}s")
+    else:
+        stats["consecutive_errors"] = 0
+        stats["hits" if result["found"] else "misses"] += 1
+    return result
+
+
+def get_source_stats() -> list:
+    """Per-source latency / error counters and circuit breaker state."""
+    now = time.monotonic()
+    out = []
+    for _, name in SOURCES:
+        st = _source_stats[name]
+        out.append({
+            "source": name,
+            "requests": st["requests"],
+            "hits": st["hits"],
+            "misses": st["misses"],
+            "errors": st["errors"],
+            "avg_ms": round(st["total_ms"] / st["requests"], 1) if st["requests"] else None,
+            "last_ms": st["last_ms"],
+            "consecutive_errors": st["consecutive_errors"],
+            "open": st["open_until"] > now,
+            "retry_in_s": max(0.0, round(st["open_until"] - now, 1)),
+        })
+    return out
+
+
+async def _fetch_from_sources(barcode: str, background: bool = False) -> Dict[str, Any]:
     """
-    Fetch product information from multiple sources with fallback.
+    Query every source concurrently but honour their priority: the answer is
+    the first positive result in SOURCES order. As soon as a source answers
+    positively the lower-priority requests still in flight are cancelled, so
+    a hit costs one round-trip and a miss costs the slowest source instead of
+    the sum of all four. `background` lookups use their own rate limiters.
     """
-    sources = [
-        (OPENFOODFACTS_API, "Open Food Facts"),
-        (OPENBEAUTYFACTS_API, "Open Beauty Facts"),
-        (OPENPETFOODFACTS_API, "Open Pet Food Facts"),
-        (OPENPRODUCTFACTS_API, "Open Product Facts")
-    ]
+    active = [(url, name) for url, name in SOURCES if _source_available(name)]
+    if not active:
+        return {"found": False, "error": True}
 
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            for api_url, source_name in sources:
-                result = await _search_facts_api(barcode, client, api_url, source_name)
+        client = http_client.get()
+        tasks = [
+            asyncio.create_task(_timed_search(barcode, client, url, name, background))
+            for url, name in active
+        ]
+        try:
+            errored = len(active) < len(SOURCES)
+            for task in tasks:
+                result = await task
                 if result["found"]:
                     return result
-
-            return {"found": False}
+                errored = errored or result.get("error", False)
+            return {"found": False, "error": True} if errored else {"found": False}
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
     except httpx.RequestError as e:
         logger.error(f"Request error fetching barcode {barcode}: {e}")
-        return {"found": False}
+        return {"found": False, "error": True}
     except Exception as e:
         logger.error(f"Error fetching product information for barcode {barcode}: {e}")
-        return {"found": False}
+        return {"found": False, "error": True}
+
+
+def _remember(barcode: str, result: Dict[str, Any], fetched_at: float):
+    _memo[barcode] = (result, fetched_at)
+    _memo.move_to_end(barcode)
+    while len(_memo) > _MEMO_SIZE:
+        _memo.popitem(last=False)
+
+
+async def _lookup_and_store(barcode: str, background: bool = False) -> Dict[str, Any]:
+    """Hit the network and cache the answer, unless every miss was an error."""
+    result = await _fetch_from_sources(barcode, background)
+    if result["found"] or not result.get("error"):
+        fetched_at = time.time()
+        _remember(barcode, result, fetched_at)
+        try:
+            await db.put_barcode_cache(barcode, result, fetched_at)
+        except Exception as e:
+            logger.warning(f"Could not persist barcode cache for {barcode}: {e}")
+    return result
+
+
+def _schedule_refresh(barcode: str):
+    """Revalidate an expired entry in the background, once per barcode."""
+    if barcode in _refreshing:
+        return
+
+    async def _run():
+        try:
+            await _lookup_and_store(barcode, background=True)
+        except Exception as e:
+            logger.debug(f"Background refresh failed for {barcode}: {e}")
+        finally:
+            _refreshing.pop(barcode, None)
+
+    _refreshing[barcode] = asyncio.create_task(_run())
+
+
+def clear_memo():
+    """Drop the in-process layer, e.g. after an OFF mirror import turned
+    remembered misses into hits."""
+    _memo.clear()
+
+
+def _serve(barcode: str, result: Dict[str, Any], fetched_at: float) -> Dict[str, Any]:
+    ttl = CACHE_HIT_TTL if result.get("found") else CACHE_MISS_TTL
+    if time.time() - fetched_at > ttl:
+        _schedule_refresh(barcode)
+    return dict(result)
+
+
+async def get_product_from_barcode(barcode: str, background: bool = False) -> Dict[str, Any]:
+    """
+    Product information for `barcode`, from local data when possible.
+
+    Order: in-process memo, cached hit, offline OFF mirror, cached miss, and
+    only then the network. Fresh entries are returned as-is; expired ones are
+    returned immediately while a background task refreshes them
+    (stale-while-revalidate). Only a barcode never seen before waits on the
+    network. Bulk callers pass `background=True` so their requests go
+    through the background rate limiters and never delay a scan.
+    """
+    entry = _memo.get(barcode)
+    if entry is not None:
+        _memo.move_to_end(barcode)
+        return _serve(barcode, *entry)
+
+    try:
+        cached = await db.get_barcode_cache(barcode)
+    except Exception as e:
+        logger.warning(f"Barcode cache read failed for {barcode}: {e}")
+        cached = None
+    if cached and cached["found"]:
+        _remember(barcode, cached["result"], cached["fetched_at"])
+        return _serve(barcode, cached["result"], cached["fetched_at"])
+
+    try:
+        mirrored = await db.get_off_mirror_product(barcode)
+    except Exception as e:
+        logger.warning(f"OFF mirror read failed for {barcode}: {e}")
+        mirrored = None
+    if mirrored:
+        _remember(barcode, mirrored, time.time())
+        return dict(mirrored)
+
+    if cached:
+        _remember(barcode, cached["result"], cached["fetched_at"])
+        return _serve(barcode, cached["result"], cached["fetched_at"])
 
+    result = await _lookup_and_store(barcode, background)
+    return {k: v for k, v in result.items() if k != "error"}
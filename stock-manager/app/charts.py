@@ -0,0 +1,110 @@
+"""
+Charts aggregation.
+
+Backs GET /api/charts: the rows for the range come from
+Database.get_chart_rows; everything here is NumPy over those rows.
+
+- kcal: one value per day with consumption (same as /stats/daily-kcal).
+  Ranges longer than `points` days are reduced to bucket means, which keeps
+  the average the charts view shows.
+- weight: the logged weights plus a trailing WEIGHT_WINDOW_DAYS moving
+  average (calendar days, so gaps in the log don't stretch the window).
+  Reduced with LTTB (largest triangle three buckets), which keeps the
+  peaks and dips that bucket means would flatten.
+- prices: per product, the price_history observations, also LTTB-reduced,
+  with count/min/max/last over the full range.
+"""
+from __future__ import annotations
+
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+MAX_POINTS = 120         # default points per series
+WEIGHT_WINDOW_DAYS = 7   # moving average window
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the LTTB subsample of (x, y): the first and last points
+    plus, for each of threshold - 2 buckets, the point forming the largest
+    triangle with the previous pick and the next bucket's mean."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    picked = np.empty(threshold, dtype=int)
+    picked[0], picked[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        picked[i + 1] = a
+    return picked
+
+
+def bucket_means(values: np.ndarray, buckets: int) -> tuple:
+    """(first index, mean) of `buckets` contiguous, near-equal slices."""
+    if buckets >= len(values):
+        return np.arange(len(values)), values
+    parts = np.array_split(np.arange(len(values)), buckets)
+    return np.array([p[0] for p in parts]), np.array([values[p].mean() for p in parts])
+
+
+def trailing_mean(days: np.ndarray, values: np.ndarray, window: int) -> np.ndarray:
+    """Mean of the values whose day falls in (day - window, day], for each
+    day of a sorted array of day ordinals."""
+    csum = np.concatenate([[0.0], np.cumsum(values)])
+    start = np.searchsorted(days, days - window + 1, side='left')
+    end = np.arange(1, len(days) + 1)
+    return (csum[end] - csum[start]) / (end - start)
+
+
+def _timestamp(iso: str) -> float:
+    try:
+        return datetime.fromisoformat(iso[:19]).timestamp()
+    except ValueError:
+        return datetime.fromisoformat(iso[:10]).timestamp()
+
+
+def build_charts(kcal_rows: List[dict], weight_rows: List[dict], price_rows: List[dict],
+                 since: Optional[str], points: int = MAX_POINTS) -> dict:
+    """Series from Database.get_chart_rows. `weight_rows` may start up to
+    WEIGHT_WINDOW_DAYS before `since` (feeds the first averages) and
+    `price_rows` come ordered by barcode, observed_at. Pure CPU."""
+    result: dict = {}
+
+    kcal = np.array([r['kcal'] or 0.0 for r in kcal_rows], dtype=float)
+    idx, means = bucket_means(kcal, points)
+    result['kcal'] = [{'date': kcal_rows[i]['date'], 'kcal': round(float(v), 1)} for i, v in zip(idx, means)]
+    result['kcal_avg'] = round(float(kcal.mean()), 1) if len(kcal) else 0.0
+
+    if weight_rows:
+        days = np.array([date.fromisoformat(r['date'][:10]).toordinal() for r in weight_rows])
+        weights = np.array([r['weight'] for r in weight_rows], dtype=float)
+        avg = trailing_mean(days, weights, WEIGHT_WINDOW_DAYS)
+        keep = np.arange(len(days))
+        if since:
+            keep = keep[days >= date.fromisoformat(since).toordinal()]
+        picked = keep[lttb(days[keep].astype(float), weights[keep], points)] if len(keep) else keep
+        result['weight'] = [{'date': weight_rows[i]['date'], 'weight': float(weights[i]),
+                             'avg': round(float(avg[i]), 2)} for i in picked]
+    else:
+        result['weight'] = []
+
+    by_barcode: Dict[str, List[dict]] = {}
+    for r in price_rows:
+        by_barcode.setdefault(r['barcode'], []).append(r)
+    prices, summary = {}, {}
+    for barcode, rows in by_barcode.items():
+        t = np.array([_timestamp(r['observed_at']) for r in rows])
+        v = np.array([r['unit_price'] for r in rows], dtype=float)
+        prices[barcode] = [{'observed_at': rows[i]['observed_at'], 'unit_price': float(v[i])}
+                           for i in lttb(t, v, points)]
+        summary[barcode] = {'count': len(v), 'min': float(v.min()), 'max': float(v.max()), 'last': float(v[-1])}
+    result['prices'] = prices
+    result['price_summary'] = summary
+    return result
@@ -1,20 +1,166 @@
 import aiosqlite
 import os
+import re
 import json
-from datetime import datetime, date
-from typing import List, Optional
+import statistics
+import unicodedata
+from datetime import datetime, date, timedelta
+from typing import Dict, List, Optional
 from .models import (
-    Product, ProductCreate, StockUpdate, ProductUpdate, Batch, BatchUpdate, BatchStockUpdate,
-    MacroGoals, MacroGoalsUpdate, Ingredient, Recipe, RecipeCreate, DietPlan, DietPlanCreate,
+    Product, ProductCreate, StockUpdate, BulkStockUpdate, ProductUpdate, Batch, BatchUpdate, BatchStockUpdate,
+    MacroGoals, MacroGoalsUpdate, Ingredient, Recipe, RecipeCreate, RecipeAvailability, DietPlan, DietPlanCreate,
     BodyWeight, BodyWeightCreate,
     Scale, ScaleCreate, ScaleUpdate, ScaleWeight, ScaleEvent,
     PendingRefill, PendingRefillCreate, PendingRefillResolve,
-    PriceRecord, PriceHistoryEntry,
-    CookSession, CookSessionStep, CookSessionCreate, CookStepView,
+    PriceRecord, PriceHistoryEntry, PriceHistorySeries,
+    CookSession, CookSessionStep, CookSessionCreate, CookSessionComplete, CookStepView,
+    TicketAliasLink, CodeResolution,
+)
+from .gtin import (
+    normalize_gtin, gtin_candidates, variable_measure_prefix, decode_variable_measure,
 )
 
 DATABASE_PATH = os.getenv('DATABASE_PATH', '/data/stock_manager/stock.db')
 
+
+def normalize_ticket_line(text: str) -> str:
+    """Canonical key for a ticket line, shared by the OCR and PDF flows.
+
+    Mirrors the frontend's _parseLine + _normalize: drops a leading "2 x",
+    loose weights, prices and leading article codes, then folds accents and
+    punctuation. "2 x LECHE DESN. PROT 1L 1,35" and "LECHE DESN. PROT 1L"
+    both end up as "leche desn prot 1l", so next week's ticket hits the same
+    alias even though the price changed. Weights go before prices (the price
+    pattern would eat "1,25" out of "1,250 kg"), so "PLATANO 1,250 kg 2,30"
+    and "PLATANO 0,874 kg 1,92" both become "platano"."""
+    name = (text or "").strip()
+    m = re.match(r"^(\d+)\s*[xX×]\s+(.+)", name)
+    if m:
+        name = m.group(2)
+    name = re.sub(r"\d+[,.]\d{1,3}\s*(kg|g|l|ml|cl|ud|uds)\b", "", name, flags=re.IGNORECASE)
+    name = re.sub(r"\d+[,.]\d{2}\s*€?", "", name)
+    name = re.sub(r"^\d{3,}\s+", "", name)
+    name = unicodedata.normalize("NFD", name.lower())
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    name = re.sub(r"[^a-z0-9 ]", "", name)
+    return re.sub(r"\s+", " ", name).strip()
+
+
+# Accent folding for the products_fts index. The trigram tokenizer only got
+# `remove_diacritics` in SQLite 3.45 (Alpine 3.19 ships 3.44), and the sync
+# triggers run on every connection, so a Python UDF is not an option either —
+# fold in plain SQL instead. Case is already folded by the tokenizer.
+# Spanish set only: every extra char is one more nested REPLACE and SQLite's
+# parser stack tops out a few dozen levels deep.
+_FTS_ACCENTS = {
+    "a": "áÁ", "e": "éÉ", "i": "íÍ", "o": "óÓ", "u": "úüÚÜ", "n": "ñÑ", "c": "çÇ",
+}
+
+
+def _fts_fold_sql(expr: str) -> str:
+    """Wrap a SQL expression in nested REPLACE()s that strip accents."""
+    for plain, accented in _FTS_ACCENTS.items():
+        for ch in accented:
+            expr = f"REPLACE({expr}, '{ch}', '{plain}')"
+    return expr
+
+
+def _fts_fold(text: str) -> str:
+    """Python twin of _fts_fold_sql, applied to search queries."""
+    for plain, accented in _FTS_ACCENTS.items():
+        for ch in accented:
+            text = text.replace(ch, plain)
+    return text
+
+
+def _fts_match_query(query: str) -> Optional[str]:
+    """Turn free text into an FTS5 MATCH expression: every word becomes a
+    quoted phrase (AND-ed). Trigram needs >= 3 chars per term, so shorter
+    words are dropped; returns None when nothing indexable is left."""
+    terms = [t for t in _fts_fold(query).split() if len(t) >= 3]
+    if not terms:
+        return None
+    return " ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def _code_kind(code: str) -> str:
+    """'prefix' for a bare 7-digit variable-weight article (`2302813`),
+    'alias' for anything else."""
+    return "prefix" if len(code) == 7 and code.isdigit() and code[0] == "2" else "alias"
+
+
+_PLAN_FIELDS = ("date", "meal_type", "recipe_id", "product_barcode", "custom_name", "quantity")
+
+
+def _plan_key(entry: tuple) -> tuple:
+    """Match key of a diet plan entry: quantities compare as floats (1 ==
+    1.0) but NULL stays NULL, so it neither matches nor turns into 0."""
+    *rest, quantity = entry
+    return (*rest, None if quantity is None else float(quantity))
+
+
+def diff_week_plans(stored: List[dict], entries: List[tuple]) -> tuple:
+    """(ids to delete, entries to insert) turning the `stored` diet_plans
+    rows into exactly `entries` (tuples in _PLAN_FIELDS order). A stored row
+    that matches an entry is kept, consumed rows first when `stored` comes
+    ordered that way; inserted entries are the caller's tuples as given."""
+    wanted: Dict[tuple, List[tuple]] = {}
+    for e in entries:
+        wanted.setdefault(_plan_key(e), []).append(e)
+    to_delete = []
+    for r in stored:
+        matches = wanted.get(_plan_key(tuple(r[f] for f in _PLAN_FIELDS)))
+        if matches:
+            matches.pop()
+        else:
+            to_delete.append(r["id"])
+    return to_delete, [e for es in wanted.values() for e in es]
+
+
+# Recipe rows with their cached per-serving macros (recipe_macros)
+RECIPE_SELECT = """
+    SELECT r.*, m.kcal AS macro_kcal, m.proteins AS macro_proteins,
+           m.carbs AS macro_carbs, m.fat AS macro_fat
+    FROM recipes r
+    LEFT JOIN recipe_macros m ON m.recipe_id = r.id
+"""
+
+
+def _recipe_macros_sql(ids: Optional[str] = None) -> str:
+    """Per-serving macros of the recipes in `ids` (a SQL list or subquery;
+    every recipe when None) as recipe_id, kcal, proteins, carbs, fat. Same
+    formula as window.recipeMacros: grams = qty, or qty * weight_g for 'uds'
+    products (100 g when unknown); totals split over max(1, servings). The
+    filter goes inside the ingredient subquery too, so a trigger reads only
+    the ingredients of the recipes it refreshes, through
+    idx_recipe_ingredients_recipe, instead of materializing all of them."""
+    inner = f"WHERE ri.recipe_id IN ({ids})" if ids else ""
+    outer = f"WHERE r.id IN ({ids})" if ids else ""
+    return f"""
+        SELECT r.id AS recipe_id,
+               COALESCE(SUM(i.kcal_100g * i.grams), 0) / 100.0 / MAX(1, COALESCE(r.servings, 1)) AS kcal,
+               COALESCE(SUM(i.proteins_100g * i.grams), 0) / 100.0 / MAX(1, COALESCE(r.servings, 1)) AS proteins,
+               COALESCE(SUM(i.carbs_100g * i.grams), 0) / 100.0 / MAX(1, COALESCE(r.servings, 1)) AS carbs,
+               COALESCE(SUM(i.fat_100g * i.grams), 0) / 100.0 / MAX(1, COALESCE(r.servings, 1)) AS fat
+        FROM recipes r
+        LEFT JOIN (
+            SELECT ri.recipe_id,
+                   CASE WHEN p.unit_type = 'uds'
+                        THEN ri.quantity * COALESCE(NULLIF(p.weight_g, 0), 100)
+                        ELSE ri.quantity END AS grams,
+                   COALESCE(p.kcal_100g, 0) AS kcal_100g,
+                   COALESCE(p.proteins_100g, 0) AS proteins_100g,
+                   COALESCE(p.carbs_100g, 0) AS carbs_100g,
+                   COALESCE(p.fat_100g, 0) AS fat_100g
+            FROM recipe_ingredients ri
+            JOIN products p ON p.barcode = ri.product_barcode
+            {inner}
+        ) i ON i.recipe_id = r.id
+        {outer}
+        GROUP BY r.id
+    """
+
+
 class Database:
     def __init__(self):
         self.db_path = DATABASE_PATH
@@ -107,6 +253,25 @@ class Database:
             if 'last_price_date' not in batch_cols:
                 await db.execute("ALTER TABLE batches ADD COLUMN last_price_date TEXT DEFAULT NULL")
 
+            # FIFO reads and the earliest-expiry view seek on (barcode, expiry)
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_batches_barcode_expiry ON batches(barcode, expiry_date)"
+            )
+            # Per product: the earliest expiry date among live batches and how
+            # much stock expires on that date — what "use it up" planning
+            # tries to cook first.
+            await db.execute("""
+                CREATE VIEW IF NOT EXISTS product_earliest_expiry AS
+                SELECT b.barcode, b.expiry_date AS earliest_expiry, SUM(b.quantity) AS qty
+                FROM batches b
+                WHERE b.quantity > 0
+                  AND b.expiry_date = (
+                      SELECT MIN(b2.expiry_date) FROM batches b2
+                      WHERE b2.barcode = b.barcode AND b2.quantity > 0
+                  )
+                GROUP BY b.barcode
+            """)
+
             # Create macro_goals table
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS macro_goals (
@@ -198,6 +363,41 @@ class Database:
             if 'freezer_expiry_days' not in recipe_cols:
                 await db.execute("ALTER TABLE recipes ADD COLUMN freezer_expiry_days INTEGER DEFAULT NULL")
 
+            # Tags and meal types as indexed join tables, so "recipes for
+            # breakfast" is an index lookup instead of decoding every row's
+            # JSON. position keeps the order the user typed them in.
+            # recipes.tags/meal_types stay as a mirror for older readers
+            # (same arrangement as product_codes / alt_barcodes).
+            async with db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('recipe_tags', 'recipe_meal_types')"
+            ) as cursor:
+                existing_label_tables = {row[0] for row in await cursor.fetchall()}
+            for table, col in (('recipe_tags', 'tag'), ('recipe_meal_types', 'meal_type')):
+                await db.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        recipe_id INTEGER NOT NULL,
+                        {col} TEXT NOT NULL,
+                        position INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (recipe_id, {col}),
+                        FOREIGN KEY (recipe_id) REFERENCES recipes(id) ON DELETE CASCADE
+                    ) WITHOUT ROWID
+                """)
+                await db.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{table}_{col} ON {table}({col}, recipe_id)"
+                )
+                # Migration: one-time copy of the legacy JSON arrays
+                if table not in existing_label_tables:
+                    json_col = 'tags' if col == 'tag' else 'meal_types'
+                    await db.execute(f"""
+                        INSERT OR IGNORE INTO {table} (recipe_id, {col}, position)
+                        SELECT r.id, TRIM(j.value), j.key
+                        FROM recipes r, json_each(
+                            CASE WHEN json_valid(r.{json_col}) AND json_type(r.{json_col}) = 'array'
+                                 THEN r.{json_col} ELSE '[]' END
+                        ) j
+                        WHERE j.type = 'text' AND TRIM(j.value) != ''
+                    """)
+
             # Create recipe_ingredients table
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS recipe_ingredients (
@@ -212,6 +412,85 @@ class Database:
                 )
             """)
 
+            # A stock change only touches the recipes that use that barcode
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_product ON recipe_ingredients(product_barcode)"
+            )
+
+            # Per-recipe availability against current stock, kept up to date
+            # by _refresh_recipe_availability. covered = fraction of product
+            # ingredients with enough stock for one batch; limiting_barcode
+            # the ingredient that runs out first; max_servings how many
+            # servings that stock makes (NULL when no ingredient is a product).
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS recipe_availability (
+                    recipe_id INTEGER PRIMARY KEY,
+                    ingredients INTEGER NOT NULL DEFAULT 0,
+                    covered REAL NOT NULL DEFAULT 1,
+                    limiting_barcode TEXT DEFAULT NULL,
+                    max_servings REAL DEFAULT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (recipe_id) REFERENCES recipes(id) ON DELETE CASCADE
+                )
+            """)
+
+            # Per-serving recipe macros, computed here instead of trusting
+            # whatever the client sent in recipes.kcal/... (formula in
+            # _recipe_macros_sql). recipe_macros is the cache the readers use,
+            # recomputed by the triggers below for exactly the recipes whose
+            # inputs changed. The triggers are dropped and recreated on every
+            # start so a change to the formula reaches existing installs; the
+            # old recipe_macros_live view is gone for the same reason.
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_recipe ON recipe_ingredients(recipe_id)"
+            )
+            await db.execute("DROP VIEW IF EXISTS recipe_macros_live")
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS recipe_macros (
+                    recipe_id INTEGER PRIMARY KEY,
+                    kcal REAL NOT NULL DEFAULT 0,
+                    proteins REAL NOT NULL DEFAULT 0,
+                    carbs REAL NOT NULL DEFAULT 0,
+                    fat REAL NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (recipe_id) REFERENCES recipes(id) ON DELETE CASCADE
+                )
+            """)
+            refresh_macros = """
+                INSERT OR REPLACE INTO recipe_macros (recipe_id, kcal, proteins, carbs, fat, updated_at)
+                SELECT recipe_id, kcal, proteins, carbs, fat, CURRENT_TIMESTAMP
+                FROM ({select});
+            """
+
+            def refresh(ids: str) -> str:
+                return refresh_macros.format(select=_recipe_macros_sql(ids))
+
+            by_product = "SELECT recipe_id FROM recipe_ingredients WHERE product_barcode = {}.barcode"
+            macro_cols = ('unit_type', 'weight_g', 'kcal_100g', 'proteins_100g', 'carbs_100g', 'fat_100g')
+            macro_changed = " OR ".join(f"old.{c} IS NOT new.{c}" for c in macro_cols)
+            recipe_macro_triggers = {
+                # Product side: only the recipes using that barcode
+                # (idx_recipe_ingredients_product). Stock syncs also UPDATE
+                # products, hence the WHEN.
+                "recipe_macros_product_au": (
+                    f"AFTER UPDATE OF {', '.join(macro_cols)} ON products WHEN {macro_changed}",
+                    refresh(by_product.format('new'))),
+                "recipe_macros_product_ai": ("AFTER INSERT ON products", refresh(by_product.format('new'))),
+                "recipe_macros_product_ad": ("AFTER DELETE ON products", refresh(by_product.format('old'))),
+                # Recipe side
+                "recipe_macros_ingredient_ai": ("AFTER INSERT ON recipe_ingredients", refresh("new.recipe_id")),
+                "recipe_macros_ingredient_au": (
+                    "AFTER UPDATE ON recipe_ingredients", refresh("old.recipe_id, new.recipe_id")),
+                "recipe_macros_ingredient_ad": ("AFTER DELETE ON recipe_ingredients", refresh("old.recipe_id")),
+                "recipe_macros_recipe_ai": ("AFTER INSERT ON recipes", refresh("new.id")),
+                "recipe_macros_recipe_au": ("AFTER UPDATE OF servings ON recipes", refresh("new.id")),
+                "recipe_macros_recipe_ad": (
+                    "AFTER DELETE ON recipes", "DELETE FROM recipe_macros WHERE recipe_id = old.id;"),
+            }
+            for name, (when, body) in recipe_macro_triggers.items():
+                await db.execute(f"DROP TRIGGER IF EXISTS {name}")
+                await db.execute(f"CREATE TRIGGER {name} {when} BEGIN {body} END")
+
             # Create diet_plans table
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS diet_plans (
@@ -228,6 +507,11 @@ class Database:
                 )
             """)
 
+            # Week save/reads filter by date range and diff per (date, meal)
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_diet_plans_date_meal ON diet_plans(date, meal_type)"
+            )
+
             # Create weight_log table
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS weight_log (
@@ -363,6 +647,192 @@ class Database:
                 "ON cook_session_steps(session_id, step_order)"
             )
 
+            # Full-text index over barcode / name / category / alt codes. Trigram
+            # tokenizer = substring search ("lech" finds "Leche entera"), same
+            # semantics as the old `query in name` scans but served by an index.
+            # Kept in sync by triggers, so every writer (API, import, Telegram)
+            # updates it without knowing it exists.
+            await db.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                    barcode, name, category, alt_barcodes,
+                    tokenize = 'trigram'
+                )
+            """)
+            fts_values = (
+                f"new.barcode, {_fts_fold_sql('new.name')}, "
+                f"{_fts_fold_sql('new.category')}, COALESCE(new.alt_barcodes, '')"
+            )
+            # Triggers and contents are rebuilt on every start: a later change
+            # to the folding (or to the triggers) reaches existing installs,
+            # and an index that drifted while they were missing is repaired
+            # even when its row count still matches. FTS5's 'rebuild' would
+            # only re-index the table's own folded copy, so it is refilled
+            # from products instead — a home catalog is a few hundred rows.
+            fts_triggers = {
+                "products_fts_ai": f"""AFTER INSERT ON products BEGIN
+                    INSERT INTO products_fts (barcode, name, category, alt_barcodes)
+                    VALUES ({fts_values});
+                END""",
+                "products_fts_ad": """AFTER DELETE ON products BEGIN
+                    DELETE FROM products_fts WHERE barcode = old.barcode;
+                END""",
+                "products_fts_au": f"""AFTER UPDATE OF barcode, name, category, alt_barcodes ON products BEGIN
+                    DELETE FROM products_fts WHERE barcode = old.barcode;
+                    INSERT INTO products_fts (barcode, name, category, alt_barcodes)
+                    VALUES ({fts_values});
+                END""",
+            }
+            for name, body in fts_triggers.items():
+                await db.execute(f"DROP TRIGGER IF EXISTS {name}")
+                await db.execute(f"CREATE TRIGGER {name} {body}")
+            await db.execute("DELETE FROM products_fts")
+            await db.execute(f"""
+                INSERT INTO products_fts (barcode, name, category, alt_barcodes)
+                SELECT {fts_values.replace('new.', 'p.')} FROM products p
+            """)
+
+            # Create ticket_aliases table — learned mapping from a normalized
+            # ticket line ("leche desn prot 1l") to the product the user picked
+            # for it in the ticket review. Resolved before any fuzzy scoring so
+            # a line seen once never needs guessing again. hits counts how many
+            # times the alias resolved a ticket line (last_used_at: the latest).
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS ticket_aliases (
+                    line_key TEXT PRIMARY KEY,
+                    barcode TEXT NOT NULL,
+                    sample_line TEXT DEFAULT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (barcode) REFERENCES products(barcode) ON DELETE CASCADE
+                )
+            """)
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_ticket_aliases_barcode "
+                "ON ticket_aliases(barcode)"
+            )
+
+            # Create product_codes table — one row per extra scannable code
+            # (Mercadona QR GTIN, variable-weight EAN-13 prefix) so a scan is
+            # a PK lookup instead of a LIKE over every alt_barcodes CSV.
+            # kind: 'alias' (full code) | 'prefix' (7-char `2xxxxxx` article).
+            # products.alt_barcodes stays as a read-only mirror of this table
+            # for the frontend and the FTS index.
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS product_codes (
+                    code TEXT PRIMARY KEY,
+                    barcode TEXT NOT NULL,
+                    kind TEXT NOT NULL DEFAULT 'alias',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (barcode) REFERENCES products(barcode) ON DELETE CASCADE
+                ) WITHOUT ROWID
+            """)
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_product_codes_barcode "
+                "ON product_codes(barcode)"
+            )
+
+            # Migrate legacy alt_barcodes CSVs. INSERT OR IGNORE keeps this
+            # idempotent and first-writer-wins if two products share a code.
+            async with db.execute(
+                "SELECT barcode, alt_barcodes FROM products "
+                "WHERE alt_barcodes IS NOT NULL AND alt_barcodes != ''"
+            ) as cursor:
+                legacy = await cursor.fetchall()
+            rows = []
+            for barcode, csv in legacy:
+                for code in csv.split(","):
+                    code = code.strip()
+                    if code:
+                        rows.append((code, barcode, _code_kind(code)))
+            if rows:
+                await db.executemany(
+                    "INSERT OR IGNORE INTO product_codes (code, barcode, kind) VALUES (?, ?, ?)",
+                    rows,
+                )
+
+            # Create barcode_cache table — remembered Open*Facts answers so a
+            # rescan (or a barcode none of the sources know) doesn't pay the
+            # network again. found=0 rows are negative-cache entries; payload
+            # is the lookup result as JSON, fetched_at a unix timestamp.
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS barcode_cache (
+                    barcode TEXT PRIMARY KEY,
+                    found INTEGER NOT NULL,
+                    source TEXT DEFAULT NULL,
+                    payload TEXT DEFAULT NULL,
+                    fetched_at REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+
+            # Create off_mirror table — optional offline copy of Open Food
+            # Facts, loaded from a user-supplied dump by app/off_mirror.py.
+            # Only the columns a lookup returns; category is already mapped
+            # to our internal categories. Empty unless an import was run.
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS off_mirror (
+                    barcode TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    brand TEXT DEFAULT NULL,
+                    category TEXT DEFAULT NULL,
+                    quantity TEXT DEFAULT NULL,
+                    weight_g REAL DEFAULT NULL,
+                    kcal_100g REAL DEFAULT NULL,
+                    proteins_100g REAL DEFAULT NULL,
+                    carbs_100g REAL DEFAULT NULL,
+                    fat_100g REAL DEFAULT NULL
+                ) WITHOUT ROWID
+            """)
+
+            # Create tickets / ticket_lines — archive of every parsed ticket
+            # PDF. file_hash lets a re-upload of the same file skip parsing;
+            # ticket_id (Mercadona "FACTURA SIMPLIFICADA") catches the same
+            # ticket downloaded twice. confirmed_at is set when its lines were
+            # added to stock, so a second confirmation can be flagged before
+            # touching anything. ticket_date is ISO for range queries.
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS tickets (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ticket_id TEXT DEFAULT NULL,
+                    file_hash TEXT NOT NULL UNIQUE,
+                    source TEXT NOT NULL DEFAULT 'pdf',
+                    ticket_date TEXT DEFAULT NULL,
+                    total REAL DEFAULT NULL,
+                    ocr INTEGER NOT NULL DEFAULT 0,
+                    confirmed_at TIMESTAMP DEFAULT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            await db.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_tickets_ticket_id "
+                "ON tickets(ticket_id) WHERE ticket_id IS NOT NULL"
+            )
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_tickets_date ON tickets(ticket_date)"
+            )
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS ticket_lines (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ticket_pk INTEGER NOT NULL,
+                    line_no INTEGER NOT NULL,
+                    line TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    qty INTEGER NOT NULL,
+                    unit_price REAL DEFAULT NULL,
+                    total_price REAL DEFAULT NULL,
+                    FOREIGN KEY (ticket_pk) REFERENCES tickets(id) ON DELETE CASCADE
+                )
+            """)
+            await db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_ticket_lines_ticket ON ticket_lines(ticket_pk, line_no)"
+            )
+
+            # Rebuild availability once at startup (covers existing installs
+            # and anything written before the table existed)
+            await self._refresh_recipe_availability(db)
+            # Same for the macros cache (the triggers keep it current afterwards)
+            await db.execute(refresh_macros.format(select=_recipe_macros_sql()))
+
             await db.commit()
 
     async def _get_batches(self, db, barcode: str) -> List[Batch]:
@@ -399,12 +869,127 @@ class Database:
             "UPDATE products SET stock = ?, expiry_date = ?, last_updated = ? WHERE barcode = ?",
             (total_stock, earliest_expiry, datetime.now(), barcode)
         )
+        await self._refresh_recipe_availability(db, barcodes=[barcode])
+
+    async def _refresh_recipe_availability(self, db, barcodes: Optional[List[str]] = None,
+                                           recipe_ids: Optional[List[int]] = None):
+        """Recompute recipe_availability rows. With `barcodes`, only the
+        recipes that use one of them (idx_recipe_ingredients_product); with
+        `recipe_ids`, those recipes; with neither, every recipe. Does not
+        commit.
+
+        Stock is compared with the recipe quantities as written (one batch of
+        the recipe, product units), like consume_recipe. max_servings scales
+        the scarcest ingredient's stock/qty by the recipe's servings."""
+        if barcodes is not None:
+            marks = ",".join("?" * len(barcodes))
+            async with db.execute(
+                f"SELECT DISTINCT recipe_id FROM recipe_ingredients WHERE product_barcode IN ({marks})",
+                barcodes
+            ) as cursor:
+                ids = [row[0] for row in await cursor.fetchall()]
+        elif recipe_ids is not None:
+            ids = list(recipe_ids)
+        else:
+            async with db.execute("SELECT id FROM recipes") as cursor:
+                ids = [row[0] for row in await cursor.fetchall()]
+        if not ids:
+            return
+
+        marks = ",".join("?" * len(ids))
+        now = datetime.now()
+        await db.execute(f"DELETE FROM recipe_availability WHERE recipe_id IN ({marks})", ids)
+        await db.execute(f"""
+            INSERT INTO recipe_availability (recipe_id, ingredients, covered, limiting_barcode, max_servings, updated_at)
+            WITH need AS (
+                SELECT ri.recipe_id, ri.product_barcode AS barcode, SUM(ri.quantity) AS qty,
+                       MAX(1, COALESCE(r.servings, 1)) AS servings
+                FROM recipe_ingredients ri
+                JOIN recipes r ON r.id = ri.recipe_id
+                WHERE ri.recipe_id IN ({marks}) AND ri.product_barcode IS NOT NULL
+                GROUP BY ri.recipe_id, ri.product_barcode
+            ), ratio AS (
+                SELECT n.recipe_id, n.barcode, n.qty,
+                       MAX(COALESCE(p.stock, 0), 0) AS stock,
+                       CASE WHEN n.qty > 0
+                            THEN MAX(COALESCE(p.stock, 0), 0) / n.qty * n.servings END AS makeable
+                FROM need n
+                LEFT JOIN products p ON p.barcode = n.barcode
+            ), ranked AS (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY recipe_id ORDER BY makeable ASC NULLS LAST, barcode
+                ) AS rn
+                FROM ratio
+            )
+            SELECT recipe_id, COUNT(*),
+                   AVG(CASE WHEN stock >= qty THEN 1.0 ELSE 0.0 END),
+                   MAX(CASE WHEN rn = 1 AND makeable IS NOT NULL THEN barcode END),
+                   MIN(makeable), ?
+            FROM ranked
+            GROUP BY recipe_id
+        """, ids + [now])
+        # Recipes without product ingredients are always makeable
+        await db.execute(f"""
+            INSERT OR IGNORE INTO recipe_availability (recipe_id, ingredients, covered, updated_at)
+            SELECT id, 0, 1.0, ? FROM recipes WHERE id IN ({marks})
+        """, [now] + ids)
 
     async def _build_product(self, db, row_dict: dict) -> Product:
         """Build a Product with its batches"""
         batches = await self._get_batches(db, row_dict['barcode'])
         return Product(**row_dict, batches=batches)
 
+    async def _build_products(self, db, rows) -> List[Product]:
+        """Bulk twin of _build_product: loads the batches of every row in one
+        query instead of one query per product. Keeps the input order."""
+        row_dicts = [dict(r) for r in rows]
+        if not row_dicts:
+            return []
+        barcodes = [r['barcode'] for r in row_dicts]
+        placeholders = ",".join("?" for _ in barcodes)
+        db.row_factory = aiosqlite.Row
+        async with db.execute(
+            f"""SELECT * FROM batches WHERE barcode IN ({placeholders}) AND quantity > 0
+                ORDER BY CASE WHEN expiry_date IS NULL THEN 1 ELSE 0 END, expiry_date ASC""",
+            barcodes
+        ) as cursor:
+            batch_rows = await cursor.fetchall()
+        by_barcode: Dict[str, List[Batch]] = {}
+        for b in batch_rows:
+            by_barcode.setdefault(b['barcode'], []).append(Batch(**dict(b)))
+        return [Product(**r, batches=by_barcode.get(r['barcode'], [])) for r in row_dicts]
+
+    async def search_products(self, query: str, limit: int = 20, offset: int = 0) -> tuple:
+        """Ranked product search over barcode, name, category and alt_barcodes
+        via the products_fts trigram index. Returns (page_of_products, total).
+
+        Name hits outrank category/code hits (bm25 column weights). Queries
+        with no word of 3+ chars can't use trigrams and fall back to a LIKE on
+        name/barcode — on a household catalog that is still cheap."""
+        query = (query or "").strip()
+        if not query:
+            return [], 0
+        match = _fts_match_query(query)
+        if match:
+            base = ("FROM products_fts JOIN products p ON p.barcode = products_fts.barcode "
+                    "WHERE products_fts MATCH ?")
+            params: list = [match]
+            order = "bm25(products_fts, 1.0, 10.0, 2.0, 1.0), p.name"
+        else:
+            base = "FROM products p WHERE p.name LIKE ? OR p.barcode LIKE ?"
+            params = [f"%{query}%", f"{query}%"]
+            order = "p.name"
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(f"SELECT COUNT(*) {base}", params) as cursor:
+                total = (await cursor.fetchone())[0]
+            async with db.execute(
+                f"SELECT p.* {base} ORDER BY {order} LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ) as cursor:
+                rows = await cursor.fetchall()
+            return await self._build_products(db, rows), total
+
     async def get_all_products(self) -> List[Product]:
         """Get all products with batches"""
         async with aiosqlite.connect(self.db_path) as db:
@@ -448,99 +1033,231 @@ class Database:
             (barcode, quantity_change, reason, meal_type)
         )
 
-    async def update_stock(self, barcode: str, update: StockUpdate) -> Optional[Product]:
-        """Update product stock via batches"""
+    async def _log_movements(self, db, rows: List[tuple]):
+        """Bulk twin of _log_movement: rows are
+        (barcode, quantity_change, reason, meal_type) tuples."""
+        if rows:
+            await db.executemany(
+                "INSERT INTO movements (barcode, quantity_change, reason, meal_type) VALUES (?, ?, ?, ?)",
+                rows
+            )
+
+    async def _deduct_fifo(self, db, needs: Dict[str, float]) -> None:
+        """Remove `needs` {barcode: qty} from stock FIFO (earliest expiry
+        first, NULLs last), for all products at once.
+
+        A single window query computes, per product, the running total of its
+        batches and therefore the new quantity of every batch the deduction
+        reaches. Exhausted batches get their live price consolidated and are
+        deleted, the rest updated — each as one executemany. Caller checks
+        availability first, syncs products.stock and commits."""
+        needs = {b: q for b, q in needs.items() if q > 0}
+        if not needs:
+            return
+        values = ",".join("(?, ?)" for _ in needs)
+        params = [v for item in needs.items() for v in item]
+        db.row_factory = aiosqlite.Row
+        async with db.execute(
+            f"""WITH need(barcode, qty) AS (VALUES {values}),
+                ranked AS (
+                    SELECT b.id, b.barcode, b.quantity, b.last_price, b.last_price_date,
+                           need.qty AS need,
+                           SUM(b.quantity) OVER (
+                               PARTITION BY b.barcode
+                               ORDER BY CASE WHEN b.expiry_date IS NULL THEN 1 ELSE 0 END,
+                                        b.expiry_date, b.id
+                               ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+                           ) AS cum
+                    FROM batches b JOIN need ON need.barcode = b.barcode
+                    WHERE b.quantity > 0
+                )
+                SELECT id, barcode, last_price, last_price_date,
+                       MIN(quantity, MAX(0, cum - need)) AS new_qty
+                FROM ranked WHERE cum - quantity < need""",
+            params
+        ) as cursor:
+            rows = await cursor.fetchall()
+
+        now = datetime.now().isoformat(timespec="seconds")
+        exhausted = [r for r in rows if r['new_qty'] <= 1e-9]
+        await db.executemany(
+            """INSERT INTO price_history
+               (barcode, batch_id, unit_price, qty, total_price, source, source_ref, observed_at)
+               VALUES (?, ?, ?, NULL, NULL, 'consolidated', NULL, ?)""",
+            [(r['barcode'], r['id'], r['last_price'], r['last_price_date'] or now)
+             for r in exhausted if r['last_price'] is not None]
+        )
+        await db.executemany("DELETE FROM batches WHERE id = ?", [(r['id'],) for r in exhausted])
+        await db.executemany(
+            "UPDATE batches SET quantity = ? WHERE id = ?",
+            [(r['new_qty'], r['id']) for r in rows if r['new_qty'] > 1e-9]
+        )
+
+    async def _apply_stock_update(self, db, barcode: str, update: StockUpdate) -> None:
+        """Apply one StockUpdate to the batches of `barcode` and log the
+        movement. Does NOT sync products.stock nor commit — callers do that
+        once per product / per transaction."""
         affected_batch_id: Optional[int] = None
-        async with aiosqlite.connect(self.db_path) as db:
-            if update.quantity > 0:
-                # Adding stock: find existing batch matching (barcode, location, expiry_date) or create new one.
-                # NULL == NULL is treated as a match (both unspecified = same logical batch).
+        if update.quantity > 0:
+            # Adding stock: find existing batch matching (barcode, location, expiry_date) or create new one.
+            # NULL == NULL is treated as a match (both unspecified = same logical batch).
+            db.row_factory = aiosqlite.Row
+            if update.location is None and update.expiry_date is None:
+                async with db.execute(
+                    "SELECT id FROM batches WHERE barcode = ? AND location IS NULL AND expiry_date IS NULL AND quantity > 0 LIMIT 1",
+                    (barcode,)
+                ) as cursor:
+                    row = await cursor.fetchone()
+            elif update.location is None:
+                async with db.execute(
+                    "SELECT id FROM batches WHERE barcode = ? AND location IS NULL AND expiry_date = ? AND quantity > 0 LIMIT 1",
+                    (barcode, update.expiry_date)
+                ) as cursor:
+                    row = await cursor.fetchone()
+            elif update.expiry_date is None:
+                async with db.execute(
+                    "SELECT id FROM batches WHERE barcode = ? AND location = ? AND expiry_date IS NULL AND quantity > 0 LIMIT 1",
+                    (barcode, update.location)
+                ) as cursor:
+                    row = await cursor.fetchone()
+            else:
+                async with db.execute(
+                    "SELECT id FROM batches WHERE barcode = ? AND location = ? AND expiry_date = ? AND quantity > 0 LIMIT 1",
+                    (barcode, update.location, update.expiry_date)
+                ) as cursor:
+                    row = await cursor.fetchone()
+
+            if row:
+                # New purchase merging into an existing batch — if that batch
+                # already had a price, consolidate it now BEFORE overwriting,
+                # otherwise the prior observation is lost forever.
+                if update.unit_price is not None:
+                    await self._consolidate_batch_price(db, row['id'])
+                await db.execute(
+                    "UPDATE batches SET quantity = quantity + ? WHERE id = ?",
+                    (update.quantity, row['id'])
+                )
+                affected_batch_id = row['id']
+            else:
+                cursor = await db.execute(
+                    "INSERT INTO batches (barcode, quantity, expiry_date, added_date, location) VALUES (?, ?, ?, ?, ?)",
+                    (barcode, update.quantity, update.expiry_date, date.today().isoformat(), update.location)
+                )
+                affected_batch_id = cursor.lastrowid
+
+            # Live price on the new/merged batch. Does NOT enter price_history
+            # until the batch is consolidated (consumed to zero, rotated out).
+            if update.unit_price is not None and affected_batch_id is not None:
+                observed_at = update.price_observed_at or datetime.now().isoformat(timespec="seconds")
+                await self._set_batch_price(db, affected_batch_id, barcode,
+                                            update.unit_price, observed_at)
+        else:
+            # Removing stock: FIFO across batches.
+            # If update.location is specified, restrict to batches at that location.
+            remaining = abs(update.quantity)
+            if update.location:
                 db.row_factory = aiosqlite.Row
-                if update.location is None and update.expiry_date is None:
-                    async with db.execute(
-                        "SELECT id FROM batches WHERE barcode = ? AND location IS NULL AND expiry_date IS NULL AND quantity > 0 LIMIT 1",
-                        (barcode,)
-                    ) as cursor:
-                        row = await cursor.fetchone()
-                elif update.location is None:
-                    async with db.execute(
-                        "SELECT id FROM batches WHERE barcode = ? AND location IS NULL AND expiry_date = ? AND quantity > 0 LIMIT 1",
-                        (barcode, update.expiry_date)
-                    ) as cursor:
-                        row = await cursor.fetchone()
-                elif update.expiry_date is None:
-                    async with db.execute(
-                        "SELECT id FROM batches WHERE barcode = ? AND location = ? AND expiry_date IS NULL AND quantity > 0 LIMIT 1",
-                        (barcode, update.location)
-                    ) as cursor:
-                        row = await cursor.fetchone()
-                else:
-                    async with db.execute(
-                        "SELECT id FROM batches WHERE barcode = ? AND location = ? AND expiry_date = ? AND quantity > 0 LIMIT 1",
-                        (barcode, update.location, update.expiry_date)
-                    ) as cursor:
-                        row = await cursor.fetchone()
-
-                if row:
-                    # New purchase merging into an existing batch — if that batch
-                    # already had a price, consolidate it now BEFORE overwriting,
-                    # otherwise the prior observation is lost forever.
-                    if update.unit_price is not None:
-                        await self._consolidate_batch_price(db, row['id'])
-                    await db.execute(
-                        "UPDATE batches SET quantity = quantity + ? WHERE id = ?",
-                        (update.quantity, row['id'])
-                    )
-                    affected_batch_id = row['id']
-                else:
-                    cursor = await db.execute(
-                        "INSERT INTO batches (barcode, quantity, expiry_date, added_date, location) VALUES (?, ?, ?, ?, ?)",
-                        (barcode, update.quantity, update.expiry_date, date.today().isoformat(), update.location)
-                    )
-                    affected_batch_id = cursor.lastrowid
-
-                # Live price on the new/merged batch. Does NOT enter price_history
-                # until the batch is consolidated (consumed to zero, rotated out).
-                if update.unit_price is not None and affected_batch_id is not None:
-                    observed_at = update.price_observed_at or datetime.now().isoformat(timespec="seconds")
-                    await self._set_batch_price(db, affected_batch_id, barcode,
-                                                update.unit_price, observed_at)
+                async with db.execute(
+                    """SELECT * FROM batches WHERE barcode = ? AND location = ? AND quantity > 0
+                       ORDER BY CASE WHEN expiry_date IS NULL THEN 1 ELSE 0 END, expiry_date ASC""",
+                    (barcode, update.location)
+                ) as cursor:
+                    rows = await cursor.fetchall()
+                    batches = [Batch(**dict(r)) for r in rows]
             else:
-                # Removing stock: FIFO across batches.
-                # If update.location is specified, restrict to batches at that location.
-                remaining = abs(update.quantity)
-                if update.location:
-                    db.row_factory = aiosqlite.Row
-                    async with db.execute(
-                        """SELECT * FROM batches WHERE barcode = ? AND location = ? AND quantity > 0
-                           ORDER BY CASE WHEN expiry_date IS NULL THEN 1 ELSE 0 END, expiry_date ASC""",
-                        (barcode, update.location)
-                    ) as cursor:
-                        rows = await cursor.fetchall()
-                        batches = [Batch(**dict(r)) for r in rows]
+                batches = await self._get_batches(db, barcode)
+            for batch in batches:
+                if remaining <= 0:
+                    break
+                consume = min(batch.quantity, remaining)
+                new_qty = batch.quantity - consume
+                if new_qty == 0:
+                    # Batch exhausted — consolidate its live price as the
+                    # final observation before removing the row.
+                    await self._consolidate_batch_price(db, batch.id)
+                    await db.execute("DELETE FROM batches WHERE id = ?", (batch.id,))
                 else:
-                    batches = await self._get_batches(db, barcode)
-                for batch in batches:
-                    if remaining <= 0:
-                        break
-                    consume = min(batch.quantity, remaining)
-                    new_qty = batch.quantity - consume
-                    if new_qty == 0:
-                        # Batch exhausted — consolidate its live price as the
-                        # final observation before removing the row.
-                        await self._consolidate_batch_price(db, batch.id)
-                        await db.execute("DELETE FROM batches WHERE id = ?", (batch.id,))
-                    else:
-                        await db.execute("UPDATE batches SET quantity = ? WHERE id = ?", (new_qty, batch.id))
-                    remaining -= consume
+                    await db.execute("UPDATE batches SET quantity = ? WHERE id = ?", (new_qty, batch.id))
+                remaining -= consume
 
-            # Log movement with reason (default to "removed" if not specified)
-            reason = update.reason or "removed"
-            await self._log_movement(db, barcode, update.quantity, reason, update.meal_type)
+        # Log movement with reason (default to "removed" if not specified)
+        reason = update.reason or "removed"
+        await self._log_movement(db, barcode, update.quantity, reason, update.meal_type)
+
+    async def update_stock(self, barcode: str, update: StockUpdate) -> Optional[Product]:
+        """Update product stock via batches"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._apply_stock_update(db, barcode, update)
             await self._sync_product_stock(db, barcode)
             await db.commit()
         return await self.get_product(barcode)
 
+    async def _available_stock(self, db, barcode: str, location: Optional[str] = None) -> float:
+        """What a removal from `barcode` can take: the sum of the batches
+        _apply_stock_update deducts from (only those at `location` when
+        given), as seen by the caller's transaction."""
+        if location:
+            sql, params = ("SELECT COALESCE(SUM(quantity), 0) FROM batches "
+                           "WHERE barcode = ? AND location = ? AND quantity > 0", (barcode, location))
+        else:
+            sql, params = ("SELECT COALESCE(SUM(quantity), 0) FROM batches "
+                           "WHERE barcode = ? AND quantity > 0", (barcode,))
+        async with db.execute(sql, params) as cursor:
+            return (await cursor.fetchone())[0]
+
+    async def bulk_update_stock(self, updates: List[BulkStockUpdate],
+                                ticket_ids: Optional[List[str]] = None) -> List[Product]:
+        """Apply a list of stock updates in ONE transaction, all-or-nothing.
+
+        The transaction takes the write lock (BEGIN IMMEDIATE) before any
+        check, so nothing can land between checking and deducting. Every
+        removal is checked against the batches it will actually take from
+        (its location's, when it has one), after the earlier updates of the
+        same request were applied. A ticket with an unknown barcode or a
+        recipe that over-draws one ingredient changes nothing: ValueError
+        with the offending barcode. Each touched product is re-synced once,
+        not once per line. Returns only the products that changed.
+        `ticket_ids` (a ticket being added) get confirmed_at in the same
+        transaction, so a failed update never leaves a ticket marked as
+        added."""
+        if not updates:
+            return []
+        barcodes = list(dict.fromkeys(u.barcode for u in updates))
+        placeholders = ",".join("?" for _ in barcodes)
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                async with db.execute(
+                    f"SELECT barcode FROM products WHERE barcode IN ({placeholders})", barcodes
+                ) as cursor:
+                    known = {r['barcode'] for r in await cursor.fetchall()}
+                for barcode in barcodes:
+                    if barcode not in known:
+                        raise ValueError(f"Product not found: {barcode}")
+                for u in updates:
+                    if u.quantity < 0:
+                        available = await self._available_stock(db, u.barcode, u.location)
+                        if available + u.quantity < -1e-9:
+                            raise ValueError(f"Insufficient stock: {u.barcode}")
+                    await self._apply_stock_update(db, u.barcode, u)
+                for barcode in barcodes:
+                    await self._sync_product_stock(db, barcode)
+                if ticket_ids:
+                    await self._mark_tickets_confirmed(db, ticket_ids)
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+            db.row_factory = aiosqlite.Row
+            async with db.execute(
+                f"SELECT * FROM products WHERE barcode IN ({placeholders}) ORDER BY name",
+                barcodes
+            ) as cursor:
+                rows = await cursor.fetchall()
+            return await self._build_products(db, rows)
+
     async def update_product(self, barcode: str, update: ProductUpdate) -> Optional[Product]:
         """Update product details"""
         product = await self.get_product(barcode)
@@ -593,6 +1310,43 @@ class Database:
 
         return await self.get_product(barcode)
 
+    async def get_products_missing_macros(self) -> List[dict]:
+        """Products with no kcal and a real (>= 8 digit) barcode, as
+        {barcode, name} — the macro back-fill candidates. No batches loaded."""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                """SELECT barcode, name FROM products
+                   WHERE (kcal_100g IS NULL OR kcal_100g = 0) AND LENGTH(barcode) >= 8
+                   ORDER BY name"""
+            ) as cursor:
+                return [{"barcode": r[0], "name": r[1]} for r in await cursor.fetchall()]
+
+    _MACRO_FIELDS = ("weight_g", "kcal_100g", "proteins_100g", "carbs_100g",
+                     "fat_100g", "image_url", "package_quantity")
+
+    async def bulk_update_product_macros(self, rows: List[dict]) -> int:
+        """Apply accepted macro suggestions in a single transaction. Like
+        update_product, a missing/None field leaves the column untouched.
+        Returns how many products were actually updated."""
+        now = datetime.now()
+        params = [
+            tuple(r.get(f) for f in self._MACRO_FIELDS) + (now, r["barcode"])
+            for r in rows if r.get("barcode")
+        ]
+        if not params:
+            return 0
+        set_clause = ", ".join(f"{f} = COALESCE(?, {f})" for f in self._MACRO_FIELDS)
+        # rowcount, not total_changes: the recipe_macros triggers write rows too
+        updated = 0
+        async with aiosqlite.connect(self.db_path) as db:
+            for p in params:
+                cursor = await db.execute(
+                    f"UPDATE products SET {set_clause}, last_updated = ? WHERE barcode = ?", p
+                )
+                updated += cursor.rowcount
+            await db.commit()
+        return updated
+
     async def update_batch(self, batch_id: int, update: BatchUpdate) -> Optional[Batch]:
         """Update a batch's expiry date and/or location.
 
@@ -656,41 +1410,102 @@ class Database:
         product = await self.get_product(barcode)
         return product
 
+    async def _refresh_alt_barcodes(self, db, barcode: str):
+        """Rebuild the products.alt_barcodes CSV mirror from product_codes."""
+        await db.execute(
+            """UPDATE products SET alt_barcodes = (
+                   SELECT GROUP_CONCAT(code) FROM product_codes WHERE barcode = ?
+               ), last_updated = ? WHERE barcode = ?""",
+            (barcode, datetime.now(), barcode),
+        )
+
     async def add_alt_barcode(self, barcode: str, code: str) -> Optional[Product]:
-        """Append `code` to the product's alt_barcodes CSV, de-duped.
+        """File `code` under the product in product_codes.
 
         Returns the updated product, or None if the product does not exist.
-        Same `code` already present is a no-op (still returns the product).
+        Same `code` already linked here is a no-op; a code linked to another
+        product moves to this one (the user just told us which is right).
         """
         code = (code or "").strip()
         if not code:
             return await self.get_product(barcode)
         async with aiosqlite.connect(self.db_path) as db:
             async with db.execute(
-                "SELECT alt_barcodes FROM products WHERE barcode = ?", (barcode,)
+                "SELECT 1 FROM products WHERE barcode = ?", (barcode,)
+            ) as cursor:
+                if await cursor.fetchone() is None:
+                    return None
+            async with db.execute(
+                "SELECT barcode FROM product_codes WHERE code = ?", (code,)
             ) as cursor:
                 row = await cursor.fetchone()
-            if row is None:
-                return None
-            current = (row[0] or "").strip()
-            existing = [c for c in current.split(",") if c] if current else []
-            if code not in existing:
-                existing.append(code)
-                new_value = ",".join(existing)
+            previous = row[0] if row else None
+            if previous != barcode:
                 await db.execute(
-                    "UPDATE products SET alt_barcodes = ?, last_updated = ? WHERE barcode = ?",
-                    (new_value, datetime.now(), barcode),
+                    """INSERT INTO product_codes (code, barcode, kind) VALUES (?, ?, ?)
+                       ON CONFLICT(code) DO UPDATE SET barcode = excluded.barcode""",
+                    (code, barcode, _code_kind(code)),
                 )
+                await self._refresh_alt_barcodes(db, barcode)
+                if previous:
+                    await self._refresh_alt_barcodes(db, previous)
                 await db.commit()
         return await self.get_product(barcode)
 
+    async def resolve_code(self, code: str) -> CodeResolution:
+        """Resolve any scanned code to a product in at most three indexed
+        lookups: exact product barcode, linked alias, then the 7-char
+        article prefix for variable-weight `2xxxxxx` labels. GTIN-14, EAN-13
+        and UPC-A spellings of the same number all match."""
+        code = (code or "").strip()
+        candidates = gtin_candidates(code)
+        result = CodeResolution(
+            code=code,
+            normalized=normalize_gtin(code),
+            variable_measure=decode_variable_measure(code),
+        )
+        if not candidates:
+            return result
+        marks = ",".join("?" * len(candidates))
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(
+                f"SELECT * FROM products WHERE barcode IN ({marks}) LIMIT 1", candidates
+            ) as cursor:
+                row = await cursor.fetchone()
+            match = "exact" if row else None
+            if row is None:
+                async with db.execute(
+                    f"""SELECT p.* FROM product_codes c JOIN products p ON p.barcode = c.barcode
+                        WHERE c.code IN ({marks}) LIMIT 1""",
+                    candidates,
+                ) as cursor:
+                    row = await cursor.fetchone()
+                match = "alias" if row else None
+            prefix = variable_measure_prefix(code)
+            if row is None and prefix:
+                async with db.execute(
+                    """SELECT p.* FROM product_codes c JOIN products p ON p.barcode = c.barcode
+                       WHERE c.code = ? AND c.kind = 'prefix'""",
+                    (prefix,),
+                ) as cursor:
+                    row = await cursor.fetchone()
+                match = "prefix" if row else None
+            if row is not None:
+                result.match = match
+                result.product = await self._build_product(db, dict(row))
+        return result
+
     async def delete_product(self, barcode: str) -> bool:
         """Delete product and its batches"""
         async with aiosqlite.connect(self.db_path) as db:
             await db.execute("DELETE FROM batches WHERE barcode = ?", (barcode,))
+            await db.execute("DELETE FROM ticket_aliases WHERE barcode = ?", (barcode,))
+            await db.execute("DELETE FROM product_codes WHERE barcode = ?", (barcode,))
             cursor = await db.execute(
                 "DELETE FROM products WHERE barcode = ?", (barcode,)
             )
+            await self._refresh_recipe_availability(db, barcodes=[barcode])
             await db.commit()
             return cursor.rowcount > 0
 
@@ -839,6 +1654,46 @@ class Database:
                 rows = await cursor.fetchall()
                 return [{"date": r["date"], "kcal": r["kcal"] or 0} for r in rows]
 
+    async def get_chart_rows(self, since: Optional[str], barcodes: List[str]) -> tuple:
+        """Raw rows for app/charts.py from `since` (ISO date, None = all
+        history), on one connection: daily kcal (same formula as
+        get_daily_kcal_series), body weights starting a week earlier so the
+        first moving averages are complete, and the price_history of
+        `barcodes` ordered by barcode, observed_at."""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT
+                    date(m.timestamp) as date,
+                    SUM(CASE
+                        WHEN p.unit_type = 'uds' THEN ABS(m.quantity_change) * (IFNULL(p.weight_g, 100) / 100.0) * IFNULL(p.kcal_100g, 0)
+                        ELSE ABS(m.quantity_change) / 100.0 * IFNULL(p.kcal_100g, 0)
+                    END) as kcal
+                FROM movements m
+                JOIN products p ON m.barcode = p.barcode
+                WHERE m.quantity_change < 0
+                  AND m.reason = 'consumed'
+                  AND (? IS NULL OR date(m.timestamp) >= ?)
+                GROUP BY date(m.timestamp)
+                ORDER BY date ASC
+            """, (since, since)) as cursor:
+                kcal = [dict(r) for r in await cursor.fetchall()]
+            async with db.execute(
+                "SELECT date, weight FROM weight_log WHERE ? IS NULL OR date >= date(?, '-6 days') ORDER BY date ASC",
+                (since, since)
+            ) as cursor:
+                weights = [dict(r) for r in await cursor.fetchall()]
+            prices = []
+            if barcodes:
+                marks = ",".join("?" * len(barcodes))
+                async with db.execute(f"""
+                    SELECT barcode, observed_at, unit_price FROM price_history
+                    WHERE barcode IN ({marks}) AND (? IS NULL OR observed_at >= ?)
+                    ORDER BY barcode, observed_at, id
+                """, list(barcodes) + [since, since]) as cursor:
+                    prices = [dict(r) for r in await cursor.fetchall()]
+        return kcal, weights, prices
+
     async def get_export_data(self) -> List[dict]:
         """Get all inventory data in a flat format for export. Product-level
         fields repeat across each batch row (denormalized) so the CSV can be
@@ -931,6 +1786,9 @@ class Database:
             
             for barcode in product_barcodes:
                 await self._sync_product_stock(db, barcode)
+            if clear_existing:
+                # Recipes may still point at products that were not re-imported
+                await self._refresh_recipe_availability(db)
                 
             await db.commit()
 
@@ -1083,8 +1941,21 @@ class Database:
 
     # --- Recipes Methods ---
 
-    def _parse_recipe_row(self, recipe_dict: dict) -> dict:
-        """Deserialize JSON fields from a recipe DB row."""
+    def _parse_recipe_row(self, recipe_dict: dict, labels: Optional[tuple] = None) -> dict:
+        """Deserialize a recipe DB row. Cached macros selected as
+        macro_kcal/... (RECIPE_SELECT) replace the stored kcal/... columns.
+        With `labels` (from _recipe_labels) tags/meal_types come from the
+        join tables; otherwise from the legacy JSON mirror."""
+        for k in ('kcal', 'proteins', 'carbs', 'fat'):
+            if f'macro_{k}' in recipe_dict:
+                cached = recipe_dict.pop(f'macro_{k}')
+                if cached is not None:
+                    recipe_dict[k] = cached
+        if labels is not None:
+            tags, meal_types = labels
+            recipe_dict['tags'] = tags.get(recipe_dict['id'], [])
+            recipe_dict['meal_types'] = meal_types.get(recipe_dict['id'], [])
+            return recipe_dict
         tags_raw = recipe_dict.get('tags') or '[]'
         try:
             recipe_dict['tags'] = json.loads(tags_raw) if isinstance(tags_raw, str) else tags_raw
@@ -1097,15 +1968,177 @@ class Database:
             recipe_dict['meal_types'] = []
         return recipe_dict
 
-    async def get_all_recipes(self) -> List[Recipe]:
+    async def _recipe_labels(self, db, recipe_ids: Optional[List[int]] = None) -> tuple:
+        """({recipe_id: [tags]}, {recipe_id: [meal_types]}) from the join
+        tables, in the order they were entered. All recipes by default."""
+        where, params = "", []
+        if recipe_ids is not None:
+            if not recipe_ids:
+                return {}, {}
+            where = f"WHERE recipe_id IN ({','.join('?' * len(recipe_ids))})"
+            params = list(recipe_ids)
+        result = []
+        for table, col in (('recipe_tags', 'tag'), ('recipe_meal_types', 'meal_type')):
+            by_id: Dict[int, List[str]] = {}
+            async with db.execute(
+                f"SELECT recipe_id, {col} FROM {table} {where} ORDER BY recipe_id, position", params
+            ) as cursor:
+                for rid, value in await cursor.fetchall():
+                    by_id.setdefault(rid, []).append(value)
+            result.append(by_id)
+        return tuple(result)
+
+    async def _write_recipe_labels(self, db, recipe_id: int, tags: List[str], meal_types: List[str]):
+        """Replace a recipe's rows in recipe_tags/recipe_meal_types and its
+        JSON mirror columns. Blank and repeated values are dropped."""
+        clean = []
+        for table, col, values in (('recipe_tags', 'tag', tags), ('recipe_meal_types', 'meal_type', meal_types)):
+            seen = list(dict.fromkeys(v.strip() for v in (values or []) if v and v.strip()))
+            await db.execute(f"DELETE FROM {table} WHERE recipe_id = ?", (recipe_id,))
+            await db.executemany(
+                f"INSERT INTO {table} (recipe_id, {col}, position) VALUES (?, ?, ?)",
+                [(recipe_id, v, i) for i, v in enumerate(seen)]
+            )
+            clean.append(seen)
+        await db.execute(
+            "UPDATE recipes SET tags = ?, meal_types = ? WHERE id = ?",
+            (json.dumps(clean[0]), json.dumps(clean[1]), recipe_id)
+        )
+
+    async def get_planner_recipes(self) -> List[dict]:
+        """Every recipe with its per-serving macros, for the week planner,
+        straight from the recipe_macros cache (no ingredient objects)."""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT r.id, r.name,
+                       COALESCE(m.kcal, 0) AS kcal, COALESCE(m.proteins, 0) AS proteins,
+                       COALESCE(m.carbs, 0) AS carbs, COALESCE(m.fat, 0) AS fat
+                FROM recipes r
+                LEFT JOIN recipe_macros m ON m.recipe_id = r.id
+                ORDER BY r.id
+            """) as cursor:
+                rows = await cursor.fetchall()
+            labels = await self._recipe_labels(db)
+        return [self._parse_recipe_row(dict(row), labels) for row in rows]
+
+    async def get_recipe_requirements(self) -> List[tuple]:
+        """(recipe_id, barcode, qty per serving) for every product ingredient,
+        in the product's own unit — the planner's requirement vectors."""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute("""
+                SELECT ri.recipe_id, ri.product_barcode,
+                       SUM(ri.quantity) / MAX(1, COALESCE(r.servings, 1))
+                FROM recipe_ingredients ri
+                JOIN recipes r ON r.id = ri.recipe_id
+                WHERE ri.product_barcode IS NOT NULL
+                GROUP BY ri.recipe_id, ri.product_barcode
+            """) as cursor:
+                return [tuple(row) for row in await cursor.fetchall()]
+
+    async def get_pantry_budget(self) -> List[dict]:
+        """Stock of every product in stock plus its earliest expiry and the
+        quantity expiring on that date (product_earliest_expiry view)."""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT p.barcode, p.stock, e.earliest_expiry, COALESCE(e.qty, 0) AS expiring_qty
+                FROM products p
+                LEFT JOIN product_earliest_expiry e ON e.barcode = p.barcode
+                WHERE p.stock > 0
+            """) as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+
+    async def get_shopping_catalog(self, start_date: str, end_date: str, recent_limit: int = 5) -> tuple:
+        """Rows for the shopping engine, whole catalog at once: every product
+        with stock, min_stock, pack fields, last_price and `planned` — the
+        quantity the unconsumed diet plans between the dates still need
+        (per-serving recipe quantities × plan quantity). Also returns
+        {barcode: [last `recent_limit` unit prices, newest first]} from
+        price_history, read through idx_price_history_barcode_date."""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                WITH demand AS (
+                    SELECT ri.product_barcode AS barcode,
+                           SUM(COALESCE(dp.quantity, 1) * ri.quantity / MAX(1, COALESCE(r.servings, 1))) AS qty
+                    FROM diet_plans dp
+                    JOIN recipes r ON r.id = dp.recipe_id
+                    JOIN recipe_ingredients ri ON ri.recipe_id = r.id
+                    WHERE dp.date BETWEEN ? AND ? AND dp.is_consumed = 0
+                      AND ri.product_barcode IS NOT NULL
+                    GROUP BY ri.product_barcode
+                )
+                SELECT p.barcode, p.name, p.category, p.unit_type, p.stock, p.min_stock,
+                       p.weight_g, p.serving_size, p.last_price,
+                       COALESCE(d.qty, 0) AS planned
+                FROM products p
+                LEFT JOIN demand d ON d.barcode = p.barcode
+            """, (start_date, end_date)) as cursor:
+                catalog = [dict(row) for row in await cursor.fetchall()]
+            async with db.execute("""
+                SELECT barcode, unit_price FROM (
+                    SELECT barcode, unit_price,
+                           ROW_NUMBER() OVER (PARTITION BY barcode ORDER BY observed_at DESC) AS rn
+                    FROM price_history
+                ) WHERE rn <= ?
+            """, (recent_limit,)) as cursor:
+                recent: Dict[str, List[float]] = {}
+                for row in await cursor.fetchall():
+                    recent.setdefault(row['barcode'], []).append(row['unit_price'])
+        return catalog, recent
+
+    async def get_recipe_availability(self) -> List[RecipeAvailability]:
+        """Availability of every recipe against current stock, as kept in
+        recipe_availability, with the name of the limiting product."""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute("""
+                SELECT a.recipe_id, a.ingredients, a.covered, a.limiting_barcode,
+                       p.name AS limiting_name, a.max_servings, a.updated_at
+                FROM recipe_availability a
+                JOIN recipes r ON r.id = a.recipe_id
+                LEFT JOIN products p ON p.barcode = a.limiting_barcode
+                ORDER BY a.covered DESC, a.max_servings DESC, a.recipe_id
+            """) as cursor:
+                return [RecipeAvailability(**dict(row)) for row in await cursor.fetchall()]
+
+    async def get_all_recipes(self, meal_type: Optional[str] = None, tag: Optional[str] = None,
+                              max_time: Optional[int] = None,
+                              min_protein: Optional[float] = None) -> List[Recipe]:
+        """All recipes, or those matching every given filter, in SQL:
+        meal_type through recipe_meal_types (falling back to the tags of
+        recipes without meal types, like the planner's meal pools), tag
+        through recipe_tags, max_time in minutes (no time counts as 0),
+        min_protein in grams per serving from recipe_macros."""
+        conditions, params = [], []
+        if meal_type:
+            conditions.append("""(
+                EXISTS (SELECT 1 FROM recipe_meal_types mt WHERE mt.meal_type = ? AND mt.recipe_id = r.id)
+                OR (NOT EXISTS (SELECT 1 FROM recipe_meal_types mt WHERE mt.recipe_id = r.id)
+                    AND EXISTS (SELECT 1 FROM recipe_tags t WHERE t.tag = ? AND t.recipe_id = r.id))
+            )""")
+            params += [meal_type, meal_type]
+        if tag:
+            conditions.append("EXISTS (SELECT 1 FROM recipe_tags t WHERE t.tag = ? AND t.recipe_id = r.id)")
+            params.append(tag)
+        if max_time is not None:
+            conditions.append("COALESCE(r.time, 0) <= ?")
+            params.append(max_time)
+        if min_protein is not None:
+            conditions.append("COALESCE(m.proteins, 0) >= ?")
+            params.append(min_protein)
+        where = (" WHERE " + " AND ".join(conditions)) if conditions else ""
+
         async with aiosqlite.connect(self.db_path) as db:
             db.row_factory = aiosqlite.Row
-            async with db.execute("SELECT * FROM recipes ORDER BY name") as cursor:
+            async with db.execute(RECIPE_SELECT + where + " ORDER BY r.name", params) as cursor:
                 recipe_rows = await cursor.fetchall()
+            labels = await self._recipe_labels(db, [r['id'] for r in recipe_rows] if conditions else None)
 
             recipes = []
             for r_row in recipe_rows:
-                recipe_dict = self._parse_recipe_row(dict(r_row))
+                recipe_dict = self._parse_recipe_row(dict(r_row), labels)
                 async with db.execute("SELECT * FROM recipe_ingredients WHERE recipe_id = ?", (recipe_dict['id'],)) as i_cursor:
                     ingredients = [Ingredient(**dict(i_row)) for i_row in await i_cursor.fetchall()]
                 recipe_dict['ingredients'] = ingredients
@@ -1115,10 +2148,10 @@ class Database:
     async def get_recipe(self, recipe_id: int) -> Optional[Recipe]:
         async with aiosqlite.connect(self.db_path) as db:
             db.row_factory = aiosqlite.Row
-            async with db.execute("SELECT * FROM recipes WHERE id = ?", (recipe_id,)) as cursor:
+            async with db.execute(RECIPE_SELECT + " WHERE r.id = ?", (recipe_id,)) as cursor:
                 row = await cursor.fetchone()
                 if not row: return None
-                recipe_dict = self._parse_recipe_row(dict(row))
+                recipe_dict = self._parse_recipe_row(dict(row), await self._recipe_labels(db, [recipe_id]))
                 async with db.execute("SELECT * FROM recipe_ingredients WHERE recipe_id = ?", (recipe_id,)) as i_cursor:
                     ingredients = [Ingredient(**dict(i_row)) for i_row in await i_cursor.fetchall()]
                 recipe_dict['ingredients'] = ingredients
@@ -1137,6 +2170,7 @@ class Database:
                 recipe.kcal, recipe.proteins, recipe.carbs, recipe.fat, recipe.image_url
             ))
             recipe_id = cursor.lastrowid
+            await self._write_recipe_labels(db, recipe_id, recipe.tags, recipe.meal_types)
 
             for ing in recipe.ingredients:
                 await db.execute("""
@@ -1144,12 +2178,13 @@ class Database:
                     VALUES (?, ?, ?, ?, ?)
                 """, (recipe_id, ing.get('product_barcode'), ing.get('custom_name'), ing.get('quantity'), ing.get('unit', 'g')))
 
+            await self._refresh_recipe_availability(db, recipe_ids=[recipe_id])
             await db.commit()
             return await self.get_recipe(recipe_id)
 
     async def update_recipe(self, recipe_id: int, recipe: RecipeCreate) -> Optional[Recipe]:
         async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
+            cursor = await db.execute("""
                 UPDATE recipes SET name=?, description=?, instructions=?, servings=?,
                 time=?, tags=?, meal_types=?, output_product_id=?, output_qty=?, default_expiry_days=?,
                 fridge_expiry_days=?, freezer_expiry_days=?,
@@ -1163,19 +2198,67 @@ class Database:
                 recipe.kcal, recipe.proteins, recipe.carbs, recipe.fat, recipe.image_url,
                 recipe_id
             ))
+            if cursor.rowcount == 0:
+                return None
+            await self._write_recipe_labels(db, recipe_id, recipe.tags, recipe.meal_types)
             await db.execute("DELETE FROM recipe_ingredients WHERE recipe_id=?", (recipe_id,))
             for ing in recipe.ingredients:
                 await db.execute("""
                     INSERT INTO recipe_ingredients (recipe_id, product_barcode, custom_name, quantity, unit)
                     VALUES (?, ?, ?, ?, ?)
                 """, (recipe_id, ing.get('product_barcode'), ing.get('custom_name'), ing.get('quantity'), ing.get('unit', 'g')))
+            await self._refresh_recipe_availability(db, recipe_ids=[recipe_id])
             await db.commit()
         return await self.get_recipe(recipe_id)
 
+    async def consume_recipe(self, recipe_id: int, servings: float = 1.0) -> List[str]:
+        """Subtract `servings` of a recipe's ingredients from stock in one
+        transaction. Availability of every ingredient is checked with one
+        query; if anything is short, raises ValueError listing all shortages
+        and nothing is touched. Returns the consumed barcodes."""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(
+                """SELECT ri.product_barcode AS barcode, SUM(ri.quantity) * ? AS needed,
+                          p.name, p.unit_type, p.stock
+                   FROM recipe_ingredients ri
+                   LEFT JOIN products p ON p.barcode = ri.product_barcode
+                   WHERE ri.recipe_id = ? AND ri.product_barcode IS NOT NULL
+                   GROUP BY ri.product_barcode
+                   ORDER BY MIN(ri.id)""",
+                (servings, recipe_id)
+            ) as cursor:
+                rows = await cursor.fetchall()
+
+            errors = []
+            for r in rows:
+                if r['name'] is None:
+                    errors.append(f"Producto no encontrado: {r['barcode']}")
+                elif (r['stock'] or 0) < r['needed']:
+                    errors.append(f"Stock insuficiente para {r['name']}: necesita {r['needed']}{r['unit_type']}, tiene {r['stock']}")
+            if errors:
+                raise ValueError(" | ".join(errors))
+
+            try:
+                await self._deduct_fifo(db, {r['barcode']: r['needed'] for r in rows})
+                await self._log_movements(db, [
+                    (r['barcode'], -r['needed'], "consumed_in_recipe", None) for r in rows
+                ])
+                for r in rows:
+                    await self._sync_product_stock(db, r['barcode'])
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+            return [r['barcode'] for r in rows]
+
     async def delete_recipe(self, recipe_id: int) -> bool:
         async with aiosqlite.connect(self.db_path) as db:
             # Cascades should handle ingredient deletion
             cursor = await db.execute("DELETE FROM recipes WHERE id = ?", (recipe_id,))
+            await db.execute("DELETE FROM recipe_availability WHERE recipe_id = ?", (recipe_id,))
+            await db.execute("DELETE FROM recipe_tags WHERE recipe_id = ?", (recipe_id,))
+            await db.execute("DELETE FROM recipe_meal_types WHERE recipe_id = ?", (recipe_id,))
             await db.commit()
             return cursor.rowcount > 0
 
@@ -1206,6 +2289,47 @@ class Database:
                 row = await c.fetchone()
                 return DietPlan(**dict(row))
 
+    async def replace_week_plans(self, start_date: str, plans: List[DietPlanCreate]) -> List[DietPlan]:
+        """Make the 7 days from `start_date` hold exactly `plans`.
+
+        Diffs against the stored rows instead of wiping them: an entry that
+        is already there (same date, meal, recipe/product/name and quantity)
+        keeps its row — and its is_consumed flag — and only the difference
+        is deleted/inserted, in one transaction. Raises ValueError if an
+        entry falls outside the week."""
+        start = date.fromisoformat(start_date)
+        end_date = (start + timedelta(days=6)).isoformat()
+        for p in plans:
+            if not (start_date <= p.date <= end_date):
+                raise ValueError(f"Plan date {p.date} outside week {start_date}..{end_date}")
+
+        entries = [(p.date, p.meal_type, p.recipe_id, p.product_barcode, p.custom_name, p.quantity)
+                   for p in plans]
+
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            # The diff is read inside the write lock, so nothing can land
+            # between reading the week and replacing it.
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                async with db.execute(
+                    "SELECT * FROM diet_plans WHERE date BETWEEN ? AND ? ORDER BY is_consumed DESC, id",
+                    (start_date, end_date)
+                ) as cursor:
+                    stored = [dict(r) for r in await cursor.fetchall()]
+                to_delete, to_insert = diff_week_plans(stored, entries)
+                await db.executemany("DELETE FROM diet_plans WHERE id = ?", [(i,) for i in to_delete])
+                await db.executemany(
+                    """INSERT INTO diet_plans (date, meal_type, recipe_id, product_barcode, custom_name, quantity, is_consumed)
+                       VALUES (?, ?, ?, ?, ?, ?, 0)""",
+                    to_insert
+                )
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+        return await self.get_diet_plans(start_date, end_date)
+
     async def update_diet_plan(self, plan_id: int, is_consumed: bool):
         async with aiosqlite.connect(self.db_path) as db:
             await db.execute("UPDATE diet_plans SET is_consumed = ? WHERE id = ?", (1 if is_consumed else 0, plan_id))
@@ -1684,6 +2808,321 @@ class Database:
                 rows = await cursor.fetchall()
             return [PriceHistoryEntry(**dict(r)) for r in rows]
 
+    async def get_price_history_batch(self, barcodes: List[str], limit: int = 50,
+                                      since: Optional[str] = None) -> Dict[str, PriceHistorySeries]:
+        """Newest `limit` observations of each barcode (optionally only from
+        `since`) in one query over idx_price_history_barcode_date, grouped by
+        barcode, with min/median/last and the least-squares price trend
+        computed while grouping. Barcodes without history get an empty
+        series."""
+        barcodes = list(dict.fromkeys(b for b in barcodes if b))
+        result = {b: PriceHistorySeries() for b in barcodes}
+        if not barcodes:
+            return result
+        marks = ",".join("?" * len(barcodes))
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(f"""
+                SELECT * FROM (
+                    SELECT ph.*, julianday(ph.observed_at) AS jd,
+                           ROW_NUMBER() OVER (PARTITION BY ph.barcode
+                                              ORDER BY ph.observed_at DESC, ph.id DESC) AS rn
+                    FROM price_history ph
+                    WHERE ph.barcode IN ({marks}) AND (? IS NULL OR ph.observed_at >= ?)
+                )
+                WHERE rn <= ?
+                ORDER BY barcode, rn
+            """, barcodes + [since, since, limit]) as cursor:
+                rows = await cursor.fetchall()
+
+        grouped: Dict[str, list] = {}
+        for r in rows:
+            grouped.setdefault(r['barcode'], []).append(r)
+        for barcode, group in grouped.items():
+            prices = [r['unit_price'] for r in group]
+            # Trend: slope of price over days, least squares
+            pts = [(r['jd'], r['unit_price']) for r in group if r['jd'] is not None]
+            slope = None
+            if len(pts) >= 2:
+                mx = sum(x for x, _ in pts) / len(pts)
+                my = sum(y for _, y in pts) / len(pts)
+                sxx = sum((x - mx) ** 2 for x, _ in pts)
+                if sxx > 0:
+                    slope = round(sum((x - mx) * (y - my) for x, y in pts) / sxx, 6)
+            entries = []
+            for r in group:
+                d = dict(r)
+                d.pop('jd'); d.pop('rn')
+                entries.append(PriceHistoryEntry(**d))
+            result[barcode] = PriceHistorySeries(
+                entries=entries,
+                count=len(prices),
+                min=min(prices),
+                median=statistics.median(prices),
+                last=prices[0],
+                slope_per_day=slope,
+            )
+        return result
+
+    # --- Ticket line aliases -----------------------------------------------
+
+    async def resolve_ticket_aliases(self, lines: List[str]) -> Dict[str, str]:
+        """Map each ticket line to its learned barcode, in one query for the
+        whole ticket. Lines without an alias (or whose product was deleted)
+        are simply absent from the result. Every alias that matched gets a
+        hit and last_used_at, in one UPDATE."""
+        keys_by_line = {ln: normalize_ticket_line(ln) for ln in lines if ln}
+        keys = sorted({k for k in keys_by_line.values() if k})
+        if not keys:
+            return {}
+        placeholders = ",".join("?" for _ in keys)
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                f"""SELECT a.line_key, a.barcode FROM ticket_aliases a
+                    JOIN products p ON p.barcode = a.barcode
+                    WHERE a.line_key IN ({placeholders})""",
+                keys
+            ) as cursor:
+                by_key = {row[0]: row[1] for row in await cursor.fetchall()}
+            if by_key:
+                await db.execute(
+                    f"""UPDATE ticket_aliases SET hits = hits + 1, last_used_at = ?
+                        WHERE line_key IN ({",".join("?" for _ in by_key)})""",
+                    [datetime.now()] + list(by_key)
+                )
+                await db.commit()
+        return {ln: by_key[k] for ln, k in keys_by_line.items() if k in by_key}
+
+    async def learn_ticket_aliases(self, links: List[TicketAliasLink]) -> int:
+        """Upsert the line -> barcode pairs confirmed in a ticket review.
+        Re-confirming the same barcode keeps the alias and its `hits` (those
+        count resolutions, see resolve_ticket_aliases); picking a different
+        one overwrites the alias and restarts the counter. Returns rows
+        written."""
+        now = datetime.now()
+        rows = {}
+        for link in links:
+            key = normalize_ticket_line(link.line)
+            if key and link.barcode:
+                rows[key] = (key, link.barcode, link.line.strip(), now, now)
+        if not rows:
+            return 0
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.executemany(
+                """INSERT INTO ticket_aliases (line_key, barcode, sample_line, hits, created_at, last_used_at)
+                   VALUES (?, ?, ?, 0, ?, ?)
+                   ON CONFLICT(line_key) DO UPDATE SET
+                       hits = CASE WHEN ticket_aliases.barcode = excluded.barcode
+                                   THEN ticket_aliases.hits ELSE 0 END,
+                       barcode = excluded.barcode,
+                       sample_line = excluded.sample_line""",
+                list(rows.values())
+            )
+            await db.commit()
+        return len(rows)
+
+    # --- Ticket archive ----------------------------------------------------
+
+    @staticmethod
+    def _ticket_date_iso(date_str: Optional[str]) -> Optional[str]:
+        """Parser date "01/03/2025 18:32" -> "2025-03-01 18:32" (sortable)."""
+        try:
+            return datetime.strptime(date_str or "", "%d/%m/%Y %H:%M").strftime("%Y-%m-%d %H:%M")
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _ticket_date_display(iso: Optional[str]) -> Optional[str]:
+        try:
+            return datetime.strptime(iso or "", "%Y-%m-%d %H:%M").strftime("%d/%m/%Y %H:%M")
+        except ValueError:
+            return None
+
+    async def get_stored_tickets(self, file_hashes: List[str]) -> Dict[str, dict]:
+        """Stored parses for the given file hashes, keyed by hash, in the
+        same shape parse_ticket_pdf returns plus `stored`/`confirmed_at`.
+        Two queries regardless of how many files."""
+        if not file_hashes:
+            return {}
+        marks = ",".join("?" * len(file_hashes))
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(
+                f"SELECT * FROM tickets WHERE file_hash IN ({marks})", file_hashes
+            ) as cursor:
+                tickets = {r["id"]: dict(r) for r in await cursor.fetchall()}
+            if not tickets:
+                return {}
+            pks = list(tickets)
+            async with db.execute(
+                f"""SELECT * FROM ticket_lines WHERE ticket_pk IN ({",".join("?" * len(pks))})
+                    ORDER BY ticket_pk, line_no""",
+                pks
+            ) as cursor:
+                lines = await cursor.fetchall()
+        items = {pk: [] for pk in pks}
+        for ln in lines:
+            items[ln["ticket_pk"]].append({
+                "line": ln["line"], "qty": ln["qty"], "name": ln["name"],
+                "unit_price": ln["unit_price"], "total_price": ln["total_price"],
+            })
+        out = {}
+        for pk, t in tickets.items():
+            result = {
+                "items": items[pk],
+                "date": self._ticket_date_display(t["ticket_date"]),
+                "ticket_id": t["ticket_id"],
+                "total": t["total"],
+                "raw_text": "",
+                "stored": True,
+                "confirmed_at": t["confirmed_at"],
+            }
+            if t["ocr"]:
+                result["ocr"] = True
+            out[t["file_hash"]] = result
+        return out
+
+    async def store_ticket(self, file_hash: str, parsed: dict, source: str = "pdf") -> dict:
+        """Archive a freshly parsed ticket with its lines, once.
+
+        If the same ticket_id is already stored (same ticket, different
+        file) nothing is written. Returns {stored, confirmed_at} for the
+        archived ticket so the caller can warn about a repeat import."""
+        ticket_id = parsed.get("ticket_id")
+        async with aiosqlite.connect(self.db_path) as db:
+            if ticket_id:
+                async with db.execute(
+                    "SELECT confirmed_at FROM tickets WHERE ticket_id = ?", (ticket_id,)
+                ) as cursor:
+                    row = await cursor.fetchone()
+                if row is not None:
+                    return {"stored": True, "confirmed_at": row[0]}
+            cursor = await db.execute(
+                """INSERT OR IGNORE INTO tickets (ticket_id, file_hash, source, ticket_date, total, ocr)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (ticket_id, file_hash, source, self._ticket_date_iso(parsed.get("date")),
+                 parsed.get("total"), 1 if parsed.get("ocr") else 0)
+            )
+            if cursor.rowcount:
+                ticket_pk = cursor.lastrowid
+                await db.executemany(
+                    """INSERT INTO ticket_lines (ticket_pk, line_no, line, name, qty, unit_price, total_price)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    [(ticket_pk, i, it["line"], it["name"], it["qty"], it.get("unit_price"), it.get("total_price"))
+                     for i, it in enumerate(parsed.get("items") or [])]
+                )
+            await db.commit()
+        return {"stored": False, "confirmed_at": None}
+
+    async def check_tickets(self, ticket_ids: List[str]) -> dict:
+        """Read-only duplicate guard before a ticket goes into stock: which
+        of `ticket_ids` were already confirmed, and when. Unknown ids are
+        ignored. Nothing is marked here — bulk_update_stock stamps
+        confirmed_at in the same transaction as the stock it adds."""
+        ids = sorted({t for t in ticket_ids if t})
+        if not ids:
+            return {"already_confirmed": []}
+        marks = ",".join("?" * len(ids))
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                f"""SELECT ticket_id, confirmed_at FROM tickets
+                    WHERE ticket_id IN ({marks}) AND confirmed_at IS NOT NULL""",
+                ids
+            ) as cursor:
+                already = [{"ticket_id": r[0], "confirmed_at": r[1]} for r in await cursor.fetchall()]
+        return {"already_confirmed": already}
+
+    async def _mark_tickets_confirmed(self, db, ticket_ids: List[str]) -> List[str]:
+        """Stamp confirmed_at on the given tickets, inside the caller's
+        transaction. Returns the ids that were marked (unknown ids are
+        skipped)."""
+        ids = sorted({t for t in ticket_ids if t})
+        if not ids:
+            return []
+        marks = ",".join("?" * len(ids))
+        await db.execute(
+            f"UPDATE tickets SET confirmed_at = ? WHERE ticket_id IN ({marks})",
+            [datetime.now().isoformat(timespec="seconds")] + ids
+        )
+        async with db.execute(f"SELECT ticket_id FROM tickets WHERE ticket_id IN ({marks})", ids) as cursor:
+            return [r[0] for r in await cursor.fetchall()]
+
+    async def confirm_tickets(self, ticket_ids: List[str]) -> dict:
+        """Mark tickets as added to stock when none of their lines went
+        through bulk_update_stock (e.g. every line was a scale refill)."""
+        async with aiosqlite.connect(self.db_path) as db:
+            confirmed = await self._mark_tickets_confirmed(db, ticket_ids)
+            await db.commit()
+        return {"confirmed": confirmed}
+
+    # --- Barcode lookup cache ----------------------------------------------
+
+    async def get_barcode_cache(self, barcode: str) -> Optional[dict]:
+        """Cached Open*Facts answer for `barcode` as
+        {found, source, result, fetched_at}, or None if never looked up."""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                "SELECT found, source, payload, fetched_at FROM barcode_cache WHERE barcode = ?",
+                (barcode,)
+            ) as cursor:
+                row = await cursor.fetchone()
+        if row is None:
+            return None
+        return {
+            "found": bool(row[0]),
+            "source": row[1],
+            "result": json.loads(row[2]) if row[2] else {"found": False},
+            "fetched_at": row[3],
+        }
+
+    async def put_barcode_cache(self, barcode: str, result: dict, fetched_at: float):
+        """Store (or replace) the lookup result for `barcode`."""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                """INSERT OR REPLACE INTO barcode_cache (barcode, found, source, payload, fetched_at)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (barcode, 1 if result.get("found") else 0, result.get("source"),
+                 json.dumps(result), fetched_at)
+            )
+            await db.commit()
+
+    # --- Offline Open Food Facts mirror ------------------------------------
+
+    async def get_off_mirror_product(self, barcode: str) -> Optional[dict]:
+        """Mirror row for any GTIN spelling of `barcode`, in the same shape
+        as a network lookup result, or None."""
+        candidates = gtin_candidates(barcode)
+        if not candidates:
+            return None
+        marks = ",".join("?" * len(candidates))
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(
+                f"SELECT * FROM off_mirror WHERE barcode IN ({marks}) LIMIT 1", candidates
+            ) as cursor:
+                row = await cursor.fetchone()
+        if row is None:
+            return None
+        return {
+            "found": True,
+            "name": row["name"],
+            "brand": row["brand"] or "",
+            "category": row["category"] or "Otros",
+            "image_url": "",
+            "package_quantity": row["quantity"] or "",
+            "weight_g": row["weight_g"],
+            "kcal_100g": row["kcal_100g"],
+            "proteins_100g": row["proteins_100g"],
+            "carbs_100g": row["carbs_100g"],
+            "fat_100g": row["fat_100g"],
+            "source": "Open Food Facts (offline)"
+        }
+
+    async def count_off_mirror(self) -> int:
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute("SELECT COUNT(*) FROM off_mirror") as cursor:
+                return (await cursor.fetchone())[0]
+
     # =======================================================================
     # Cook Sessions — guided cook on a kitchen scale
     # =======================================================================
@@ -1848,11 +3287,18 @@ class Database:
             await db.commit()
             return cursor.rowcount
 
-    async def complete_cook_session(self, session_id: int) -> dict:
+    async def complete_cook_session(self, session_id: int,
+                                    output: Optional[CookSessionComplete] = None) -> dict:
         """Close the session: deduct stock for every confirmed step that maps
-        to a product, log movements as 'consumed_in_recipe', mark linked diet
-        plan as consumed if any. Skipped steps and steps without a product
-        barcode are ignored for stock purposes."""
+        to a product, log movements as 'consumed_in_recipe', add the cooked
+        output batch when the recipe has output_qty and the caller passed the
+        output product, mark linked diet plan as consumed if any. Skipped
+        steps and steps without a product barcode are ignored for stock
+        purposes.
+
+        All of it is one transaction: the session is flipped to 'completed'
+        first with a status guard, so a double submit (or a crash halfway)
+        can never deduct twice nor leave a half-completed cook."""
         session = await self.get_cook_session(session_id)
         if not session:
             raise ValueError(f"Cook session {session_id} not found")
@@ -1861,6 +3307,7 @@ class Database:
 
         consumed = []
         skipped_no_product = []
+        needs: Dict[str, float] = {}
         for step in session.steps:
             if step.status != 'confirmed':
                 continue
@@ -1868,29 +3315,62 @@ class Database:
                 skipped_no_product.append(step.custom_name or '(sin nombre)')
                 continue
             qty = step.actual_qty if step.actual_qty is not None else step.target_qty
-            await self.update_stock(step.product_barcode, StockUpdate(
-                quantity=-float(qty),
-                reason='consumed_in_recipe'
-            ))
+            needs[step.product_barcode] = needs.get(step.product_barcode, 0.0) + float(qty)
             consumed.append({'barcode': step.product_barcode, 'qty': qty})
 
+        output_added = None
         async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                "UPDATE cook_sessions SET status = 'completed', completed_at = ? "
-                "WHERE id = ?",
-                (datetime.now(), session_id)
-            )
-            if session.diet_plan_id is not None:
-                await db.execute(
-                    "UPDATE diet_plans SET is_consumed = 1 WHERE id = ?",
-                    (session.diet_plan_id,)
+            try:
+                cursor = await db.execute(
+                    "UPDATE cook_sessions SET status = 'completed', completed_at = ? "
+                    "WHERE id = ? AND status = 'active'",
+                    (datetime.now(), session_id)
                 )
-            await db.commit()
+                if cursor.rowcount == 0:
+                    raise ValueError(f"Cook session {session_id} is not active")
+
+                # Scale readings win over the book stock: a step that weighed
+                # more than we think we have just empties the product.
+                await self._deduct_fifo(db, needs)
+                await self._log_movements(db, [
+                    (c['barcode'], -float(c['qty']), 'consumed_in_recipe', None) for c in consumed
+                ])
+
+                if output is not None and output.output_barcode:
+                    async with db.execute(
+                        """SELECT r.output_qty FROM recipes r
+                           JOIN products p ON p.barcode = ?
+                           WHERE r.id = ?""",
+                        (output.output_barcode, session.recipe_id)
+                    ) as cur:
+                        row = await cur.fetchone()
+                    if row and (row[0] or 0) > 0:
+                        qty = output.quantity if output.quantity is not None else session.servings
+                        await self._apply_stock_update(db, output.output_barcode, StockUpdate(
+                            quantity=qty,
+                            expiry_date=output.expiry_date,
+                            location=output.location,
+                        ))
+                        needs.setdefault(output.output_barcode, 0.0)
+                        output_added = {'barcode': output.output_barcode, 'qty': qty}
+
+                for barcode in needs:
+                    await self._sync_product_stock(db, barcode)
+                if session.diet_plan_id is not None:
+                    await db.execute(
+                        "UPDATE diet_plans SET is_consumed = 1 WHERE id = ?",
+                        (session.diet_plan_id,)
+                    )
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
 
         return {
             'session_id': session_id,
             'consumed': consumed,
             'skipped_no_product': skipped_no_product,
+            'output': output_added,
         }
 
 db = Database()
@@ -0,0 +1,93 @@
+"""
+GTIN helpers — pure string logic shared by the resolver and the lookups.
+
+Scanners hand us the same product in several shapes: the Mercadona QR carries
+a GTIN-14 (`08436021419262`), the paper label an EAN-13 (`8436021419262`) and
+US imports a 12-digit UPC-A. They are all the same number left-padded with
+zeros, so we compare them on their GTIN-14 form.
+
+Variable-measure EAN-13s (GS1 restricted circulation, first digit `2`) are
+printed in store: `2` + 6-digit article + 5-digit value + check digit. The
+first 7 chars identify the cut (`2302813` = "cerdo a tacos"). What the value
+means is up to the store: the price of that tray in euro cents (Mercadona)
+or its net weight in grams (kg with 3 decimals). GS1 leaves the 20-29 range
+to each retailer, so the weight ranges are configured, not guessed:
+VARIABLE_WEIGHT_PREFIXES lists the leading digits ("21,22") whose value is a
+weight; every other `2` label is read as a price.
+"""
+import os
+from typing import List, Optional, Tuple
+
+WEIGHT_PREFIXES: Tuple[str, ...] = tuple(
+    p.strip() for p in os.getenv("VARIABLE_WEIGHT_PREFIXES", "").split(",") if p.strip()
+)
+
+
+def ean_check_digit(body: str) -> int:
+    """GS1 mod-10 check digit for the digits *before* the check digit."""
+    total = 0
+    for i, ch in enumerate(reversed(body)):
+        total += int(ch) * (3 if i % 2 == 0 else 1)
+    return (10 - total % 10) % 10
+
+
+def is_valid_gtin(code: str) -> bool:
+    if not code.isdigit() or len(code) not in (8, 12, 13, 14):
+        return False
+    return ean_check_digit(code[:-1]) == int(code[-1])
+
+
+def normalize_gtin(code: str) -> str:
+    """Canonical form used for display and storage: GTIN-14 / EAN-13 / UPC-A
+    all collapse to EAN-13 when the extra leading digits are zeros. Anything
+    that isn't a plain 12-14 digit code is returned trimmed but untouched."""
+    code = (code or "").strip()
+    if code.isdigit() and 12 <= len(code) <= 14:
+        g14 = code.zfill(14)
+        return g14[1:] if g14[0] == "0" else g14
+    return code
+
+
+def gtin_candidates(code: str) -> List[str]:
+    """Every spelling the same GTIN may have been stored under, original
+    first. `08436021419262` -> [`08436021419262`, `8436021419262`, ...]."""
+    code = (code or "").strip()
+    out = [code] if code else []
+    if code.isdigit() and 8 <= len(code) <= 14:
+        g14 = code.zfill(14)
+        for i in range(0, 3):
+            if g14[:i].strip("0") == "":
+                cand = g14[i:]
+                if cand not in out:
+                    out.append(cand)
+    return out
+
+
+def is_variable_measure(code: str) -> bool:
+    return len(code) == 13 and code.isdigit() and code[0] == "2"
+
+
+def variable_measure_prefix(code: str) -> Optional[str]:
+    """7-char article prefix of a variable-measure EAN-13, else None."""
+    return code[:7] if is_variable_measure(code) else None
+
+
+def decode_variable_measure(code: str, weight_prefixes: Tuple[str, ...] = WEIGHT_PREFIXES) -> Optional[dict]:
+    """Split a `2xxxxxx` EAN-13 into its article prefix and embedded value.
+    Returns None for any other code. `kind` is 'weight' (with `weight_g`)
+    when the code starts with one of `weight_prefixes`, else 'price' (with
+    `price_eur`). `valid` reports the check digit so a misread tray label
+    can be flagged instead of silently priced."""
+    if not is_variable_measure(code):
+        return None
+    value = int(code[7:12])
+    out = {
+        "prefix": code[:7],
+        "value": value,
+        "valid": ean_check_digit(code[:12]) == int(code[12]),
+    }
+    if any(code.startswith(p) for p in weight_prefixes):
+        out.update(kind="weight", weight_g=float(value))
+    else:
+        out.update(kind="price", price_eur=round(value / 100, 2))
+    return out
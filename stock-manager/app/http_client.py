@@ -0,0 +1,77 @@
+"""
+Shared outbound HTTP client.
+
+One `httpx.AsyncClient` for the whole app, opened in `lifespan` and closed on
+shutdown, so lookups against the same few hosts (the four Open*Facts APIs)
+reuse pooled keep-alive connections instead of paying DNS + TCP + TLS on
+every scan. Any new outbound integration should go through `http_client.get()`
+rather than creating its own client.
+
+HTTP/2 is used when the optional `h2` package is installed (`pip install
+httpx[http2]`); otherwise the client silently stays on HTTP/1.1.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401
+    _H2_AVAILABLE = True
+except ImportError:
+    _H2_AVAILABLE = False
+
+HTTP2_ENABLED = _H2_AVAILABLE and os.getenv("HTTP2", "1") != "0"
+
+# Four Open*Facts hosts queried concurrently per scan, plus headroom for the
+# macro back-fill. Idle connections are kept for 60s — a scan session is a
+# burst of lookups a few seconds apart.
+LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0)
+# Short connect timeout: a host that can't even accept the connection is
+# down, no point waiting. Reads get more slack (OFF can be slow under load).
+TIMEOUT = httpx.Timeout(connect=3.0, read=5.0, write=5.0, pool=5.0)
+
+HEADERS = {
+    "User-Agent": "StockManager-HomeAssistant/1.0"
+}
+
+
+class SharedHttpClient:
+    def __init__(self) -> None:
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _create(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            http2=HTTP2_ENABLED,
+            limits=LIMITS,
+            timeout=TIMEOUT,
+            headers=HEADERS,
+            follow_redirects=True,
+        )
+
+    async def start(self) -> None:
+        if self._client is None:
+            self._client = self._create()
+            logger.info("Shared HTTP client started (http2=%s).", HTTP2_ENABLED)
+
+    async def stop(self) -> None:
+        if self._client is None:
+            return
+        await self._client.aclose()
+        self._client = None
+        logger.info("Shared HTTP client closed.")
+
+    def get(self) -> httpx.AsyncClient:
+        """The app-wide client. Created lazily if used outside `lifespan`
+        (scripts, the Telegram bot started on its own)."""
+        if self._client is None:
+            self._client = self._create()
+        return self._client
+
+
+http_client = SharedHttpClient()
@@ -0,0 +1,136 @@
+"""
+Macro back-fill job.
+
+Looks up every product with missing macros against the Open*Facts sources
+and collects the suggestions the user can then accept in bulk. The job runs
+as a background task independent of any HTTP request: clients subscribe and
+receive the events produced so far plus new ones as they arrive, so a page
+reload (or a second tab) re-attaches to the same run instead of starting over.
+
+Lookups go through `get_product_from_barcode`, so they share the barcode
+cache with interactive scans, but as background lookups: they queue on
+their own per-host rate limiters and never hold up a scan.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from .barcode_service import get_product_from_barcode
+from .database import db
+
+logger = logging.getLogger(__name__)
+
+# In-flight lookups. Each fans out to the four sources, which are rate
+# limited per host anyway — more workers would just queue on the limiter.
+MAX_CONCURRENCY = 4
+
+
+def _suggestion(product: dict, data: Dict[str, Any]) -> Optional[dict]:
+    if not data or not data.get("found") or data.get("kcal_100g") is None:
+        return None
+    return {
+        "type": "suggestion",
+        "barcode": product["barcode"],
+        "name": product["name"],
+        "source": data.get("source"),
+        "suggested": {
+            "weight_g": data.get("weight_g"),
+            "kcal_100g": data.get("kcal_100g"),
+            "proteins_100g": data.get("proteins_100g"),
+            "carbs_100g": data.get("carbs_100g"),
+            "fat_100g": data.get("fat_100g"),
+            "image_url": data.get("image_url"),
+            "package_quantity": data.get("package_quantity")
+        }
+    }
+
+
+class MacroFillJob:
+    def __init__(self) -> None:
+        self._task: Optional[asyncio.Task] = None
+        self._events: List[dict] = []
+        self._changed = asyncio.Event()
+        self.total = 0
+        self.done = 0
+        self.found = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def status(self) -> dict:
+        return {"running": self.running, "total": self.total,
+                "done": self.done, "found": self.found}
+
+    def start(self) -> None:
+        """Start a new run unless one is already in progress."""
+        if self.running:
+            return
+        self._events = []
+        self.total = self.done = self.found = 0
+        self._task = asyncio.create_task(self._run(), name="macro_fill")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _emit(self, event: dict) -> None:
+        self._events.append(event)
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _run(self) -> None:
+        try:
+            products = await db.get_products_missing_macros()
+            self.total = len(products)
+            self._emit({"type": "start", "total": self.total})
+            sem = asyncio.Semaphore(MAX_CONCURRENCY)
+
+            async def _one(product: dict):
+                async with sem:
+                    try:
+                        data = await get_product_from_barcode(product["barcode"], background=True)
+                    except Exception as e:
+                        logger.warning(f"Macro fill lookup failed for {product['barcode']}: {e}")
+                        data = None
+                self.done += 1
+                event = _suggestion(product, data)
+                if event:
+                    self.found += 1
+                    self._emit(event)
+                else:
+                    self._emit({"type": "progress", "done": self.done, "total": self.total})
+
+            await asyncio.gather(*(_one(p) for p in products))
+            self._emit({"type": "done", **self.status(), "running": False})
+        except asyncio.CancelledError:
+            self._emit({"type": "done", **self.status(), "running": False, "cancelled": True})
+            raise
+        except Exception as e:
+            logger.error(f"Macro fill job failed: {e}", exc_info=True)
+            self._emit({"type": "error", "detail": str(e)})
+
+    async def events(self) -> AsyncIterator[dict]:
+        """Replay this run's events, then follow it live until it ends."""
+        i = 0
+        while True:
+            while i < len(self._events):
+                event = self._events[i]
+                i += 1
+                yield event
+                if event["type"] in ("done", "error"):
+                    return
+            if not self.running:
+                return
+            await self._changed.wait()
+
+
+macro_fill_job = MacroFillJob()
@@ -1,25 +1,37 @@
-from fastapi import FastAPI, HTTPException, Request, File, UploadFile
+from fastapi import FastAPI, HTTPException, Request, File, UploadFile, Query
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse, HTMLResponse
+from fastapi.responses import FileResponse, JSONResponse, HTMLResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
 import uvicorn
 import os
 import logging
-from typing import List, Optional
+import json
+import gzip
+import hashlib
+from datetime import date, timedelta
+from typing import Dict, List, Optional
 
 from .database import db
 from .models import (
-    Product, ProductCreate, StockUpdate, ProductUpdate, Batch, BatchUpdate, BatchStockUpdate,
-    MacroGoals, MacroGoalsUpdate, Recipe, RecipeCreate, DietPlan, DietPlanCreate,
+    Product, ProductCreate, ProductSearchResult, StockUpdate, BulkStockUpdate, ProductUpdate, Batch, BatchUpdate, BatchStockUpdate,
+    MacroGoals, MacroGoalsUpdate, Recipe, RecipeCreate, RecipeAvailability, DietPlan, DietPlanCreate,
+    PlanGenerateRequest, PlanGenerateResult, ShoppingBasket,
     MovementUpdate, BodyWeight, BodyWeightCreate,
     Scale, ScaleCreate, ScaleUpdate, ScaleWeight, ScaleEvent,
     PendingRefill, PendingRefillCreate, PendingRefillResolve,
-    PriceRecord, PriceHistoryEntry, AltBarcodeLink,
-    CookSession, CookSessionCreate, CookStepConfirm, CookStepView,
+    PriceRecord, PriceHistoryEntry, PriceHistoryBatchRequest, PriceHistorySeries, AltBarcodeLink,
+    CookSession, CookSessionCreate, CookSessionComplete, CookStepConfirm, CookStepView,
+    TicketAliasLink, CodeResolution, TicketConfirm,
 )
-from .barcode_service import get_product_from_barcode
+from .barcode_service import get_product_from_barcode, get_source_stats
 from .telegram_service import telegram_bot
 from .ha_websocket import ha_bridge
+from .http_client import http_client
+from .macro_fill import macro_fill_job
+from . import off_mirror
+from .worker_pool import worker_pool
+from . import charts, planner, shopping
 import asyncio
 # Configure logging
 log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
@@ -36,6 +48,9 @@ async def lifespan(app: FastAPI):
     # --- Startup ---
     logger.info("Initializing Stock Manager v0.7.0.")
     await db.init_db()
+
+    # Pooled outbound client (Open*Facts lookups) shared by every request.
+    await http_client.start()
     
     # Start Telegram Bot in background and store task
     bot_task = asyncio.create_task(telegram_bot.run())
@@ -59,6 +74,11 @@ async def lifespan(app: FastAPI):
     except asyncio.CancelledError:
         logger.info("Telegram Bot task cancelled successfully")
 
+    await macro_fill_job.stop()
+    await off_mirror.stop_import()
+    await worker_pool.stop()
+    await http_client.stop()
+
 # Create FastAPI app
 app = FastAPI(
     title="Stock Manager API",
@@ -103,11 +123,65 @@ async def read_root():
     )
 
 # API endpoints
+
+@app.get("/api/bootstrap")
+async def get_bootstrap(request: Request, start_date: Optional[str] = None, end_date: Optional[str] = None):
+    """Initial app state in one round trip: products, recipes, macro goals,
+    today's movements, the week's diet plans (start_date..end_date, this
+    week by default), latest body weight and frequent products. The reads
+    run concurrently, each on its own connection. `revisions` hashes every
+    section and `revision` combines them, so a client can tell whether
+    anything changed since its last load. The body is gzipped here when the
+    client accepts it (no global middleware: it would buffer the NDJSON
+    streams)."""
+    if not start_date or not end_date:
+        today = date.today()
+        monday = today - timedelta(days=today.weekday())
+        start_date, end_date = monday.isoformat(), (monday + timedelta(days=6)).isoformat()
+    products, recipes, goals, today_movements, diet_plans, weight, frequent = await asyncio.gather(
+        db.get_all_products(),
+        db.get_all_recipes(),
+        db.get_macro_goals(),
+        db.get_today_movements(),
+        db.get_diet_plans(start_date, end_date),
+        db.get_latest_body_weight(),
+        db.get_frequent_products(),
+    )
+    payload = jsonable_encoder({
+        "products": products,
+        "recipes": recipes,
+        "macro_goals": goals,
+        "today_movements": today_movements,
+        "diet_plans": diet_plans,
+        "body_weight": weight or {},
+        "frequent_products": frequent,
+    })
+    revisions = {
+        key: hashlib.sha1(json.dumps(value, sort_keys=True, separators=(",", ":")).encode()).hexdigest()[:12]
+        for key, value in payload.items()
+    }
+    payload["revisions"] = revisions
+    payload["revision"] = hashlib.sha1("".join(revisions[k] for k in sorted(revisions)).encode()).hexdigest()[:16]
+    payload["start_date"], payload["end_date"] = start_date, end_date
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= 1024 and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, media_type="application/json", headers=headers)
+
 @app.get("/api/products", response_model=List[Product])
 async def get_products():
     """Get all products"""
     return await db.get_all_products()
 
+@app.get("/api/products/search", response_model=ProductSearchResult)
+async def search_products(q: str, limit: int = 20, offset: int = 0):
+    """Ranked full-text product search (name, category, barcodes), paginated."""
+    limit = max(1, min(limit, 100))
+    items, total = await db.search_products(q, limit=limit, offset=max(0, offset))
+    return {"items": items, "total": total}
+
 @app.get("/api/products/low-stock/list", response_model=List[Product])
 async def get_low_stock():
     """Get products with low stock"""
@@ -115,55 +189,32 @@ async def get_low_stock():
 
 @app.get("/api/products/macro-fill-preview")
 async def macro_fill_preview():
-    """Find products with missing macros and try to fetch them from APIs"""
-    products = await db.get_all_products()
-    # Filter products with missing macros (kcal is usually the best indicator)
-    to_fill = [p for p in products if (p.kcal_100g is None or p.kcal_100g == 0) and len(p.barcode) >= 8]
-    
-    results = []
-    # Limit to 20 for safety/performance in one go, user can run it multiple times
-    for p in to_fill[:20]:
-        data = await get_product_from_barcode(p.barcode)
-        if data and data.get("found"):
-            # Check if it actually has nutritional info
-            if data.get("kcal_100g") is not None:
-                results.append({
-                    "barcode": p.barcode,
-                    "name": p.name,
-                    "suggested": {
-                        "weight_g": data.get("weight_g"),
-                        "kcal_100g": data.get("kcal_100g"),
-                        "proteins_100g": data.get("proteins_100g"),
-                        "carbs_100g": data.get("carbs_100g"),
-                        "fat_100g": data.get("fat_100g"),
-                        "image_url": data.get("image_url"),
-                        "package_quantity": data.get("package_quantity")
-                    }
-                })
-    return results
+    """Look up macros for every product missing them and stream suggestions
+    as NDJSON (one JSON event per line) while they arrive. Starts the
+    background job if it isn't running; otherwise attaches to the current
+    run, replaying what was found so far."""
+    macro_fill_job.start()
+
+    async def _ndjson():
+        async for event in macro_fill_job.events():
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(_ndjson(), media_type="application/x-ndjson")
+
+@app.get("/api/products/macro-fill-status")
+async def macro_fill_status():
+    """Progress of the macro back-fill job"""
+    return macro_fill_job.status()
 
 @app.post("/api/products/macro-fill-confirm")
 async def macro_fill_confirm(updates: List[dict]):
-    """Update products with the nutritional data confirmed by the user"""
-    updated_count = 0
-    for up in updates:
-        barcode = up.get("barcode")
-        if barcode:
-            try:
-                macro_data = ProductUpdate(
-                    weight_g=up.get("weight_g"),
-                    kcal_100g=up.get("kcal_100g"),
-                    proteins_100g=up.get("proteins_100g"),
-                    carbs_100g=up.get("carbs_100g"),
-                    fat_100g=up.get("fat_100g"),
-                    image_url=up.get("image_url"),
-                    package_quantity=up.get("package_quantity")
-                )
-                await db.update_product(barcode, macro_data)
-                updated_count += 1
-            except Exception as e:
-                logger.error(f"Error updated macros for {barcode}: {e}")
-                
+    """Update products with the nutritional data confirmed by the user,
+    all rows in a single transaction"""
+    try:
+        updated_count = await db.bulk_update_product_macros(updates)
+    except Exception as e:
+        logger.error(f"Error updating macros: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error actualizando macros: {str(e)}")
     return {"message": f"Se han actualizado {updated_count} productos correctamente"}
 
 @app.get("/api/products/{barcode}", response_model=Product)
@@ -174,6 +225,27 @@ async def get_product(barcode: str):
         raise HTTPException(status_code=404, detail="Product not found")
     return product
 
+@app.get("/api/barcode-sources")
+async def barcode_source_stats():
+    """Latency, error counters and circuit breaker state per Open*Facts source"""
+    return get_source_stats()
+
+@app.get("/api/off-mirror")
+async def off_mirror_status():
+    """Size of the offline Open Food Facts mirror and import progress"""
+    return {"products": await db.count_off_mirror(), **off_mirror.import_status}
+
+@app.post("/api/off-mirror/import", status_code=202)
+async def off_mirror_import(body: dict):
+    """Import an OFF JSONL/CSV dump (optionally .gz) already on the HA box,
+    e.g. under /share, into the offline mirror. Runs in the background."""
+    path = (body or {}).get("path")
+    if not path or not os.path.isfile(path):
+        raise HTTPException(status_code=400, detail="Fichero no encontrado")
+    if not off_mirror.start_import(path, db.db_path):
+        raise HTTPException(status_code=409, detail="Ya hay una importación en curso")
+    return off_mirror.import_status
+
 @app.get("/api/barcode/{barcode}")
 async def lookup_barcode(barcode: str):
     """Lookup product from Open Food Facts API by barcode"""
@@ -208,6 +280,20 @@ async def update_stock(barcode: str, update: StockUpdate):
     
     return await db.update_stock(barcode, update)
 
+@app.post("/api/stock/bulk", response_model=List[Product])
+async def bulk_update_stock(updates: List[BulkStockUpdate], ticket_ids: Optional[str] = None):
+    """Apply many stock updates (a whole ticket, a recipe) in one transaction.
+    All-or-nothing: an unknown product or insufficient stock on any line
+    rejects the whole request. Returns only the products that changed.
+    `ticket_ids` (comma-separated) are marked as confirmed in that same
+    transaction."""
+    ids = [t.strip() for t in ticket_ids.split(",") if t.strip()] if ticket_ids else None
+    try:
+        return await db.bulk_update_stock(updates, ids)
+    except ValueError as e:
+        status = 404 if str(e).startswith("Product not found") else 400
+        raise HTTPException(status_code=status, detail=str(e))
+
 @app.patch("/api/batches/{batch_id}", response_model=Batch)
 async def update_batch(batch_id: int, update: BatchUpdate):
     """Update batch expiry date"""
@@ -261,6 +347,30 @@ async def get_daily_kcal_series(days: int = 30):
     """Daily kcal consumed for the last N days."""
     return await db.get_daily_kcal_series(days)
 
+@app.get("/api/charts")
+async def get_charts(days: int = Query(30, alias="range"), barcode: Optional[str] = None, points: int = charts.MAX_POINTS,
+                     sections: str = "kcal,weight,prices"):
+    """Series for the charts view, limited to the last `range` days (0 = all
+    history) and downsampled to about `points` points each (see
+    app/charts.py). `barcode` is a comma-separated list of products for the
+    price series; `sections` picks which series to compute."""
+    wanted = {s.strip() for s in sections.split(",") if s.strip()}
+    since = (date.today() - timedelta(days=days)).isoformat() if days > 0 else None
+    barcodes = [b for b in (barcode or "").split(",") if b] if "prices" in wanted else []
+    kcal_rows, weight_rows, price_rows = await db.get_chart_rows(since, barcodes)
+    result = await worker_pool.run(
+        charts.build_charts,
+        kcal_rows if "kcal" in wanted else [],
+        weight_rows if "weight" in wanted else [],
+        price_rows, since, max(10, min(points, 1000)),
+    )
+    for key, section in (("kcal", "kcal"), ("kcal_avg", "kcal"), ("weight", "weight"),
+                         ("prices", "prices"), ("price_summary", "prices")):
+        if section not in wanted:
+            result.pop(key)
+    result["range"], result["since"] = days, since
+    return result
+
 @app.get("/api/stats/macro-goals", response_model=MacroGoals)
 async def get_macro_goals():
     """Get daily macro goals"""
@@ -320,7 +430,6 @@ async def export_data():
     file automatically — nobody has to remember to extend a fieldnames list."""
     import csv
     import io
-    from fastapi.responses import StreamingResponse
 
     data = await db.get_export_data()
 
@@ -355,9 +464,11 @@ async def ocr_ticket(file: UploadFile = File(...)):
     from . import ocr_service
     try:
         content = await file.read()
-        text = ocr_service.extract_text_from_image(content)
+        text = await worker_pool.run(ocr_service.extract_text_from_image, content)
         lines = ocr_service.parse_ticket_items(text)
-        return {"lines": lines, "raw": text}
+        # Learned aliases first: the frontend only fuzzy-scores lines missing here.
+        aliases = await db.resolve_ticket_aliases(lines)
+        return {"lines": lines, "raw": text, "aliases": aliases}
     except Exception as e:
         logger.error(f"OCR ticket error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error procesando ticket: {str(e)}")
@@ -368,12 +479,82 @@ async def ocr_ticket_pdf(file: UploadFile = File(...)):
     from . import ticket_pdf_service
     try:
         content = await file.read()
-        result = ticket_pdf_service.parse_ticket_pdf(content)
+        h = ticket_pdf_service.file_hash(content)
+        # Same file uploaded before: reuse the archived parse, no PDF work.
+        result = (await db.get_stored_tickets([h])).get(h)
+        if result is None:
+            result = await ticket_pdf_service.parse_ticket_pdf_pooled(content)
+            if result["items"]:
+                result.update(await db.store_ticket(h, result))
+        aliases = await db.resolve_ticket_aliases([it["name"] for it in result["items"]])
+        for it in result["items"]:
+            it["alias_barcode"] = aliases.get(it["name"])
         return result
     except Exception as e:
         logger.error(f"PDF ticket error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error procesando PDF: {str(e)}")
 
+@app.post("/api/ocr/ticket-pdf/batch")
+async def ocr_ticket_pdf_batch(files: List[UploadFile] = File(...)):
+    """Parse many Mercadona ticket PDFs (or zips of them) in one go.
+
+    Tickets are parsed in parallel, de-duplicated by ticket_id and returned
+    as one review payload: the per-ticket results plus a flat `items` list
+    where every item carries its ticket_id/date and learned alias."""
+    from . import ticket_pdf_service
+    try:
+        uploads = [(f.filename or "ticket.pdf", await f.read()) for f in files]
+        pdfs = ticket_pdf_service.expand_uploads(uploads)
+        known = await db.get_stored_tickets(
+            [ticket_pdf_service.file_hash(content) for _, content in pdfs]
+        )
+        batch = await ticket_pdf_service.parse_ticket_batch(pdfs, known)
+        for t in batch["tickets"]:
+            if not t.get("stored") and t["items"]:
+                t.update(await db.store_ticket(t["file_hash"], t))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"PDF ticket batch error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error procesando PDFs: {str(e)}")
+
+    items = []
+    for t in batch["tickets"]:
+        for it in t["items"]:
+            it["ticket_id"] = t.get("ticket_id")
+            it["date"] = t.get("date")
+            items.append(it)
+    # One alias lookup for the whole batch.
+    aliases = await db.resolve_ticket_aliases([it["name"] for it in items])
+    for it in items:
+        it["alias_barcode"] = aliases.get(it["name"])
+    for t in batch["tickets"]:
+        t.pop("raw_text", None)
+
+    batch["items"] = items
+    batch["total"] = round(sum(t.get("total") or 0 for t in batch["tickets"]), 2)
+    return batch
+
+@app.post("/api/tickets/check")
+async def check_tickets(body: TicketConfirm):
+    """Read-only duplicate check before adding tickets to stock:
+    `already_confirmed` lists the ones added before so the UI can ask."""
+    return await db.check_tickets(body.ticket_ids)
+
+@app.post("/api/tickets/confirm")
+async def confirm_tickets(body: TicketConfirm):
+    """Mark tickets as added to stock when no /stock/bulk call carried them
+    (every line was a scale refill). Otherwise /stock/bulk?ticket_ids=
+    marks them together with the stock."""
+    return await db.confirm_tickets(body.ticket_ids)
+
+@app.post("/api/ticket-aliases")
+async def learn_ticket_aliases(links: List[TicketAliasLink]):
+    """Remember the ticket line -> product pairs the user confirmed, so the
+    next ticket with the same lines is matched without fuzzy scoring."""
+    learned = await db.learn_ticket_aliases(links)
+    return {"learned": learned}
+
 @app.post("/api/products/{barcode}/alt-barcodes", response_model=Product)
 async def link_alt_barcode(barcode: str, link: AltBarcodeLink):
     """Attach an extra scannable code to an existing product so future scans
@@ -384,6 +565,15 @@ async def link_alt_barcode(barcode: str, link: AltBarcodeLink):
         raise HTTPException(status_code=404, detail="Product not found")
     return product
 
+@app.get("/api/resolve/{code}", response_model=CodeResolution)
+async def resolve_code(code: str):
+    """Resolve any scanned code (GTIN-14, EAN-13, UPC-A, variable-weight
+    `2xxxxxx` label) to a local product in one call. Never hits the network;
+    `match` is None when the code is unknown here. A variable-measure label's
+    value is read as a price unless its leading digits are listed in
+    VARIABLE_WEIGHT_PREFIXES (see app/gtin.py)."""
+    return await db.resolve_code(code)
+
 @app.post("/api/products/{barcode}/price", response_model=PriceHistoryEntry)
 async def record_product_price(barcode: str, record: PriceRecord):
     """Record an observed purchase price for a product."""
@@ -397,6 +587,14 @@ async def get_product_price_history(barcode: str, limit: int = 50):
     """Get price history for a product, newest first."""
     return await db.get_price_history(barcode, limit)
 
+@app.post("/api/price-history/batch", response_model=Dict[str, PriceHistorySeries])
+async def get_price_history_batch(request: PriceHistoryBatchRequest):
+    """Price history of many products in one query, grouped by barcode
+    (newest first, up to `limit` each, optionally only from `since`), with
+    min/median/last and a trend slope per product."""
+    limit = max(1, min(request.limit, 500))
+    return await db.get_price_history_batch(request.barcodes, limit, request.since)
+
 @app.patch("/api/batches/{batch_id}/price", response_model=Batch)
 async def patch_batch_price(batch_id: int, record: PriceRecord):
     """Edit the live price of a specific batch. This is a correction, NOT a new
@@ -456,9 +654,18 @@ async def import_data(file: UploadFile = File(...), clear: bool = False):
 # --- Recipes Endpoints ---
 
 @app.get("/api/recipes", response_model=List[Recipe])
-async def get_recipes():
-    """Get all recipes"""
-    return await db.get_all_recipes()
+async def get_recipes(meal_type: Optional[str] = None, tag: Optional[str] = None,
+                      max_time: Optional[int] = None, min_protein: Optional[float] = None):
+    """Get all recipes, optionally filtered by meal type, tag, max time
+    (minutes) and min protein per serving (g)"""
+    return await db.get_all_recipes(meal_type=meal_type, tag=tag, max_time=max_time,
+                                    min_protein=min_protein)
+
+@app.get("/api/recipes/availability", response_model=List[RecipeAvailability])
+async def get_recipe_availability():
+    """Per recipe: share of ingredients in stock, limiting ingredient and
+    servings the current stock makes. Kept up to date on every stock change."""
+    return await db.get_recipe_availability()
 
 @app.get("/api/recipes/{recipe_id}", response_model=Recipe)
 async def get_recipe(recipe_id: int):
@@ -496,30 +703,11 @@ async def consume_recipe(recipe_id: int, servings: float = 1.0):
     if not recipe:
         raise HTTPException(status_code=404, detail="Recipe not found")
     
-    # Process each ingredient
-    consumed = []
-    errors = []
-    
-    # We do a dry run first to check stock
-    for ing in recipe.ingredients:
-        if ing.product_barcode:
-            product = await db.get_product(ing.product_barcode)
-            needed = ing.quantity * servings
-            if product.stock < needed:
-                errors.append(f"Stock insuficiente para {product.name}: necesita {needed}{product.unit_type}, tiene {product.stock}")
-    
-    if errors:
-        raise HTTPException(status_code=400, detail=" | ".join(errors))
-    
-    # Final run: actually consume
-    for ing in recipe.ingredients:
-        if ing.product_barcode:
-            await db.update_stock(ing.product_barcode, StockUpdate(
-                quantity=-(ing.quantity * servings),
-                reason="consumed_in_recipe"
-            ))
-            consumed.append(ing.product_barcode)
-            
+    try:
+        consumed = await db.consume_recipe(recipe_id, servings)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     return {"message": f"Ingredientes de '{recipe.name}' consumidos del stock.", "consumed_barcodes": consumed}
 
 # --- Diet Plan Endpoints ---
@@ -534,6 +722,36 @@ async def create_diet_plan(plan: DietPlanCreate):
     """Add a meal to the diet plan"""
     return await db.create_diet_plan(plan)
 
+@app.post("/api/diet-plan/generate", response_model=PlanGenerateResult)
+async def generate_diet_plan(options: Optional[PlanGenerateRequest] = None):
+    """Plan a week against the macro goals (see app/planner.py). Mode
+    'pantry' also spends current batch stock, soonest-expiring first.
+    Returns the plan only; the client saves it with PUT /api/diet-plan/week."""
+    options = options or PlanGenerateRequest()
+    if options.mode not in planner.MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown mode: {options.mode}")
+    recipes = await db.get_planner_recipes()
+    goals = (await db.get_macro_goals()).model_dump()
+    requirements = budget = None
+    if options.mode == 'pantry':
+        requirements = await db.get_recipe_requirements()
+        budget = await db.get_pantry_budget()
+    try:
+        return await worker_pool.run(planner.plan_week, recipes, goals,
+                                     options.seed, options.time_budget_ms, options.mode,
+                                     requirements, budget, options.start)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.put("/api/diet-plan/week", response_model=List[DietPlan])
+async def replace_week_plans(start: str, plans: List[DietPlanCreate]):
+    """Replace the whole week starting at `start` (YYYY-MM-DD, a Monday) with
+    `plans`. Only the difference is written, in one transaction."""
+    try:
+        return await db.replace_week_plans(start, plans)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.patch("/api/diet-plan/{plan_id}", response_model=DietPlan)
 async def update_diet_plan(plan_id: int, is_consumed: bool):
     """Mark a planned meal as consumed or not"""
@@ -550,6 +768,20 @@ async def delete_diet_plan(plan_id: int):
         raise HTTPException(status_code=404, detail="Plan not found")
     return None
 
+@app.get("/api/shopping/basket", response_model=ShoppingBasket)
+async def get_shopping_basket(start: Optional[str] = None, plan: bool = True, min_stock: bool = True):
+    """What to buy: the week's unconsumed plans (week starting `start`, this
+    week by default) and/or the min_stock targets, minus stock, rounded to
+    whole packs and priced. See app/shopping.py."""
+    try:
+        monday = date.fromisoformat(start) if start else date.today() - timedelta(days=date.today().weekday())
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid start date: {start}")
+    catalog, recent = await db.get_shopping_catalog(
+        monday.isoformat(), (monday + timedelta(days=6)).isoformat(), shopping.RECENT_PRICES
+    )
+    return shopping.build_basket(catalog, recent, include_plan=plan, include_min_stock=min_stock)
+
 # --- Smart Scale Endpoints (ESP32 + HX711 integration) --------------------
 
 @app.get("/api/scales", response_model=List[Scale])
@@ -672,11 +904,12 @@ async def skip_cook_step(session_id: int):
     return session
 
 @app.post("/api/cook-sessions/{session_id}/complete")
-async def complete_cook_session(session_id: int):
-    """Finalize the session: deduct stock for every confirmed product step,
-    mark the linked diet plan as consumed if any."""
+async def complete_cook_session(session_id: int, payload: Optional[CookSessionComplete] = None):
+    """Finalize the session in one transaction: deduct stock for every
+    confirmed product step, add the cooked output batch if requested, mark
+    the linked diet plan as consumed if any."""
     try:
-        return await db.complete_cook_session(session_id)
+        return await db.complete_cook_session(session_id, payload)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
 
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 
 class Batch(BaseModel):
@@ -39,6 +39,11 @@ class Product(BaseModel):
     batches: List[Batch] = []
     last_updated: Optional[datetime] = None
 
+class ProductSearchResult(BaseModel):
+    """One page of a ranked product search plus the total hit count."""
+    items: List[Product] = []
+    total: int = 0
+
 class ProductCreate(BaseModel):
     barcode: str
     name: str
@@ -64,6 +69,30 @@ class AltBarcodeLink(BaseModel):
     future scans."""
     code: str
 
+class CodeResolution(BaseModel):
+    """What a scanned code resolves to. `match` is 'exact' (product barcode),
+    'alias' (a linked alt code) or 'prefix' (variable-weight article), or None
+    when nothing matched. `variable_measure` carries the decoded tray label
+    for `2xxxxxx` EAN-13s: prefix, value, valid and `kind` — 'price' with
+    price_eur, or 'weight' with weight_g for the VARIABLE_WEIGHT_PREFIXES
+    ranges."""
+    code: str
+    normalized: str
+    match: Optional[str] = None
+    product: Optional[Product] = None
+    variable_measure: Optional[dict] = None
+
+class TicketAliasLink(BaseModel):
+    """A ticket line confirmed against a product in the ticket review. The
+    backend normalizes `line` (drops qty, prices, accents) before storing, so
+    the raw OCR line or the clean PDF item name can be sent as-is."""
+    line: str
+    barcode: str
+
+class TicketConfirm(BaseModel):
+    """Ticket ids to check against (or mark as) already added to stock."""
+    ticket_ids: List[str]
+
 class StockUpdate(BaseModel):
     quantity: float
     expiry_date: Optional[str] = None
@@ -79,6 +108,10 @@ class StockUpdate(BaseModel):
     price_source_ref: Optional[str] = None   # e.g. ticket id
     price_observed_at: Optional[str] = None  # ISO datetime
 
+class BulkStockUpdate(StockUpdate):
+    """One line of POST /api/stock/bulk: a StockUpdate plus its product."""
+    barcode: str
+
 class ProductUpdate(BaseModel):
     name: Optional[str] = None
     category: Optional[str] = None
@@ -137,6 +170,7 @@ class Recipe(BaseModel):
     default_expiry_days: Optional[int] = None
     fridge_expiry_days: Optional[int] = None
     freezer_expiry_days: Optional[int] = None
+    # per serving, computed from the ingredients (recipe_macros cache)
     kcal: Optional[float] = None
     proteins: Optional[float] = None
     carbs: Optional[float] = None
@@ -164,6 +198,15 @@ class RecipeCreate(BaseModel):
     image_url: Optional[str] = None
     ingredients: List[dict] = []
 
+class RecipeAvailability(BaseModel):
+    recipe_id: int
+    ingredients: int = 0                    # distinct product ingredients
+    covered: float = 1.0                    # fraction of them with enough stock (0..1)
+    limiting_barcode: Optional[str] = None  # runs out first
+    limiting_name: Optional[str] = None
+    max_servings: Optional[float] = None    # None = no product ingredients
+    updated_at: Optional[datetime] = None
+
 class DietPlan(BaseModel):
     id: int
     date: str
@@ -182,6 +225,50 @@ class DietPlanCreate(BaseModel):
     custom_name: Optional[str] = None
     quantity: float = 1.0
 
+class PlanGenerateRequest(BaseModel):
+    """Options of POST /api/diet-plan/generate. Same seed → same week."""
+    seed: Optional[int] = None
+    time_budget_ms: int = 2000
+    mode: str = 'macros'          # 'macros' | 'pantry' (use up stock, expiring first)
+    start: Optional[str] = None   # Monday of the planned week (pantry mode); default this week
+
+class PlanGenerateResult(BaseModel):
+    days: List[Dict[str, List[int]]]  # Monday..Sunday, {meal_id: [recipe_id]}
+    scores: List[float]               # objective per day (lower is better)
+    seed: int
+    elapsed_ms: float
+    # pantry mode only: soonest-expiring stock the week cooks, and stock it
+    # would need beyond what is there ({barcode: qty})
+    rescued: Dict[str, float] = {}
+    shortages: Dict[str, float] = {}
+
+class ShoppingPick(BaseModel):
+    barcode: str
+    name: str
+    packs: int
+    pack_size: float
+    unit_price: Optional[float] = None  # €/pack
+    price_source: Optional[str] = None  # 'last_price' | 'price_history'
+
+class ShoppingLine(BaseModel):
+    barcode: str
+    name: str
+    category: str
+    unit_type: str
+    needed: float          # product units still missing (plan + min_stock - stock)
+    planned: float = 0
+    min_stock: float = 0
+    stock: float = 0
+    packs: Optional[int] = None
+    cost: Optional[float] = None
+    picks: List[ShoppingPick] = []
+
+class ShoppingBasket(BaseModel):
+    lines: List[ShoppingLine]
+    total: float
+    priced: int
+    unpriced: int
+
 class MovementUpdate(BaseModel):
     quantity: float  # new absolute consumed quantity (positive); backend stores as negative quantity_change
 
@@ -285,6 +372,20 @@ class PriceHistoryEntry(BaseModel):
     observed_at: str
     created_at: Optional[datetime] = None
 
+class PriceHistoryBatchRequest(BaseModel):
+    barcodes: List[str]
+    limit: int = 50               # newest observations per product
+    since: Optional[str] = None   # ISO date/datetime; older rows are skipped
+
+class PriceHistorySeries(BaseModel):
+    """One product's observations (newest first) and their summary."""
+    entries: List[PriceHistoryEntry] = []
+    count: int = 0
+    min: Optional[float] = None
+    median: Optional[float] = None
+    last: Optional[float] = None
+    slope_per_day: Optional[float] = None  # least-squares trend, €/pack per day
+
 
 # --- Cook Session (guided cook on a kitchen scale) --------------------------
 
@@ -319,6 +420,15 @@ class CookSessionCreate(BaseModel):
     diet_plan_id: Optional[int] = None
     servings: float = 1.0
 
+class CookSessionComplete(BaseModel):
+    """Optional body of /complete: where the cooked result goes. The frontend
+    ensures/creates the output product and passes its barcode; the backend
+    adds the batch in the same transaction that deducts the ingredients."""
+    output_barcode: Optional[str] = None
+    quantity: Optional[float] = None   # output units; defaults to session servings
+    expiry_date: Optional[str] = None
+    location: Optional[str] = None
+
 class CookStepConfirm(BaseModel):
     """Confirm the current step with the actual measured (or manually entered)
     quantity. The frontend supplies actual_qty; for non-weighable steps it
@@ -69,25 +69,31 @@ def extract_text_from_image(image_bytes: bytes) -> str:
         # Load image from bytes
         image = Image.open(BytesIO(image_bytes))
         image_array = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-
-        # Preprocess
-        logger.info("Preprocessing image...")
-        processed = preprocess_image(image_array)
-
-        # Extract text using Tesseract OCR
-        logger.info("Running Tesseract OCR...")
-        text = pytesseract.image_to_string(
-            processed, lang='spa', config='--psm 6'
-        ).strip()
-        lines = [l for l in text.split('\n') if l.strip()]
-        logger.info(f"Extracted {len(lines)} lines of text")
-
-        return text
+        return extract_text_from_array(image_array)
 
     except Exception as e:
         logger.error(f"Error in OCR: {str(e)}", exc_info=True)
         raise
 
+def extract_text_from_array(image_array: np.ndarray) -> str:
+    """
+    Preprocess + Tesseract on an already decoded BGR or grayscale image
+    (e.g. a rasterized PDF page).
+    """
+    # Preprocess
+    logger.info("Preprocessing image...")
+    processed = preprocess_image(image_array)
+
+    # Extract text using Tesseract OCR
+    logger.info("Running Tesseract OCR...")
+    text = pytesseract.image_to_string(
+        processed, lang='spa', config='--psm 6'
+    ).strip()
+    lines = [l for l in text.split('\n') if l.strip()]
+    logger.info(f"Extracted {len(lines)} lines of text")
+
+    return text
+
 def parse_ticket_items(text: str) -> list:
     """
     Parse ticket text and extract product information
@@ -0,0 +1,201 @@
+"""
+Offline Open Food Facts mirror importer.
+
+Loads a user-supplied OFF dump into the `off_mirror` table so barcode lookups
+keep working without internet (and skip the network when they do have it).
+Accepted inputs, optionally gzip-compressed:
+
+- the JSONL export (`openfoodfacts-products.jsonl.gz`), one product per line
+- the CSV export (`en.openfoodfacts.org.products.csv.gz`), tab-separated
+
+The file is read line by line and written in chunks of `BATCH_SIZE` rows, so
+memory stays flat even for the full multi-GB dump on a Raspberry Pi. Only the
+fields a lookup returns are kept. Re-importing a newer dump upserts in place.
+
+Usage inside the container:
+
+    python3 -m app.off_mirror /share/openfoodfacts-products.jsonl.gz
+
+or `POST /api/off-mirror/import` with {"path": ...} from the UI.
+"""
+from __future__ import annotations
+
+import asyncio
+import csv
+import gzip
+import io
+import json
+import logging
+import sqlite3
+import sys
+import threading
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from .barcode_service import clear_memo, match_external_category
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+
+_INSERT_SQL = """INSERT OR REPLACE INTO off_mirror
+    (barcode, name, brand, category, quantity, weight_g,
+     kcal_100g, proteins_100g, carbs_100g, fat_100g)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+
+def _num(value) -> Optional[float]:
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _row(code, name, brand, categories, quantity, weight_g, nutr: Dict) -> Optional[Tuple]:
+    code = (code or "").strip()
+    name = (name or "").strip()
+    if not code.isdigit() or not name:
+        return None
+    return (
+        code, name, (brand or "").strip() or None,
+        match_external_category(categories or "")[0],
+        (quantity or "").strip() or None,
+        _num(weight_g),
+        _num(nutr.get("energy-kcal_100g")),
+        _num(nutr.get("proteins_100g")),
+        _num(nutr.get("carbohydrates_100g")),
+        _num(nutr.get("fat_100g")),
+    )
+
+
+def _iter_jsonl(fh) -> Iterator[Tuple]:
+    for line in fh:
+        try:
+            p = json.loads(line)
+        except ValueError:
+            continue
+        row = _row(p.get("code"), p.get("product_name"), p.get("brands"),
+                   p.get("categories"), p.get("quantity"), p.get("product_quantity"),
+                   p.get("nutriments") or {})
+        if row:
+            yield row
+
+
+def _iter_csv(fh) -> Iterator[Tuple]:
+    # Some OFF fields (ingredients, images) are huge; 2**31-1 also fits a
+    # C long on 32-bit ARM, unlike sys.maxsize.
+    csv.field_size_limit(2**31 - 1)
+    for p in csv.DictReader(fh, delimiter="\t", quoting=csv.QUOTE_NONE):
+        row = _row(p.get("code"), p.get("product_name"), p.get("brands"),
+                   p.get("categories"), p.get("quantity"), p.get("product_quantity"), p)
+        if row:
+            yield row
+
+
+def _open_text(path: str):
+    raw = gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+    return io.TextIOWrapper(raw, encoding="utf-8", errors="replace", newline="")
+
+
+def import_dump(path: str, db_path: str,
+                progress: Optional[Callable[[int], None]] = None,
+                stop: Optional[threading.Event] = None) -> int:
+    """Stream `path` into off_mirror. Returns the number of rows written.
+    Blocking — call it from a thread (or the CLI), not the event loop.
+    Setting `stop` ends the import after the current batch; what was
+    written stays (rows are upserts, so re-importing picks up the rest)."""
+    base = path[:-3] if path.endswith(".gz") else path
+    iter_rows = _iter_csv if base.endswith((".csv", ".tsv")) else _iter_jsonl
+
+    written = 0
+    conn = sqlite3.connect(db_path)
+    try:
+        with _open_text(path) as fh:
+            batch = []
+            for row in iter_rows(fh):
+                batch.append(row)
+                if len(batch) >= BATCH_SIZE:
+                    conn.executemany(_INSERT_SQL, batch)
+                    conn.commit()
+                    written += len(batch)
+                    batch = []
+                    if progress:
+                        progress(written)
+                    if stop is not None and stop.is_set():
+                        logger.info(f"OFF mirror import from {path} stopped after {written} products")
+                        return written
+            if batch:
+                conn.executemany(_INSERT_SQL, batch)
+                conn.commit()
+                written += len(batch)
+                if progress:
+                    progress(written)
+    finally:
+        conn.close()
+    logger.info(f"OFF mirror import from {path}: {written} products")
+    return written
+
+
+# Progress of the import started from the API (one at a time).
+import_status = {"running": False, "path": None, "imported": 0, "error": None}
+_import_task: Optional[asyncio.Task] = None
+_import_stop = threading.Event()
+
+
+async def run_import(path: str, db_path: str) -> None:
+    """Background wrapper for the API: runs import_dump in a worker thread
+    and keeps import_status up to date."""
+    import_status.update(running=True, path=path, imported=0, error=None)
+    try:
+        await asyncio.to_thread(
+            import_dump, path, db_path,
+            lambda n: import_status.update(imported=n),
+            _import_stop,
+        )
+        clear_memo()
+    except Exception as e:
+        logger.error(f"OFF mirror import failed: {e}", exc_info=True)
+        import_status["error"] = str(e)
+    finally:
+        import_status["running"] = False
+
+
+def start_import(path: str, db_path: str) -> bool:
+    """Schedule run_import unless one is running. `running` is set before
+    the task is created, so two quick requests can't both start one, and
+    the task is kept here so it is not garbage-collected mid-import."""
+    global _import_task
+    if import_status["running"]:
+        return False
+    import_status.update(running=True, path=path, imported=0, error=None)
+    _import_stop.clear()
+    _import_task = asyncio.create_task(run_import(path, db_path), name="off_mirror_import")
+    return True
+
+
+async def stop_import() -> None:
+    """Ask a running import to stop after its current batch and wait for it
+    (shutdown)."""
+    global _import_task
+    if _import_task is None:
+        return
+    _import_stop.set()
+    try:
+        await _import_task
+    except asyncio.CancelledError:
+        pass
+    _import_task = None
+
+
+if __name__ == "__main__":
+    from .database import db
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) != 2:
+        print("usage: python3 -m app.off_mirror <dump.jsonl[.gz]|dump.csv[.gz]>")
+        sys.exit(2)
+    asyncio.run(db.init_db())
+    total = import_dump(sys.argv[1], db.db_path,
+                        progress=lambda n: print(f"\r{n} products", end="", flush=True))
+    print(f"\nImported {total} products into {db.db_path}")
@@ -0,0 +1,265 @@
+"""
+Weekly meal planner.
+
+Backend port of `generateAuto` in view-week.js, with the same objective: for
+each day, Monday to Sunday, pick one recipe per meal minimising
+
+    sum over non-zero goals of ((day_total - goal) / goal) ** 2
+  + 0.5 per recipe already used in the last 2 days, 0.1 if used earlier.
+
+The browser version scored one candidate object at a time through
+`recipeMacros`. Here the per-serving macros of every recipe sit in one NumPy
+matrix and candidates are scored in vectorised batches: the random phase
+draws `SAMPLES` days as an index matrix and evaluates them in one shot, and
+each hill-climbing move evaluates a whole meal pool at once.
+
+`seed` makes the result reproducible; `time_budget_ms` caps the random phase
+(the day is split evenly, leftovers roll over) so a huge recipe book on a
+Raspberry Pi still answers in time. With the default budget a household
+catalog never hits the cap, so the same seed gives the same week.
+
+Mode "pantry" ("use it up") adds two terms, both unit-free:
+
+  + SHORTAGE_PENALTY per ingredient the day needs beyond what is left in
+    stock (fraction short of each ingredient, summed)
+  - EXPIRY_REWARD * urgency for the share of each product's soonest-expiring
+    stock the day cooks, urgency = 1 / (1 + days left on that day)
+
+Current batch stock is the budget for the whole week: each chosen day draws
+it down (expiring quantity first, like FIFO) before the next day is scored.
+Recipes map to products through per-serving requirement vectors stacked in
+an (recipes x products) matrix, so a batch of candidates is one fancy-index
+and sum, the same as the macros.
+"""
+from __future__ import annotations
+
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+
+MEAL_IDS = ['desayuno', 'almuerzo', 'comida', 'merienda', 'cena']
+DAYS = 7
+
+SAMPLES = 2000        # random candidates per day (same as the browser)
+BATCH = 500           # candidates scored per vectorised step
+MAX_PASSES = 10       # hill-climbing passes per day
+RECENT_PENALTY = 0.5  # recipe used in the last 2 days
+OLDER_PENALTY = 0.1   # recipe used earlier in the week
+SHORTAGE_PENALTY = 0.3  # per ingredient-equivalent missing from stock (pantry mode)
+EXPIRY_REWARD = 1.0     # per soonest-expiring stock used up on its last day (pantry mode)
+
+MODES = ('macros', 'pantry')
+
+MACRO_KEYS = ('kcal', 'proteins', 'carbs', 'fat')
+
+
+def meal_pools(recipes: List[dict]) -> Dict[str, np.ndarray]:
+    """Row indices per meal: recipes tagged for it (meal_types, legacy tags
+    when a recipe has none) if there are at least 3, else every recipe."""
+    everything = np.arange(len(recipes))
+    pools = {}
+    for meal in MEAL_IDS:
+        strict = [i for i, r in enumerate(recipes)
+                  if meal in (r.get('meal_types') or r.get('tags') or [])]
+        pools[meal] = np.array(strict) if len(strict) >= 3 else everything
+    return pools
+
+
+class _Pantry:
+    """Week-long stock budget for pantry mode. Columns are the products
+    that appear in some recipe."""
+
+    def __init__(self, requirements: np.ndarray, stock: np.ndarray,
+                 expiring: np.ndarray, days_left: np.ndarray):
+        self.req = requirements            # (recipes, products) per serving
+        self.remaining = stock.copy()      # what is left for the rest of the week
+        self.expiring_start = expiring.copy()
+        self.expiring = expiring.copy()    # soonest-expiring part still unused
+        self.expiring0 = np.where(expiring > 0, expiring, 1.0)
+        self.days_left = days_left         # inf for products without expiry
+        self.urgency = np.zeros_like(stock)
+
+    def set_day(self, day: int) -> None:
+        left = self.days_left - day
+        # Stock that is already past its date by this day earns nothing.
+        self.urgency = np.where(left >= 0, 1.0 / (1.0 + np.maximum(left, 0)), 0.0)
+        self.urgency[~np.isfinite(self.days_left)] = 0.0
+
+    def score(self, need: np.ndarray) -> np.ndarray:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            short = np.where(need > 0, np.maximum(need - self.remaining, 0) / need, 0.0)
+        used = np.minimum(need, self.expiring) / self.expiring0
+        return SHORTAGE_PENALTY * short.sum(axis=-1) - EXPIRY_REWARD * (used * self.urgency).sum(axis=-1)
+
+    def consume(self, need: np.ndarray) -> None:
+        self.expiring = np.maximum(self.expiring - need, 0)
+        self.remaining = self.remaining - need
+
+
+class _Objective:
+    """Day score over candidate index matrices (rows = candidates, columns =
+    meal slots). Lower is better."""
+
+    def __init__(self, macros: np.ndarray, goals: np.ndarray, pantry: Optional[_Pantry] = None):
+        self.macros = macros
+        self.goals = goals
+        # 1/goal for the goals that count, 0 for the rest (drops the term).
+        self.inv = np.divide(1.0, goals, out=np.zeros_like(goals), where=goals > 0)
+        self.penalty = np.zeros(len(macros))
+        self.pantry = pantry
+
+    def set_penalty(self, last_used: np.ndarray, day: int) -> None:
+        since = day - last_used
+        self.penalty = np.where(last_used < 0, 0.0,
+                                np.where(since <= 2, RECENT_PENALTY, OLDER_PENALTY))
+        if self.pantry is not None:
+            self.pantry.set_day(day)
+
+    def totals_score(self, totals: np.ndarray, pen: np.ndarray,
+                     need: Optional[np.ndarray] = None) -> np.ndarray:
+        err = ((totals - self.goals) * self.inv) ** 2
+        score = err.sum(axis=-1) + pen
+        if need is not None:
+            score = score + self.pantry.score(need)
+        return score
+
+    def need(self, idx: np.ndarray) -> Optional[np.ndarray]:
+        if self.pantry is None:
+            return None
+        return self.pantry.req[idx].sum(axis=-2)
+
+    def score(self, idx: np.ndarray) -> np.ndarray:
+        return self.totals_score(self.macros[idx].sum(axis=1), self.penalty[idx].sum(axis=1),
+                                 self.need(idx))
+
+
+def _best_day(obj: _Objective, pools: List[np.ndarray], rng: np.random.Generator,
+              deadline: float) -> np.ndarray:
+    # Phase 1: random sampling in batches, until SAMPLES or the deadline.
+    best, best_score = None, np.inf
+    drawn = 0
+    while drawn < SAMPLES:
+        n = min(BATCH, SAMPLES - drawn)
+        idx = np.column_stack([pool[rng.integers(len(pool), size=n)] for pool in pools])
+        scores = obj.score(idx)
+        i = int(scores.argmin())
+        if scores[i] < best_score:
+            best, best_score = idx[i].copy(), scores[i]
+        drawn += n
+        if time.monotonic() > deadline:
+            break
+
+    # Phase 2: hill climbing. Each move tries the whole pool of one slot in
+    # one vectorised evaluation and keeps the best swap if it improves.
+    for _ in range(MAX_PASSES):
+        improved = False
+        for j, pool in enumerate(pools):
+            rest = np.delete(best, j)
+            base_totals = obj.macros[rest].sum(axis=0)
+            base_pen = obj.penalty[rest].sum()
+            need = None
+            if obj.pantry is not None:
+                need = obj.pantry.req[rest].sum(axis=0) + obj.pantry.req[pool]
+            scores = obj.totals_score(base_totals + obj.macros[pool],
+                                      base_pen + obj.penalty[pool], need)
+            k = int(scores.argmin())
+            if scores[k] < best_score - 1e-12:
+                best[j], best_score = pool[k], scores[k]
+                improved = True
+        if not improved:
+            break
+    return best
+
+
+def build_pantry(recipe_ids: List[int], requirements: List[tuple], budget: List[dict],
+                 start: date) -> tuple:
+    """Dense requirement matrix + stock vectors for pantry mode.
+
+    `requirements` are (recipe_id, barcode, qty per serving) rows from
+    Database.get_recipe_requirements, `budget` the rows of
+    Database.get_pantry_budget, `start` the date of day 0 (Monday).
+    Returns (_Pantry, barcodes)."""
+    barcodes = sorted({b for _, b, _ in requirements})
+    col = {b: j for j, b in enumerate(barcodes)}
+    row = {rid: i for i, rid in enumerate(recipe_ids)}
+    req = np.zeros((len(recipe_ids), len(barcodes)))
+    for rid, b, qty in requirements:
+        if rid in row:
+            req[row[rid], col[b]] += qty or 0.0
+
+    stock = np.zeros(len(barcodes))
+    expiring = np.zeros(len(barcodes))
+    days_left = np.full(len(barcodes), np.inf)
+    for p in budget:
+        j = col.get(p['barcode'])
+        if j is None:
+            continue
+        stock[j] = p['stock'] or 0.0
+        if p.get('earliest_expiry'):
+            try:
+                d = date.fromisoformat(p['earliest_expiry'][:10])
+            except ValueError:
+                continue
+            days_left[j] = (d - start).days
+            expiring[j] = p['expiring_qty'] or 0.0
+    return _Pantry(req, stock, expiring, days_left), barcodes
+
+
+def plan_week(recipes: List[dict], goals: Dict[str, float], seed: Optional[int] = None,
+              time_budget_ms: int = 2000, mode: str = 'macros',
+              requirements: Optional[List[tuple]] = None,
+              budget: Optional[List[dict]] = None, start: Optional[str] = None) -> dict:
+    """Plan a week. `recipes` come from Database.get_planner_recipes (id,
+    meal_types, tags, per-serving kcal/proteins/carbs/fat); `goals` has the
+    same macro keys. Pantry mode also needs `requirements`, `budget` and
+    the ISO `start` date of day 0, this week's Monday by default (see
+    build_pantry). Returns {"days": [{meal_id: [recipe_id]}, ...x7],
+    "scores": [...], "seed", "elapsed_ms"} plus, in pantry mode,
+    "rescued" and "shortages" ({barcode: qty}). Pure CPU — run it off the
+    loop."""
+    t0 = time.monotonic()
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % (2 ** 32))
+    if not recipes:
+        return {"days": [{} for _ in range(DAYS)], "scores": [], "seed": seed, "elapsed_ms": 0}
+
+    rng = np.random.default_rng(seed)
+    ids = [r['id'] for r in recipes]
+    pantry, barcodes = None, []
+    if mode == 'pantry':
+        today = date.today()
+        day0 = date.fromisoformat(start) if start else today - timedelta(days=today.weekday())
+        pantry, barcodes = build_pantry(ids, requirements or [], budget or [], day0)
+    macros = np.array([[r.get(k) or 0.0 for k in MACRO_KEYS] for r in recipes], dtype=float)
+    obj = _Objective(macros, np.array([goals.get(k) or 0.0 for k in MACRO_KEYS], dtype=float), pantry)
+    pools_by_meal = meal_pools(recipes)
+    meals = [m for m in MEAL_IDS if len(pools_by_meal[m])]
+    pools = [pools_by_meal[m] for m in meals]
+
+    last_used = np.full(len(recipes), -1)
+    days, scores = [], []
+    time_budget = max(0.0, time_budget_ms / 1000.0)
+    for day in range(DAYS):
+        obj.set_penalty(last_used, day)
+        deadline = t0 + time_budget * (day + 1) / DAYS
+        best = _best_day(obj, pools, rng, deadline)
+        scores.append(float(obj.score(best[None, :])[0]))
+        last_used[best] = day
+        days.append({meal: [ids[i]] for meal, i in zip(meals, best)})
+        if pantry is not None:
+            pantry.consume(pantry.req[best].sum(axis=0))
+
+    result = {
+        "days": days,
+        "scores": scores,
+        "seed": seed,
+        "elapsed_ms": round((time.monotonic() - t0) * 1000, 1),
+    }
+    if pantry is not None:
+        rescued = pantry.expiring_start - pantry.expiring
+        result["rescued"] = {b: round(float(q), 3) for b, q in zip(barcodes, rescued) if q > 1e-9}
+        result["shortages"] = {b: round(float(-q), 3) for b, q in
+                               zip(barcodes, pantry.remaining) if q < -1e-9}
+    return result
@@ -0,0 +1,158 @@
+"""
+Shopping basket engine.
+
+Turns "what the week needs" into "what to buy": for every product in the
+catalog, demand = the unconsumed diet plans of the week (per-serving recipe
+quantities, like generateShoppingFromWeek) plus the min_stock target, minus
+the current batch stock. What is left is rounded up to whole packs and
+priced from the product's last_price, or the median of its recent
+price_history when it has none.
+
+Products that are really the same item in different packs (two barcodes
+with the same name and unit, e.g. "Leche entera" 1 L and 6 x 1 L) are
+grouped: their stock and demand add up, and the cheapest combination of
+their packs that covers the need is picked. The rows come from a couple of
+set-based queries over the whole catalog (Database.get_shopping_catalog);
+everything here is plain Python over those rows.
+"""
+from __future__ import annotations
+
+import math
+import re
+import statistics
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+EPS = 1e-9
+RECENT_PRICES = 5     # price_history rows per product for the median
+
+
+def pack_size(p: dict) -> Optional[float]:
+    """Same rule as window.packSize: units per pack for 'uds' products
+    (serving_size, default 1), grams per pack (weight_g) otherwise."""
+    if p.get('unit_type') == 'uds':
+        return p['serving_size'] if (p.get('serving_size') or 0) > 0 else 1.0
+    return p['weight_g'] if (p.get('weight_g') or 0) > 0 else None
+
+
+def _group_key(p: dict) -> Tuple[str, str]:
+    name = unicodedata.normalize('NFKD', p.get('name') or '')
+    name = ''.join(c for c in name if not unicodedata.combining(c)).lower()
+    return re.sub(r'\s+', ' ', name).strip() or p['barcode'], p.get('unit_type') or ''
+
+
+def cheapest_packs(need: float, offers: List[Tuple[str, float, float]]) -> Tuple[float, Dict[str, int]]:
+    """Cheapest {key: packs} covering `need` with offers (key, size, price).
+    Branch and bound over the pack counts of every offer, cheapest per unit
+    first; the last one tops up whatever is left. All offers take part: for
+    a small need the small pack that is dearest per unit is often the
+    cheapest buy. Only an offer with the same size as a cheaper one is
+    dropped. The search starts from the best single-offer basket and the
+    bound is the cost so far plus what is left at the cheapest unit price
+    still available (offers[i], as they are sorted by it). Below the
+    rounded-up count, fewer packs of one offer only move need to pricier
+    units, so the first count that fails the bound ends that offer's loop."""
+    by_size: Dict[float, Tuple[str, float, float]] = {}
+    for o in offers:
+        if o[1] not in by_size or o[2] < by_size[o[1]][2]:
+            by_size[o[1]] = o
+    offers = sorted(by_size.values(), key=lambda o: o[2] / o[1])
+    if not offers:
+        return math.inf, {}
+    unit = [price / size for _, size, price in offers]
+    key, size, price = min(offers, key=lambda o: math.ceil(need / o[1] - EPS) * o[2])
+    packs = max(math.ceil(need / size - EPS), 0)
+    best: List = [packs * price, {key: packs} if packs else {}]
+
+    def rec(i: int, remaining: float, cost: float, counts: Dict[str, int]) -> None:
+        if remaining <= EPS:
+            if cost < best[0] - EPS:
+                best[0], best[1] = cost, {k: n for k, n in counts.items() if n}
+            return
+        if cost + remaining * unit[i] >= best[0] - EPS:
+            return
+        key, size, price = offers[i]
+        kmax = math.ceil(remaining / size - EPS)
+        if i == len(offers) - 1:
+            rec(i, 0.0, cost + kmax * price, {**counts, key: kmax})
+            return
+        for k in range(kmax, -1, -1):
+            left = max(remaining - k * size, 0.0)
+            if cost + k * price + left * unit[i + 1] >= best[0] - EPS:
+                if k == kmax:
+                    continue    # overshooting pack may cost more than the rest
+                break           # below kmax the bound only grows as k shrinks
+            rec(i + 1, left, cost + k * price, {**counts, key: k})
+
+    rec(0, need, 0.0, {})
+    return best[0], best[1]
+
+
+def build_basket(catalog: List[dict], recent_prices: Dict[str, List[float]],
+                 include_plan: bool = True, include_min_stock: bool = True) -> dict:
+    """Basket from Database.get_shopping_catalog rows (one per product, with
+    its `planned` demand) and {barcode: [recent unit prices]}."""
+    groups: Dict[Tuple[str, str], List[dict]] = {}
+    for p in catalog:
+        groups.setdefault(_group_key(p), []).append(p)
+
+    lines = []
+    for members in groups.values():
+        planned = sum(p['planned'] or 0 for p in members) if include_plan else 0.0
+        target = max((p['min_stock'] or 0) for p in members) if include_min_stock else 0.0
+        stock = sum(max(p['stock'] or 0, 0) for p in members)
+        need = planned + target - stock
+        if need <= EPS:
+            continue
+
+        offers, unpriced = [], []
+        for p in members:
+            size = pack_size(p)
+            if not size:
+                continue
+            price, source = p.get('last_price'), 'last_price'
+            if price is None and recent_prices.get(p['barcode']):
+                price, source = statistics.median(recent_prices[p['barcode']]), 'price_history'
+            if price is None:
+                unpriced.append((p, size))
+            else:
+                offers.append((p, size, price, source))
+
+        picks = []
+        cost: Optional[float] = None
+        if offers:
+            cost, counts = cheapest_packs(need, [(p['barcode'], size, price) for p, size, price, _ in offers])
+            for p, size, price, source in offers:
+                if counts.get(p['barcode']):
+                    picks.append({'barcode': p['barcode'], 'name': p['name'], 'packs': counts[p['barcode']],
+                                  'pack_size': size, 'unit_price': round(price, 2), 'price_source': source})
+            cost = round(cost, 2)
+        elif unpriced:
+            p, size = max(unpriced, key=lambda u: (u[0]['planned'] or 0, u[0]['min_stock'] or 0))
+            picks.append({'barcode': p['barcode'], 'name': p['name'], 'packs': math.ceil(need / size - EPS),
+                          'pack_size': size, 'unit_price': None, 'price_source': None})
+
+        main = max(members, key=lambda p: (any(k['barcode'] == p['barcode'] for k in picks),
+                                           p['planned'] or 0, p['min_stock'] or 0))
+        lines.append({
+            'barcode': main['barcode'],
+            'name': main['name'],
+            'category': main.get('category') or 'Otros',
+            'unit_type': main.get('unit_type') or 'g',
+            'needed': round(need, 3),
+            'planned': round(planned, 3),
+            'min_stock': target,
+            'stock': stock,
+            'packs': sum(k['packs'] for k in picks) if picks else None,
+            'cost': cost,
+            'picks': picks,
+        })
+
+    lines.sort(key=lambda line: (line['category'], line['name']))
+    priced = [line for line in lines if line['cost'] is not None]
+    return {
+        'lines': lines,
+        'total': round(sum(line['cost'] for line in priced), 2),
+        'priced': len(priced),
+        'unpriced': len(lines) - len(priced),
+    }
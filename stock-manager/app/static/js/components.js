@@ -179,10 +179,32 @@ window.openFoodPicker = function(options) {
     let sel = null;
     let selRecipe = null;
     let recipeQty = 1;
+    let serverHits = null;  // ranked barcodes from /products/search for the current q
+    let searchTimer = null;
+    let searchSeq = 0;
+
+    // Debounced server search; until it answers (or if it fails) results()
+    // falls back to the local substring filter.
+    function scheduleServerSearch() {
+        serverHits = null;
+        clearTimeout(searchTimer);
+        const needle = q.trim();
+        if (tab !== 'food' || !needle) return;
+        const seq = ++searchSeq;
+        searchTimer = setTimeout(async () => {
+            const hits = await window.searchProducts(needle, 25);
+            if (seq !== searchSeq || hits === null) return;
+            serverHits = hits.map(p => String(p.barcode));
+            if (tab === 'food' && !sel) renderBody();
+        }, 150);
+    }
 
     function results() {
         const products = window.AppState.products || [];
         const needle = q.toLowerCase().trim();
+        if (needle && serverHits) {
+            return serverHits.map(b => window.findProductById(b)).filter(Boolean);
+        }
         if (needle) {
             return products
                 .filter(p => (p.name || '').toLowerCase().includes(needle) || String(p.barcode).includes(needle))
@@ -276,6 +298,7 @@ window.openFoodPicker = function(options) {
         const search = mount.querySelector('#fp-search');
         search.addEventListener('input', (e) => {
             q = e.target.value;
+            scheduleServerSearch();
             renderBody();
         });
 
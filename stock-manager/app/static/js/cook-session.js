@@ -553,34 +553,30 @@ async function _doComplete() {
     const recipe = currentRecipe;
     const sessionId = session.id;
     try {
-        // 1) Backend deducts ingredients and closes the session.
-        const result = await window.apiCall(`/cook-sessions/${sessionId}/complete`, 'POST', {});
-        const deducted = (result && result.consumed) ? result.consumed.length : 0;
-
-        // 2) If the recipe produces an output, add it to stock here on the
-        //    client (mirroring _makeRecipe in view-recipes.js). The backend
-        //    doesn't do this because the output product needs ensure/create
-        //    logic that already lives on the frontend.
-        let addedOutput = false;
+        // 1) Make sure the output product exists (the ensure/create logic
+        //    lives on the frontend, shared with _makeRecipe in view-recipes.js)
+        //    and tell the backend where the cooked result goes.
+        const body = {};
         if (recipe && Number(recipe.output_qty) > 0 && window.ensureRecipeOutputProduct) {
             const outputBarcode = await window.ensureRecipeOutputProduct(recipe);
             if (outputBarcode) {
                 const days = outputStorage === 'freezer'
                     ? (recipe.freezer_expiry_days != null ? recipe.freezer_expiry_days : recipe.default_expiry_days)
                     : (recipe.fridge_expiry_days != null ? recipe.fridge_expiry_days : recipe.default_expiry_days);
-                try {
-                    await window.apiCall(`/products/${outputBarcode}/stock`, 'POST', {
-                        quantity: servings,  // raw user-requested units (already in output product units)
-                        expiry_date: _expiryFromDays(days),
-                        location: outputStorage === 'freezer' ? 'Congelador' : 'Nevera',
-                    });
-                    addedOutput = true;
-                } catch (e) {
-                    window.showToast('Ingredientes restados pero falló agregar el resultado: ' + e.message, 'warn');
-                }
+                body.output_barcode = outputBarcode;
+                body.quantity = servings;  // raw user-requested units (already in output product units)
+                body.expiry_date = _expiryFromDays(days);
+                body.location = outputStorage === 'freezer' ? 'Congelador' : 'Nevera';
             }
         }
 
+        // 2) Backend deducts ingredients, adds the output batch and closes
+        //    the session in one transaction. No retries: a repeated POST
+        //    would only bounce off the "not active" guard.
+        const result = await window.apiCall(`/cook-sessions/${sessionId}/complete`, 'POST', body, 0);
+        const deducted = (result && result.consumed) ? result.consumed.length : 0;
+        const addedOutput = !!(result && result.output);
+
         // Show toast + close the modal IMMEDIATELY. Reloads are heavy (all
         // products, the whole week, today's log) and we don't want the user
         // staring at a frozen modal while they run — they get to see the
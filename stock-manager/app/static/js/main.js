@@ -4,9 +4,11 @@
 */
 
 // Fetch /products, refresh AppState, trigger a full re-render.
-window.reloadProducts = async function() {
+// The reload* loaders take an optional `preloaded` response (from
+// /bootstrap) and only hit their own endpoint without one.
+window.reloadProducts = async function(preloaded) {
     try {
-        const data = await window.apiCall('/products', 'GET');
+        const data = preloaded !== undefined ? preloaded : await window.apiCall('/products', 'GET');
         window.AppState.products = Array.isArray(data) ? data : [];
         window.renderNav();
         window.renderPage();
@@ -38,6 +40,8 @@ window._recipeFromApi = function(r) {
         description: r.description || '',
         instructions: r.instructions || '',
         image_url: r.image_url || '',
+        // Per-serving macros computed by the backend (recipe_macros cache)
+        macros: r.kcal == null ? null : { kcal: r.kcal || 0, p: r.proteins || 0, c: r.carbs || 0, fat: r.fat || 0 },
     };
 };
 
@@ -70,7 +74,7 @@ window._recipeToApi = function(d) {
 
 // Load recipes from HA backend into AppState.
 // Also runs a one-time migration of any recipes stored in localStorage.
-window.reloadRecipes = async function() {
+window.reloadRecipes = async function(preloaded) {
     // One-time migration: move localStorage recipes to HA backend
     const LS_KEY = 'sm_recipes';
     const stored = localStorage.getItem(LS_KEY);
@@ -91,10 +95,11 @@ window.reloadRecipes = async function() {
             console.warn('Recipe migration error:', e);
         }
         localStorage.removeItem(LS_KEY);
+        preloaded = undefined;  // the bootstrap copy predates the migration
     }
 
     try {
-        const data = await window.apiCall('/recipes', 'GET');
+        const data = preloaded !== undefined ? preloaded : await window.apiCall('/recipes', 'GET');
         window.AppState.recipes = Array.isArray(data) ? data.map(window._recipeFromApi) : [];
     } catch (e) {
         console.error('reloadRecipes failed', e);
@@ -107,27 +112,35 @@ document.addEventListener('DOMContentLoaded', async () => {
     window.renderNav();
     window.renderPage();
 
-    // Fetch all data from HA backend
-    await Promise.all([
-        window.reloadProducts(),
-        window.reloadRecipes(),
-        window.reloadGoals(),
-        window.reloadTodayLog(),
-        window.reloadWeek(),
-        window.reloadBodyWeight(),
-        window.reloadFrequentProducts(),
-    ]);
-    window.renderPage();
-});
-
-// Refresh state when the user returns to the app (cross-device sync)
-document.addEventListener('visibilitychange', async () => {
-    if (document.visibilityState === 'visible') {
+    // Fetch all data from HA backend: one /bootstrap round trip, or the
+    // individual endpoints if that fails
+    if (!(await window.bootstrap())) {
         await Promise.all([
             window.reloadProducts(),
+            window.reloadRecipes(),
+            window.reloadGoals(),
             window.reloadTodayLog(),
             window.reloadWeek(),
+            window.reloadBodyWeight(),
+            window.reloadFrequentProducts(),
         ]);
+    }
+    window.renderPage();
+});
+
+// Refresh state when the user returns to the app (cross-device sync).
+// Nothing is re-rendered if the bootstrap revision did not move.
+document.addEventListener('visibilitychange', async () => {
+    if (document.visibilityState === 'visible') {
+        const result = await window.bootstrap();
+        if (result === 'unchanged') return;
+        if (!result) {
+            await Promise.all([
+                window.reloadProducts(),
+                window.reloadTodayLog(),
+                window.reloadWeek(),
+            ]);
+        }
         window.renderPage();
     }
 });
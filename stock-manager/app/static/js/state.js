@@ -89,6 +89,8 @@ window.AppState = {
     frequentBarcodes: [], // loaded async by reloadFrequentProducts()
 
     bodyWeight: 75, // overwritten by reloadBodyWeight() on boot
+
+    revision: null, // server revision of the last /bootstrap applied
 };
 
 // ===== Persist helpers =====
@@ -108,9 +110,9 @@ window.saveTheme = function(theme) {
 
 // ===== Backend-wired state functions =====
 
-window.reloadBodyWeight = async function() {
+window.reloadBodyWeight = async function(preloaded) {
     try {
-        const data = await window.apiCall('/weight/latest', 'GET');
+        const data = preloaded !== undefined ? preloaded : await window.apiCall('/weight/latest', 'GET');
         if (data && Number.isFinite(data.weight)) {
             window.AppState.bodyWeight = data.weight;
         }
@@ -119,15 +121,28 @@ window.reloadBodyWeight = async function() {
     }
 };
 
-window.reloadFrequentProducts = async function() {
+window.reloadFrequentProducts = async function(preloaded) {
     try {
-        const data = await window.apiCall('/stats/frequent-products', 'GET');
+        const data = preloaded !== undefined ? preloaded : await window.apiCall('/stats/frequent-products', 'GET');
         window.AppState.frequentBarcodes = Array.isArray(data) ? data : [];
     } catch (e) {
         console.error('reloadFrequentProducts failed', e);
     }
 };
 
+// Ranked product search served by the backend FTS index. Resolves to the
+// matching products (best first), or null on error so callers can fall back
+// to filtering AppState.products locally.
+window.searchProducts = async function(q, limit = 25) {
+    try {
+        const res = await window.apiCall(`/products/search?q=${encodeURIComponent(q)}&limit=${limit}`, 'GET', null, 0);
+        return (res && Array.isArray(res.items)) ? res.items : [];
+    } catch (e) {
+        console.warn('searchProducts failed', e);
+        return null;
+    }
+};
+
 window.saveBodyWeight = async function(weight) {
     try {
         await window.apiCall('/weight', 'POST', { weight });
@@ -138,9 +153,9 @@ window.saveBodyWeight = async function(weight) {
     }
 };
 
-window.reloadGoals = async function() {
+window.reloadGoals = async function(preloaded) {
     try {
-        const data = await window.apiCall('/stats/macro-goals', 'GET');
+        const data = preloaded !== undefined ? preloaded : await window.apiCall('/stats/macro-goals', 'GET');
         window.AppState.goals = {
             kcal: data.kcal,
             p: data.proteins,
@@ -168,9 +183,9 @@ window.saveGoals = async function(goals) {
     }
 };
 
-window.reloadTodayLog = async function() {
+window.reloadTodayLog = async function(preloaded) {
     try {
-        const movements = await window.apiCall('/stats/today-movements', 'GET');
+        const movements = preloaded !== undefined ? preloaded : await window.apiCall('/stats/today-movements', 'GET');
         const meals = emptyMeals();
         (movements || []).forEach(m => {
             const mealKey = m.meal_type || 'snacks';
@@ -264,14 +279,17 @@ function _dateForDayId(dayId) {
     return _isoDate(target);
 }
 
-window.reloadWeek = async function() {
+function _currentWeekRange() {
+    const monday = _mondayOfCurrentWeek();
+    const sunday = new Date(monday);
+    sunday.setDate(monday.getDate() + 6);
+    return { start: _isoDate(monday), end: _isoDate(sunday) };
+}
+
+window.reloadWeek = async function(preloaded) {
     try {
-        const monday = _mondayOfCurrentWeek();
-        const sunday = new Date(monday);
-        sunday.setDate(monday.getDate() + 6);
-        const start = _isoDate(monday);
-        const end = _isoDate(sunday);
-        const plans = await window.apiCall(`/diet-plan?start_date=${start}&end_date=${end}`, 'GET');
+        const { start, end } = _currentWeekRange();
+        const plans = preloaded !== undefined ? preloaded : await window.apiCall(`/diet-plan?start_date=${start}&end_date=${end}`, 'GET');
 
         const week = emptyWeek();
         // Store planId mapping: week[dayId][mealId] is array of recipeIds for rendering
@@ -302,6 +320,33 @@ window.reloadWeek = async function() {
     }
 };
 
+// Whole initial state in one request (GET /bootstrap), handed to the
+// reload* loaders. Resolves to 'unchanged' when the server revision matches
+// the last one applied, true once applied, false on error (callers then
+// fall back to the individual endpoints).
+window.bootstrap = async function() {
+    try {
+        const { start, end } = _currentWeekRange();
+        const data = await window.apiCall(`/bootstrap?start_date=${start}&end_date=${end}`, 'GET', null, 0);
+        if (data.revision && data.revision === window.AppState.revision) return 'unchanged';
+        await Promise.all([
+            window.reloadRecipes(data.recipes),
+            window.reloadGoals(data.macro_goals),
+            window.reloadTodayLog(data.today_movements),
+            window.reloadWeek(data.diet_plans),
+            window.reloadBodyWeight(data.body_weight),
+            window.reloadFrequentProducts(data.frequent_products),
+        ]);
+        // Last: it re-renders with everything else already in place
+        await window.reloadProducts(data.products);
+        window.AppState.revision = data.revision;
+        return true;
+    } catch (e) {
+        console.warn('bootstrap failed', e);
+        return false;
+    }
+};
+
 window.saveWeekItem = async function(dayId, mealType, recipeId) {
     try {
         const date = _dateForDayId(dayId);
@@ -330,26 +375,19 @@ window.deleteWeekItem = async function(planId) {
 };
 
 // saveWeek: kept for compatibility with view-week.js generateAuto / clearWeek.
-// Replaces the full week in the backend by deleting existing plans and re-inserting.
+// Replaces the full week in the backend in one request; the backend diffs it
+// against what is stored and only writes the changes.
 window.saveWeek = async function(week) {
     // Optimistic local update first
     window.AppState.week = week;
     try {
-        // Delete all existing plans for current week
-        const monday = _mondayOfCurrentWeek();
-        const sunday = new Date(monday);
-        sunday.setDate(monday.getDate() + 6);
-        const existing = await window.apiCall(`/diet-plan?start_date=${_isoDate(monday)}&end_date=${_isoDate(sunday)}`, 'GET');
-        for (const plan of (existing || [])) {
-            await window.apiCall(`/diet-plan/${plan.id}`, 'DELETE');
-        }
-        // Insert new plans
+        const plans = [];
         for (const [dayId, meals] of Object.entries(week)) {
             const date = _dateForDayId(dayId);
             if (!date) continue;
             for (const [mealId, items] of Object.entries(meals || {})) {
                 for (const recipeId of (items || [])) {
-                    await window.apiCall('/diet-plan', 'POST', {
+                    plans.push({
                         date,
                         meal_type: mealId,
                         recipe_id: recipeId,
@@ -358,6 +396,8 @@ window.saveWeek = async function(week) {
                 }
             }
         }
+        const start = _isoDate(_mondayOfCurrentWeek());
+        await window.apiCall(`/diet-plan/week?start=${start}`, 'PUT', plans);
         await window.reloadWeek();
     } catch (e) {
         console.error('saveWeek failed', e);
@@ -484,8 +524,11 @@ window.sumMacros = function(items) {
     }, { kcal: 0, p: 0, c: 0, fat: 0 });
 };
 
+// Saved recipes carry their per-serving macros from the backend; drafts and
+// anything else are computed here with the same formula.
 window.recipeMacros = function(recipe) {
     if (!recipe) return { kcal: 0, p: 0, c: 0, fat: 0 };
+    if (recipe.macros) return { ...recipe.macros };
     const tot = window.sumMacros(recipe.ingredients || []);
     const s = Math.max(1, recipe.serves || 1);
     return { kcal: tot.kcal / s, p: tot.p / s, c: tot.c / s, fat: tot.fat / s };
@@ -4,48 +4,49 @@
 */
 
 let chartsRange = 30; // days; 7 | 30 | 90 | 0 (=todo)
-let chartsData = { weights: null, kcal: null, loading: false };
-let priceState = { barcode: '', series: null, loading: false };
+let chartsData = { weights: null, kcal: null, kcalAvg: 0, loading: false };
+let priceState = { barcode: '', series: null, summary: null, loading: false };
 
+// Series come range-limited and downsampled from GET /charts (app/charts.py).
 async function _loadChartData() {
     chartsData.loading = true;
     try {
-        const [weights, kcal] = await Promise.all([
-            window.apiCall('/weight', 'GET'),
-            window.apiCall(`/stats/daily-kcal?days=${chartsRange || 365}`, 'GET'),
-        ]);
-        chartsData.weights = weights || [];
-        chartsData.kcal = kcal || [];
+        const withPrice = priceState.barcode ? `&barcode=${encodeURIComponent(priceState.barcode)}` : '';
+        const data = await window.apiCall(`/charts?range=${chartsRange}${withPrice}`, 'GET');
+        chartsData.weights = data.weight || [];
+        chartsData.kcal = data.kcal || [];
+        chartsData.kcalAvg = data.kcal_avg || 0;
+        if (priceState.barcode) _applyPriceSeries(data, priceState.barcode);
     } catch (e) {
         console.error('chart load failed', e);
         chartsData.weights = [];
         chartsData.kcal = [];
+        chartsData.kcalAvg = 0;
     } finally {
         chartsData.loading = false;
     }
 }
 
+function _applyPriceSeries(data, barcode) {
+    priceState.series = (data.prices || {})[barcode] || [];
+    priceState.summary = (data.price_summary || {})[barcode] || null;
+}
+
 async function _loadPriceSeries(barcode) {
-    if (!barcode) { priceState.series = []; return; }
+    if (!barcode) { priceState.series = []; priceState.summary = null; return; }
     priceState.loading = true;
     try {
-        const data = await window.apiCall(`/products/${barcode}/price-history?limit=200`, 'GET');
-        // Backend returns newest first; chart expects oldest first.
-        priceState.series = (data || []).slice().reverse();
+        const data = await window.apiCall(`/charts?range=${chartsRange}&sections=prices&barcode=${encodeURIComponent(barcode)}`, 'GET');
+        _applyPriceSeries(data, barcode);
     } catch (e) {
         console.error('price-history load failed', e);
         priceState.series = [];
+        priceState.summary = null;
     } finally {
         priceState.loading = false;
     }
 }
 
-function _filterByRange(arr, days) {
-    if (!days || days <= 0) return arr;
-    const cutoff = new Date(); cutoff.setHours(0,0,0,0); cutoff.setDate(cutoff.getDate() - days);
-    return arr.filter(d => new Date(d.date + 'T00:00:00') >= cutoff);
-}
-
 function _formatDateShort(iso) {
     const d = new Date(iso + 'T00:00:00');
     const months = ['ene','feb','mar','abr','may','jun','jul','ago','sep','oct','nov','dic'];
@@ -66,6 +67,7 @@ function _lineChartSVG(data, valueKey, opts) {
     }
 
     const values = data.map(d => Number(d[valueKey]) || 0);
+    if (opts.avgKey) data.forEach(d => { if (d[opts.avgKey] != null) values.push(Number(d[opts.avgKey])); });
     let maxV = Math.max(...values, goal || 0);
     let minV = opts.zeroBased ? 0 : Math.min(...values, goal || Infinity);
     if (!Number.isFinite(minV)) minV = 0;
@@ -84,6 +86,11 @@ function _lineChartSVG(data, valueKey, opts) {
     });
 
     const pathD = points.map((p, i) => `${i === 0 ? 'M' : 'L'} ${p.x.toFixed(1)} ${p.y.toFixed(1)}`).join(' ');
+    // Optional moving average, dashed under the raw line
+    const avgPath = opts.avgKey ? `<path d="${points.map((p, i) => {
+        const y = PAD_T + plotH - ((Number(p.d[opts.avgKey]) - minV) / range) * plotH;
+        return `${i === 0 ? 'M' : 'L'} ${p.x.toFixed(1)} ${y.toFixed(1)}`;
+    }).join(' ')}" fill="none" stroke="${color}" stroke-width="1.5" stroke-dasharray="5,4" opacity="0.55"/>` : '';
     const dots = points.map(p => `<circle cx="${p.x.toFixed(1)}" cy="${p.y.toFixed(1)}" r="2.5" fill="${color}"/>`).join('');
 
     const yTicks = [0, 0.25, 0.5, 0.75, 1].map(t => {
@@ -111,6 +118,7 @@ function _lineChartSVG(data, valueKey, opts) {
         <svg viewBox="0 0 ${W} ${H}" style="width:100%; height:auto; display:block">
             ${yTicks}
             ${goalLine}
+            ${avgPath}
             <path d="${pathD}" fill="none" stroke="${color}" stroke-width="2"/>
             ${dots}
             ${xLabels}
@@ -210,12 +218,10 @@ function _renderPriceSection() {
     }).join('');
 
     const series = priceState.series || [];
-    const minV = series.length ? Math.min(...series.map(d => d.unit_price)) : null;
-    const maxV = series.length ? Math.max(...series.map(d => d.unit_price)) : null;
-    const lastV = series.length ? series[series.length - 1].unit_price : null;
+    const s = priceState.summary;
 
-    const summary = series.length
-        ? `<span class="card-sub">${series.length} observaciones · min ${minV.toFixed(2)} € · max ${maxV.toFixed(2)} € · último ${lastV.toFixed(2)} €</span>`
+    const summary = (series.length && s)
+        ? `<span class="card-sub">${s.count} observaciones · min ${s.min.toFixed(2)} € · max ${s.max.toFixed(2)} € · último ${s.last.toFixed(2)} €</span>`
         : '<span class="card-sub">sin observaciones</span>';
 
     return `
@@ -240,11 +246,11 @@ window.renderCharts = function() {
     }
 
     const goal = window.AppState.goals.kcal || 0;
-    const wData = chartsData.weights ? _filterByRange(chartsData.weights, chartsRange) : [];
+    const wData = chartsData.weights || [];
     const kData = chartsData.kcal || [];
 
     const lastWeight = wData.length > 0 ? wData[wData.length - 1].weight : null;
-    const avgKcal = kData.length > 0 ? Math.round(kData.reduce((s, d) => s + (d.kcal || 0), 0) / kData.length) : 0;
+    const avgKcal = Math.round(chartsData.kcalAvg || 0);
 
     const rangeBtn = (val, label) => `<button aria-pressed="${chartsRange === val}" data-range="${val}">${label}</button>`;
 
@@ -270,7 +276,7 @@ window.renderCharts = function() {
                     <div class="card-title">Peso corporal</div>
                     <span class="card-sub">${lastWeight != null ? `${lastWeight} kg último` : 'sin registros'}</span>
                 </div>
-                ${chartsData.loading ? `<div class="empty" style="padding:30px 0">Cargando…</div>` : _lineChartSVG(wData, 'weight', { color: 'var(--accent)' })}
+                ${chartsData.loading ? `<div class="empty" style="padding:30px 0">Cargando…</div>` : _lineChartSVG(wData, 'weight', { color: 'var(--accent)', avgKey: 'avg' })}
             </div>
 
             <div class="card">
@@ -293,16 +299,10 @@ window.initCharts = function() {
     root.querySelectorAll('[data-range]').forEach(btn => {
         btn.addEventListener('click', async () => {
             chartsRange = Number(btn.dataset.range);
-            // Reload kcal series (weight is fetched whole, just re-filter)
-            chartsData.kcal = null;
+            // One request reloads every series for the new range
             chartsData.loading = true;
             window.renderPage();
-            try {
-                chartsData.kcal = await window.apiCall(`/stats/daily-kcal?days=${chartsRange || 365}`, 'GET');
-            } catch (e) {
-                chartsData.kcal = [];
-            }
-            chartsData.loading = false;
+            await _loadChartData();
             window.renderPage();
         });
     });
@@ -327,6 +327,7 @@ window.initCharts = function() {
         try {
             await window.apiCall(`/products/${priceState.barcode}/price-history`, 'DELETE');
             priceState.series = [];
+            priceState.summary = null;
             window.showToast('Histórico vaciado', 'success');
             window.renderPage();
         } catch (e) {
@@ -539,6 +539,9 @@ window.openEditProduct = function(barcode) {
                     source: 'manual',
                 });
             }
+            // Recipe macros are recomputed server-side from these fields
+            const macroFields = ['unit_type', 'weight_g', 'kcal_100g', 'proteins_100g', 'carbs_100g', 'fat_100g'];
+            if (window.reloadRecipes && macroFields.some(k => k in payload)) await window.reloadRecipes();
             await window.reloadProducts();
             close();
             const parts = [];
@@ -11,9 +11,40 @@ function _emptyDraft() {
     return { name: '', description: '', instructions: '', image_url: '', serves: 1, time: 15, tags: [], meal_types: [], ingredients: [], output_product_id: null, output_qty: 1, default_expiry_days: null, fridge_expiry_days: null, freezer_expiry_days: null };
 }
 
+// Server-side availability (GET /recipes/availability), fetched once per
+// products + recipes snapshot. Until it lands, "has everything" falls back to
+// "every ingredient is a known product".
+async function _loadAvailability() {
+    const { products, recipes } = window.AppState;
+    const avail = window.AppState.availability;
+    if (avail && avail.forProducts === products && avail.forRecipes === recipes) return;
+    try {
+        const rows = await window.apiCall('/recipes/availability', 'GET', null, 0);
+        const byId = {};
+        rows.forEach(a => { byId[String(a.recipe_id)] = a; });
+        window.AppState.availability = { byId, forProducts: products, forRecipes: recipes };
+        if (window.AppState.page === 'recipes' && !recipeBuilder) window.renderPage();
+    } catch (e) {
+        console.warn('recipe availability failed', e);
+    }
+}
+
+function _hasAllFn() {
+    const { products, recipes } = window.AppState;
+    const avail = window.AppState.availability;
+    if (avail && avail.forProducts === products && avail.forRecipes === recipes) {
+        return r => {
+            const a = avail.byId[String(r.id)];
+            return !!a && a.covered >= 1;
+        };
+    }
+    const pantryIds = new Set((products || []).map(p => String(p.barcode)));
+    return r => (r.ingredients || []).every(ing => pantryIds.has(String(ing.productId)));
+}
+
 function _filterRecipes() {
     const all = window.AppState.recipes || [];
-    const pantryIds = new Set((window.AppState.products || []).map(p => String(p.barcode)));
+    const hasAll = _hasAllFn();
     return all.filter(r => {
         if (recipesQuery && !r.name.toLowerCase().includes(recipesQuery.toLowerCase())) return false;
         if (recipesFilter === 'rapidas' && (r.time || 0) > 15) return false;
@@ -21,10 +52,7 @@ function _filterRecipes() {
             const m = window.recipeMacros(r);
             if (m.kcal === 0 || (m.p * 4) / m.kcal < 0.35) return false;
         }
-        if (recipesFilter === 'despensa') {
-            const has = (r.ingredients || []).every(ing => pantryIds.has(String(ing.productId)));
-            if (!has) return false;
-        }
+        if (recipesFilter === 'despensa' && !hasAll(r)) return false;
         return true;
     });
 }
@@ -33,11 +61,11 @@ window.renderRecipes = function() {
     if (recipeBuilder) return _renderBuilder();
 
     const filtered = _filterRecipes();
-    const pantryIds = new Set((window.AppState.products || []).map(p => String(p.barcode)));
+    const hasAllFn = _hasAllFn();
 
     const cards = filtered.map((r, i) => {
         const m = window.recipeMacros(r);
-        const hasAll = (r.ingredients || []).every(ing => pantryIds.has(String(ing.productId)));
+        const hasAll = hasAllFn(r);
         return `
             <div class="recipe-card" data-rid="${window.esc(r.id)}">
                 <div class="recipe-thumb">${window.recipeThumbHTML(i, `receta · ${r.time || '?'} min`)}</div>
@@ -434,16 +462,18 @@ async function _makeRecipe(r) {
                 window.showToast(`Stock insuficiente: ${short.join(', ')}`, 'warn');
             }
 
-            // Deduct ingredients
+            // Deduct ingredients. Short ones are skipped (the backend would
+            // reject the whole batch for them) and reported as before.
+            const bulk = [];
             for (const ing of ingredients) {
                 const p = window.findProductById(ing.productId);
                 if (!p) continue;
                 const needed = ing.qty * ratio;
-                try {
-                    await window.apiCall(`/products/${p.barcode}/stock`, 'POST', { quantity: -needed, reason: 'recipe' });
-                } catch (e) {
+                if ((p.stock || 0) < needed) {
                     window.showToast(`Error descontando ${p.name}`, 'error');
+                    continue;
                 }
+                bulk.push({ barcode: p.barcode, quantity: -needed, reason: 'recipe' });
             }
 
             // Add output product if configured
@@ -459,15 +489,24 @@ async function _makeRecipe(r) {
                 const outputBarcode = await _ensureOutputProduct(r);
                 if (outputBarcode) {
                     const locationLabel = storage === 'freezer' ? 'Congelador' : 'Nevera';
-                    try {
-                        await window.apiCall(`/products/${outputBarcode}/stock`, 'POST', {
-                            quantity: outputProduced,
-                            expiry_date: _expiryFromDays(expiryDays),
-                            location: locationLabel,
-                        });
-                    } catch (e) {
-                        window.showToast('Error añadiendo resultado al stock', 'error');
-                    }
+                    bulk.push({
+                        barcode: outputBarcode,
+                        quantity: outputProduced,
+                        expiry_date: _expiryFromDays(expiryDays),
+                        location: locationLabel,
+                    });
+                }
+            }
+
+            // Deductions and the output batch go in one transaction: the
+            // ingredients never disappear without the dish appearing.
+            if (bulk.length) {
+                try {
+                    await window.apiCall('/stock/bulk', 'POST', bulk, 0);
+                } catch (e) {
+                    window.showToast(`Error actualizando stock: ${e.message}`, 'error');
+                    if (window.reloadProducts) await window.reloadProducts();
+                    return;
                 }
             }
 
@@ -487,6 +526,8 @@ window.initRecipes = function() {
         return;
     }
 
+    _loadAvailability();
+
     const search = root.querySelector('#r-search');
     if (search) search.addEventListener('input', e => { recipesQuery = e.target.value; window.renderPage(); });
 
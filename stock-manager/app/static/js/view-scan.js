@@ -118,7 +118,17 @@ async function _onScanSuccess(decodedText) {
 
     scanState.phase = 'review';
 
-    const existing = window.findProductById(lookupCode);
+    let existing = window.findProductById(lookupCode);
+    if (!existing) {
+        // Server-side resolve also catches UPC-A / GTIN-14 spellings of a
+        // known EAN-13 and links added from another device since boot.
+        try {
+            const res = await window.apiCall(`/resolve/${encodeURIComponent(lookupCode)}`, 'GET', null, 0);
+            if (res && res.product) existing = window.findProductById(res.product.barcode) || res.product;
+        } catch (e) {
+            // not critical
+        }
+    }
     if (existing) {
         // Canonicalize barcode to the matched product's so the confirm POST
         // hits an endpoint the backend recognizes. The scanned code might be
@@ -181,14 +191,15 @@ function _similarity(a, b) {
 }
 
 function _parseLine(line) {
-    // Extract leading qty "2 x Algo" / "2x Algo"; strip prices, weights, codes
+    // Extract leading qty "2 x Algo" / "2x Algo"; strip weights, prices, codes
+    // (weights first: the price pattern would eat "1,25" out of "1,250 kg")
     let qty = 1;
     let name = line;
     const qm = name.match(/^(\d+)\s*[xX×]\s+(.+)/);
     if (qm) { qty = parseInt(qm[1], 10); name = qm[2]; }
     name = name
-        .replace(/\d+[,.]\d{2}\s*€?/g, '')
         .replace(/\d+[,.]\d{1,3}\s*(kg|g|l|ml|cl|ud|uds)\b/gi, '')
+        .replace(/\d+[,.]\d{2}\s*€?/g, '')
         .replace(/^\d{3,}\s+/, '')
         .replace(/^[-*.,\s]+/, '')
         .replace(/[-*.,\s]+$/, '')
@@ -196,17 +207,28 @@ function _parseLine(line) {
     return { qty, name };
 }
 
-function _matchProducts(lines) {
+// Learned alias (line confirmed in a previous ticket) wins over fuzzy scoring.
+function _aliasMatch(barcode) {
+    return barcode ? (window.findProductById(barcode) || null) : null;
+}
+
+function _bestFuzzyMatch(name, products) {
+    let best = null, bestScore = 0;
+    for (const p of products) {
+        const s = _similarity(name, p.name);
+        if (s > bestScore && s >= 0.35) { bestScore = s; best = p; }
+    }
+    return { best, bestScore };
+}
+
+function _matchProducts(lines, aliases = {}) {
     const products = window.AppState.products || [];
     const items = [];
     for (const rawLine of lines) {
         const { qty, name } = _parseLine(rawLine);
         if (!name || name.length < 2) continue;
-        let best = null, bestScore = 0;
-        for (const p of products) {
-            const s = _similarity(name, p.name);
-            if (s > bestScore && s >= 0.35) { bestScore = s; best = p; }
-        }
+        const aliased = _aliasMatch(aliases[rawLine]);
+        const { best, bestScore } = aliased ? { best: aliased, bestScore: 1 } : _bestFuzzyMatch(name, products);
         // De-dupe: if same product matched twice, sum qty
         const existing = items.find(it => it.match && best && it.match.barcode === best.barcode);
         if (existing) {
@@ -231,7 +253,7 @@ async function _processTicketFile(file) {
         if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
         const data = await resp.json();
         scanState.ticketLines = data.lines || [];
-        scanState.ticketItems = _matchProducts(scanState.ticketLines);
+        scanState.ticketItems = _matchProducts(scanState.ticketLines, data.aliases || {});
         scanState.phase = 'ticket-review';
     } catch (e) {
         window.showToast('Error leyendo ticket: ' + e.message, 'error');
@@ -248,16 +270,16 @@ function _matchProductsFromStructured(structuredItems) {
     for (const it of structuredItems) {
         const cleanName = (it.name || '').trim();
         if (!cleanName || cleanName.length < 2) continue;
-        let best = null, bestScore = 0;
-        for (const p of products) {
-            const s = _similarity(cleanName, p.name);
-            if (s > bestScore && s >= 0.35) { bestScore = s; best = p; }
-        }
+        const aliased = _aliasMatch(it.alias_barcode);
+        const { best, bestScore } = aliased ? { best: aliased, bestScore: 1 } : _bestFuzzyMatch(cleanName, products);
         const packs = it.qty || 1;
         const packSize = window.packSize(best);
         const qty = (best && packSize != null) ? packs * packSize : packs;
 
-        const existing = items.find(x => x.match && best && x.match.barcode === best.barcode);
+        // Batch uploads mix tickets: only merge repeats within the same one so
+        // each price observation keeps its own ticket reference.
+        const existing = items.find(x => x.match && best && x.match.barcode === best.barcode
+            && x.ticket_id === (it.ticket_id ?? null));
         if (existing) {
             existing.packs += packs;
             existing.qty = (best && packSize != null) ? existing.packs * packSize : existing.packs;
@@ -273,6 +295,8 @@ function _matchProductsFromStructured(structuredItems) {
                 packSize: packSize,
                 unit_price: it.unit_price ?? null,
                 total_price: it.total_price ?? null,
+                ticket_id: it.ticket_id ?? null,
+                date: it.date ?? null,
                 match: best,
                 score: bestScore,
                 checked: !!best,
@@ -301,6 +325,9 @@ async function _processTicketPdf(file) {
             ticket_id: data.ticket_id || null,
             total: data.total ?? null,
         };
+        if (data.confirmed_at) {
+            window.showToast(`Este ticket ya se añadió al stock (${data.confirmed_at.slice(0, 10)})`, 'info');
+        }
         scanState.phase = 'ticket-review';
     } catch (e) {
         window.showToast('Error leyendo PDF: ' + e.message, 'error');
@@ -309,6 +336,47 @@ async function _processTicketPdf(file) {
     window.renderPage();
 }
 
+async function _processTicketPdfBatch(files) {
+    scanState.phase = 'ticket-loading';
+    scanState.ticketSource = 'pdf';
+    window.renderPage();
+    try {
+        const form = new FormData();
+        for (const f of files) form.append('files', f);
+        const base = window.API_BASE || '/api';
+        const resp = await fetch(`${base}/ocr/ticket-pdf/batch`, { method: 'POST', body: form });
+        if (!resp.ok) throw new Error(`HTTP ${resp.status}`);
+        const data = await resp.json();
+        const structured = data.items || [];
+        const tickets = data.tickets || [];
+        scanState.ticketLines = structured.map(it => it.line || it.name);
+        scanState.ticketItems = _matchProductsFromStructured(structured);
+        scanState.ticketMeta = {
+            date: tickets.length ? tickets[0].date : null,
+            ticket_id: null,
+            total: data.total ?? null,
+            count: tickets.length,
+        };
+        const done = tickets.filter(t => t.confirmed_at).length;
+        if (done) {
+            window.showToast(`${done} de ${tickets.length} tickets ya se añadieron al stock antes`, 'info');
+        }
+        const dup = (data.duplicates || []).length;
+        const err = (data.errors || []).length;
+        if (dup || err) {
+            const parts = [];
+            if (dup) parts.push(`${dup} duplicado${dup !== 1 ? 's' : ''}`);
+            if (err) parts.push(`${err} con error`);
+            window.showToast(`${tickets.length} tickets leídos (${parts.join(', ')} ignorados)`, 'info');
+        }
+        scanState.phase = 'ticket-review';
+    } catch (e) {
+        window.showToast('Error leyendo PDFs: ' + e.message, 'error');
+        scanState.phase = 'idle';
+    }
+    window.renderPage();
+}
+
 // ─── Live camera viewfinder ───────────────────────────────────────────────────
 
 function _hasLiveCameraSupport() {
@@ -498,7 +566,7 @@ function _renderIdle() {
         </div>
         <input type="file" id="camera-input" accept="image/*" capture="environment" style="display:none">
         <input type="file" id="ticket-input" accept="image/*" capture="environment" style="display:none">
-        <input type="file" id="ticket-pdf-input" accept="application/pdf,.pdf" style="display:none">
+        <input type="file" id="ticket-pdf-input" accept="application/pdf,.pdf,application/zip,.zip" multiple style="display:none">
         <div class="stack" style="gap:10px; margin-top:14px">
             <button class="btn accent scan-cta-btn" data-action="start" style="width:100%">${window.icon('scan')} Abrir cámara</button>
             <button class="btn ghost scan-cta-btn" data-action="start-ticket" style="width:100%">${window.icon('scan')} Leer ticket (foto)</button>
@@ -590,6 +658,7 @@ function _renderTicketReview() {
         <div class="row" style="gap:12px; flex-wrap:wrap; font-size:12px; color:var(--ink-2); margin-bottom:8px">
             ${meta.date ? `<span>📅 ${window.esc(meta.date)}</span>` : ''}
             ${meta.ticket_id ? `<span>🧾 ${window.esc(meta.ticket_id)}</span>` : ''}
+            ${meta.count ? `<span>🧾 ${meta.count} tickets</span>` : ''}
             ${meta.total != null ? `<span>💶 Total ${_fmtPrice(meta.total)} €</span>` : ''}
         </div>
     ` : '';
@@ -832,8 +901,10 @@ window.initScan = function() {
         const ticketPdfInput = root.querySelector('#ticket-pdf-input');
         if (ticketPdfInput) {
             ticketPdfInput.addEventListener('change', e => {
-                const file = e.target.files[0];
-                if (file) _processTicketPdf(file);
+                const files = Array.from(e.target.files || []);
+                const single = files.length === 1 && !/\.zip$/i.test(files[0].name);
+                if (single) _processTicketPdf(files[0]);
+                else if (files.length) _processTicketPdfBatch(files);
                 ticketPdfInput.value = '';
             });
         }
@@ -1054,31 +1125,78 @@ async function _confirmTicket() {
 
     const sourceLabel = scanState.ticketSource === 'pdf' ? 'ticket_pdf' : 'ticket_ocr';
     const meta = scanState.ticketMeta || {};
+
+    // Read-only duplicate guard before any stock change: the backend
+    // remembers which ticket ids were already added. They are only marked
+    // by the /stock/bulk call below, in the same transaction as the stock.
+    const ticketIds = [...new Set(toAdd.map(it => it.ticket_id || meta.ticket_id).filter(Boolean))];
+    if (ticketIds.length) {
+        let res;
+        try {
+            res = await window.apiCall('/tickets/check', 'POST', { ticket_ids: ticketIds }, 0);
+        } catch (e) {
+            window.showToast(`No se pudo comprobar el ticket: ${e.message}`, 'error');
+            return;
+        }
+        if (res.already_confirmed && res.already_confirmed.length) {
+            const n = res.already_confirmed.length;
+            const msg = n === 1
+                ? `Este ticket ya se añadió al stock el ${res.already_confirmed[0].confirmed_at.slice(0, 10)}. ¿Añadirlo otra vez?`
+                : `${n} de estos tickets ya se añadieron al stock. ¿Añadirlos otra vez?`;
+            if (!await window.confirmDialog(msg)) return;
+        }
+    }
     let successCount = 0;
     let priceCount = 0;
+    const learned = [];
+    const bulk = [];
 
     for (const item of toAdd) {
-        try {
-            const gated = await _gateScaleProduct(item.match.barcode, item.qty, sourceLabel);
-            if (!gated) {
-                // Bundle price with the stock add so the backend can tag the
-                // resulting batch with this purchase price atomically.
-                const payload = { quantity: item.qty, reason: 'restock' };
-                if (item.unit_price != null) {
-                    payload.unit_price = item.unit_price;
-                    payload.pack_count = item.packs;
-                    payload.total_price = item.total_price;
-                    payload.price_source = sourceLabel;
-                    payload.price_source_ref = meta.ticket_id || null;
-                    payload.price_observed_at = meta.date || null;
-                    priceCount++;
-                }
-                await window.apiCall(`/products/${item.match.barcode}/stock`, 'POST', payload);
-            }
+        const gated = await _gateScaleProduct(item.match.barcode, item.qty, sourceLabel);
+        if (gated) {
             successCount++;
+        } else {
+            // Bundle price with the stock add so the backend can tag the
+            // resulting batch with this purchase price atomically.
+            const payload = { barcode: item.match.barcode, quantity: item.qty, reason: 'restock' };
+            if (item.unit_price != null) {
+                payload.unit_price = item.unit_price;
+                payload.pack_count = item.packs;
+                payload.total_price = item.total_price;
+                payload.price_source = sourceLabel;
+                payload.price_source_ref = item.ticket_id || meta.ticket_id || null;
+                payload.price_observed_at = item.date || meta.date || null;
+            }
+            bulk.push(payload);
+        }
+        // PDF names are already clean; OCR lines are normalized server-side.
+        learned.push({
+            line: scanState.ticketSource === 'pdf' ? item.name : item.line,
+            barcode: item.match.barcode,
+        });
+    }
+
+    // Whole ticket in one request / one transaction: either every line
+    // lands in stock or none does, so a retry never double-adds half a ticket.
+    if (bulk.length) {
+        const query = ticketIds.length ? `?ticket_ids=${encodeURIComponent(ticketIds.join(','))}` : '';
+        try {
+            await window.apiCall(`/stock/bulk${query}`, 'POST', bulk, 0);
+            successCount += bulk.length;
+            priceCount = bulk.filter(u => u.unit_price != null).length;
         } catch (e) {
-            window.showToast(`Error al actualizar ${item.match.name}: ${e.message}`, 'error');
+            window.showToast(`Error al actualizar el stock: ${e.message}`, 'error');
+            learned.length = 0;
         }
+    } else if (ticketIds.length && successCount > 0) {
+        // Only scale refills: nothing went through /stock/bulk to carry the ids.
+        await window.apiCall('/tickets/confirm', 'POST', { ticket_ids: ticketIds }, 0)
+            .catch(e => window.showToast(`No se pudo marcar el ticket como añadido: ${e.message}`, 'error'));
+    }
+
+    if (learned.length) {
+        // Not critical: a failure only means next ticket falls back to fuzzy matching.
+        window.apiCall('/ticket-aliases', 'POST', learned, 0).catch(e => console.warn('ticket-aliases failed', e));
     }
 
     if (successCount > 0) {
@@ -1111,10 +1229,12 @@ function _openLinkPicker(targetCode) {
         const mount = document.getElementById('modal-mount');
         if (!mount) { resolve(null); return; }
         let q = '';
-        const close = (picked) => { mount.innerHTML = ''; resolve(picked); };
+        let serverHits = null;  // ranked results from /products/search for q
+        let searchTimer = null;
+        const close = (picked) => { clearTimeout(searchTimer); mount.innerHTML = ''; resolve(picked); };
         const render = () => {
             const needle = q.trim().toLowerCase();
-            const products = (window.AppState.products || [])
+            const products = (needle && serverHits) ? serverHits : (window.AppState.products || [])
                 .filter(p => !needle || (p.name || '').toLowerCase().includes(needle))
                 .slice(0, 60);
             mount.innerHTML = `
@@ -1146,7 +1266,21 @@ function _openLinkPicker(targetCode) {
             mount.querySelector('[data-action="link-cancel"]').addEventListener('click', () => close(null));
             const search = mount.querySelector('#link-search');
             if (search) {
-                search.addEventListener('input', e => { q = e.target.value; render(); });
+                search.addEventListener('input', e => {
+                    q = e.target.value;
+                    serverHits = null;
+                    clearTimeout(searchTimer);
+                    const needle = q.trim();
+                    if (needle) {
+                        searchTimer = setTimeout(async () => {
+                            const hits = await window.searchProducts(needle, 60);
+                            if (hits === null || q.trim() !== needle) return;
+                            serverHits = hits;
+                            render();
+                        }, 150);
+                    }
+                    render();
+                });
                 // Keep focus on the search box across re-renders so typing flows.
                 setTimeout(() => { try { search.focus(); search.setSelectionRange(q.length, q.length); } catch (_) {} }, 0);
             }
@@ -10,8 +10,32 @@ function _fmtEur(n) {
     return Number(n).toLocaleString('es-ES', { minimumFractionDigits: 2, maximumFractionDigits: 2 }) + ' €';
 }
 
-// Derive auto items from products where stock < min_stock (never stored)
+// Auto items: products below min_stock (never stored). The backend basket
+// (/shopping/basket) rounds to whole packs, picks the cheapest pack among
+// same-name products and prices from last_price or recent price history;
+// until it arrives, fall back to the plain local min_stock diff.
 function _autoShoppingItems() {
+    const basket = window.AppState.basket;
+    if (basket && basket.forProducts === window.AppState.products) {
+        return basket.lines.map(line => {
+            const unit = line.unit_type === 'uds' ? 'ud' : (line.unit_type || 'g');
+            const priced = line.picks.filter(k => k.unit_price != null);
+            return {
+                id: `auto-${line.barcode}`,
+                barcode: line.barcode,
+                name: line.name,
+                qty: line.needed,
+                qtyText: `${line.needed % 1 === 0 ? line.needed : line.needed.toFixed(1)} ${unit}`,
+                packsNeeded: line.packs,
+                packText: priced.map(k => `${k.packs} × ${_fmtEur(k.unit_price)}${line.picks.length > 1 ? ` (${k.name})` : ''}`).join(' + '),
+                lastPrice: priced.length ? priced[0].unit_price : null,
+                estCost: line.cost,
+                cat: line.category || 'Otros',
+                auto: true,
+                done: false,
+            };
+        });
+    }
     const products = window.AppState.products || [];
     return products
         .filter(p => p.min_stock != null && (p.stock || 0) < p.min_stock)
@@ -29,6 +53,7 @@ function _autoShoppingItems() {
                 qty: needed,
                 qtyText: `${needed % 1 === 0 ? needed : needed.toFixed(1)} ${unit}`,
                 packsNeeded,
+                packText: packsNeeded != null && p.last_price != null ? `${packsNeeded} × ${_fmtEur(p.last_price)}` : '',
                 lastPrice: p.last_price ?? null,
                 estCost,
                 cat: p.category || 'Otros',
@@ -38,6 +63,21 @@ function _autoShoppingItems() {
         });
 }
 
+// Fetch the min_stock basket once per products snapshot (reloadProducts
+// replaces the array, which invalidates it) and re-render when it lands.
+async function _loadBasket() {
+    const products = window.AppState.products;
+    const basket = window.AppState.basket;
+    if (basket && basket.forProducts === products) return;
+    try {
+        const data = await window.apiCall('/shopping/basket?plan=false', 'GET', null, 0);
+        window.AppState.basket = Object.assign(data, { forProducts: products });
+        if (window.AppState.page === 'shopping') window.renderPage();
+    } catch (e) {
+        console.warn('shopping basket failed', e);
+    }
+}
+
 function _groupByCat(items) {
     const byCat = items.reduce((acc, item) => {
         const key = item.cat || 'Otros';
@@ -53,7 +93,7 @@ function _groupByCat(items) {
 
 function _renderAutoRow(item) {
     const costChip = item.estCost != null
-        ? `<span class="chip" style="font-family:var(--mono); background:color-mix(in oklab, var(--accent-soft, #e8f5e9) 60%, var(--bg) 40%); color:var(--accent, #2e7d32)" title="${item.packsNeeded} pack${item.packsNeeded !== 1 ? 's' : ''} × ${_fmtEur(item.lastPrice)}">≈ ${_fmtEur(item.estCost)}</span>`
+        ? `<span class="chip" style="font-family:var(--mono); background:color-mix(in oklab, var(--accent-soft, #e8f5e9) 60%, var(--bg) 40%); color:var(--accent, #2e7d32)" title="${window.esc(item.packText || '')}">≈ ${_fmtEur(item.estCost)}</span>`
         : (item.lastPrice == null ? `<span class="chip muted" style="font-size:10px" title="Sin precio registrado">sin precio</span>` : '');
     return `
         <div class="shop-row">
@@ -217,6 +257,8 @@ window.initShopping = function() {
     const root = document.getElementById('page-root');
     if (!root) return;
 
+    _loadBasket();
+
     // Show inline add form when user clicks "+ Añadir"
     root.querySelector('[data-action="add-manual"]')?.addEventListener('click', () => {
         const form = root.querySelector('#shop-form');
@@ -85,160 +85,72 @@ async function clearWeek() {
     window.renderPage();
 }
 
-async function generateAuto() {
+async function generateAuto(mode = 'macros') {
     const candidates = (window.AppState.recipes || []).slice();
     if (candidates.length === 0) {
         window.showToast('No hay recetas: creá algunas en Recetas primero.', 'info');
         return;
     }
 
-    const MEAL_IDS = ['desayuno', 'almuerzo', 'comida', 'merienda', 'cena'];
-    const goals = window.AppState.goals;
-
-    // Build pool per meal: strict tag match if >= 3 results, else all recipes
-    const pools = {};
-    MEAL_IDS.forEach(mealId => {
-        const strict = candidates.filter(r => {
-            const mts = r.meal_types || [];
-            if (mts.length > 0) return mts.includes(mealId);
-            // Legacy fallback: use tags if no meal_types defined
-            return (r.tags || []).includes(mealId);
-        });
-        pools[mealId] = strict.length >= 3 ? strict : candidates;
-    });
-
-    const pickRandom = arr => arr[Math.floor(Math.random() * arr.length)];
-
-    // Sum macros for a day configuration { mealId: [recipeId, ...], ... }
-    function dayMacros(cfg) {
-        const t = { kcal: 0, p: 0, c: 0, fat: 0 };
-        Object.values(cfg).forEach(arr => (arr || []).forEach(rid => {
-            const r = recipeById(rid);
-            if (!r) return;
-            const m = window.recipeMacros(r);
-            t.kcal += m.kcal; t.p += m.p; t.c += m.c; t.fat += m.fat;
-        }));
-        return t;
-    }
-
-    // Score a day config: lower is better.
-    // macroErr: sum of squared relative errors for non-zero goals only.
-    // varietyPenalty: heavy if used in last 2 days, mild if earlier in the week.
-    function dayScore(cfg, recentlyUsed) {
-        const t = dayMacros(cfg);
-        const sq = x => x * x;
-        let macroErr = 0;
-        if (goals.kcal > 0) macroErr += sq((t.kcal - goals.kcal) / goals.kcal);
-        if (goals.p   > 0) macroErr += sq((t.p   - goals.p)   / goals.p);
-        if (goals.c   > 0) macroErr += sq((t.c   - goals.c)   / goals.c);
-        if (goals.fat > 0) macroErr += sq((t.fat - goals.fat) / goals.fat);
-
-        let varietyPenalty = 0;
-        Object.values(cfg).forEach(arr => (arr || []).forEach(rid => {
-            if (!recentlyUsed.has(rid)) return;
-            const daysSince = recentlyUsed.get(rid);
-            varietyPenalty += daysSince <= 2 ? 0.5 : 0.1;
-        }));
-
-        return macroErr + varietyPenalty;
-    }
-
-    // Two-phase search: random sampling (2000 iters) + hill climbing (up to 10 passes)
-    function bestConfigForDay(recentlyUsed) {
-        // Phase 1: random sampling
-        let bestCfg = null;
-        let bestScore = Infinity;
-
-        for (let i = 0; i < 2000; i++) {
-            const cfg = {};
-            MEAL_IDS.forEach(mealId => {
-                const pool = pools[mealId];
-                if (pool.length === 0) return;
-                const r = pickRandom(pool);
-                if (r) cfg[mealId] = [r.id];
-            });
-            const score = dayScore(cfg, recentlyUsed);
-            if (score < bestScore) { bestScore = score; bestCfg = cfg; }
-        }
-
-        if (!bestCfg) return {};
-
-        // Phase 2: hill climbing
-        let improved = true;
-        let passes = 0;
-        while (improved && passes < 10) {
-            improved = false;
-            passes++;
-            MEAL_IDS.forEach(mealId => {
-                const pool = pools[mealId];
-                if (pool.length === 0) return;
-                const currentScore = dayScore(bestCfg, recentlyUsed);
-                pool.forEach(candidate => {
-                    const trial = Object.assign({}, bestCfg, { [mealId]: [candidate.id] });
-                    const trialScore = dayScore(trial, recentlyUsed);
-                    if (trialScore < currentScore) {
-                        bestCfg = trial;
-                        improved = true;
-                    }
-                });
-            });
-        }
-
-        return bestCfg;
+    // The search runs in the backend (app/planner.py): same objective as
+    // before — squared relative macro error + variety penalty — scored in
+    // vectorised batches instead of recipe by recipe on the phone.
+    let plan;
+    try {
+        plan = await window.apiCall('/diet-plan/generate', 'POST', { mode }, 0);
+    } catch (e) {
+        window.showToast('Error generando plan: ' + e.message, 'error');
+        return;
     }
 
-    // Process days Monday → Sunday, tracking recipe usage by day index
-    // recentlyUsed: Map<recipeId, lastDayIdx> — daysSince = currentDayIdx - lastDayIdx
-    const recentlyUsed = new Map();
     const newWeek = {};
-
     window.DAY_LABELS.forEach((d, dayIdx) => {
-        // Reframe map to daysSince for scoring
-        const daysSinceMap = new Map();
-        recentlyUsed.forEach((lastDayIdx, rid) => {
-            daysSinceMap.set(rid, dayIdx - lastDayIdx);
-        });
-
-        const cfg = bestConfigForDay(daysSinceMap);
-        newWeek[d.id] = cfg;
-
-        // Update recentlyUsed with this day's picks
-        Object.values(cfg).forEach(arr => (arr || []).forEach(rid => {
-            recentlyUsed.set(rid, dayIdx);
-        }));
+        newWeek[d.id] = (plan.days && plan.days[dayIdx]) || {};
     });
 
     await window.saveWeek(newWeek);
-    window.showToast('Plan semanal generado', 'success');
+    if (mode === 'pantry') {
+        // "Use it up": say what the week rescues and what it still lacks.
+        const rescued = Object.keys(plan.rescued || {}).length;
+        const short = Object.keys(plan.shortages || {}).length;
+        const parts = [`${rescued} producto${rescued !== 1 ? 's' : ''} por caducar aprovechado${rescued !== 1 ? 's' : ''}`];
+        if (short) parts.push(`faltan ${short}`);
+        window.showToast('Plan generado con tu despensa: ' + parts.join(' · '), 'success');
+    } else {
+        window.showToast('Plan semanal generado', 'success');
+    }
     window.renderPage();
 }
 
-function generateShoppingFromWeek() {
-    const acc = {};
-    Object.values(window.AppState.week || {}).forEach(day => {
-        Object.values(day || {}).forEach(arr => {
-            (arr || []).forEach(rid => {
-                const r = recipeById(rid);
-                if (!r) return;
-                const serves = Math.max(1, r.serves || 1);
-                (r.ingredients || []).forEach(ing => {
-                    const key = String(ing.productId);
-                    acc[key] = (acc[key] || 0) + (ing.qty || 0) / serves;
-                });
-            });
-        });
-    });
-    if (Object.keys(acc).length === 0) {
+// Shopping list for the saved week, computed by the backend basket engine:
+// planned servings minus what is already in stock, rounded up to whole packs
+// (cheapest pack among same-name products) and priced when possible.
+async function generateShoppingFromWeek() {
+    if (!Object.values(window.AppState.week || {}).some(day => Object.values(day || {}).some(arr => (arr || []).length))) {
         window.showToast('Tu semana está vacía', 'info');
         return;
     }
-    const newItems = Object.entries(acc).map(([productId, qty]) => {
-        const p = window.findProductById(productId);
+    let basket;
+    try {
+        basket = await window.apiCall('/shopping/basket?min_stock=false', 'GET', null, 0);
+    } catch (e) {
+        window.showToast('Error calculando la compra: ' + e.message, 'error');
+        return;
+    }
+    if (!basket.lines.length) {
+        window.showToast('Ya tienes todo lo de la semana en la despensa', 'success');
+        return;
+    }
+    const newItems = basket.lines.map(line => {
+        const unit = line.unit_type === 'uds' ? 'ud' : (line.unit_type || 'g');
+        const packs = line.picks.length
+            ? line.picks.map(k => `${k.packs} × ${k.name}`).join(' + ')
+            : `${Math.round(line.needed)} ${unit}`;
         return {
-            id: 's' + Date.now() + '-' + productId,
-            name: p ? p.name : `Producto ${productId}`,
-            qty: `${Math.round(qty)} ${p && p.unit_type === 'uds' ? 'ud' : (p && p.unit_type) || 'g'}`,
-            cat: (p && p.category) || 'Otros',
+            id: 's' + Date.now() + '-' + line.barcode,
+            name: line.name,
+            qty: line.cost != null ? `${packs} (≈ ${line.cost.toFixed(2)} €)` : packs,
+            cat: line.category || 'Otros',
             done: false,
         };
     });
@@ -371,6 +283,7 @@ function _renderWeekMobile() {
             <div class="row" style="gap:6px; flex-wrap:wrap">
                 <button class="btn ghost sm" data-action="clear">Vaciar</button>
                 <button class="btn sm" data-action="auto">${window.icon('sparkle')} Generar</button>
+                <button class="btn sm" data-action="auto-pantry">${window.icon('pantry')} Despensa</button>
                 <button class="btn accent sm" data-action="shopping">Lista</button>
             </div>
         </div>
@@ -496,6 +409,7 @@ window.renderWeek = function() {
             <div class="btn-group row" style="gap:8px">
                 <button class="btn ghost" data-action="clear">Vaciar</button>
                 <button class="btn" data-action="auto">${window.icon('sparkle')} Generar automáticamente</button>
+                <button class="btn" data-action="auto-pantry" title="Prioriza lo que tienes y lo que caduca antes">${window.icon('pantry')} Aprovechar despensa</button>
                 <button class="btn accent" data-action="shopping">Generar lista de compra</button>
             </div>
         </div>
@@ -586,6 +500,7 @@ function _initWeekMobile(root) {
         if (await window.confirmDialog('¿Vaciar todo el plan semanal?')) await clearWeek();
     });
     root.querySelector('[data-action="auto"]')?.addEventListener('click', async () => generateAuto());
+    root.querySelector('[data-action="auto-pantry"]')?.addEventListener('click', async () => generateAuto('pantry'));
     root.querySelector('[data-action="shopping"]')?.addEventListener('click', generateShoppingFromWeek);
 }
 
@@ -614,6 +529,7 @@ window.initWeek = function() {
         if (await window.confirmDialog('¿Vaciar todo el plan semanal?')) await clearWeek();
     });
     root.querySelector('[data-action="auto"]').addEventListener('click', async () => generateAuto());
+    root.querySelector('[data-action="auto-pantry"]').addEventListener('click', async () => generateAuto('pantry'));
     root.querySelector('[data-action="shopping"]').addEventListener('click', generateShoppingFromWeek);
 
     const initialList = root.querySelector('#week-recipes-list');
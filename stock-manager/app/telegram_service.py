@@ -6,6 +6,7 @@ from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, fil
 from .database import db
 from .models import StockUpdate
 from .ocr_service import extract_text_from_image, parse_ticket_items
+from .worker_pool import worker_pool
 import json
 import io
 from PIL import Image
@@ -54,6 +55,7 @@ class TelegramService:
             "➖ `/restar <nombre/barcode> <cantidad>` - Quita stock\n"
             "📦 `/bajo_stock` - Lista productos que se están agotando\n"
             "📋 `/inventario` - Ver resumen del inventario\n"
+            "🍳 `/recetas [nombre]` - Recetas con sus macros por ración\n"
             "❓ `/ayuda` - Muestra este mensaje\n\n"
             "También puedes enviarme un **código de barras** directamente."
         )
@@ -70,21 +72,19 @@ class TelegramService:
             return
 
         query = " ".join(context.args)
-        products = await db.get_all_products()
-        
-        # Simple fuzzy match / contains
-        matches = [p for p in products if query.lower() in p.name.lower()]
+        # Ranked FTS search; only the first page is loaded
+        matches, total = await db.search_products(query, limit=10)
         
         if not matches:
             await update.message.reply_text(f"No he encontrado nada que coincida con '{query}'")
             return
 
         response = f"🔍 **Resultados para '{query}':**\n\n"
-        for p in matches[:10]: # Limit to 10
+        for p in matches:
             response += f"• `{p.barcode}` - **{p.name}**: {p.stock} uds. (Min: {p.min_stock})\n"
         
-        if len(matches) > 10:
-            response += f"\n_...y {len(matches) - 10} más._"
+        if total > 10:
+            response += f"\n_...y {total - 10} más._"
 
         await update.message.reply_text(response, parse_mode="Markdown")
 
@@ -114,6 +114,25 @@ class TelegramService:
         )
         await update.message.reply_text(response, parse_mode="Markdown")
 
+    async def recetas_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if not self.is_authorized(update.effective_chat.id): return
+
+        query = " ".join(context.args or []).lower()
+        # Per-serving macros come precomputed from the recipe_macros cache
+        recipes = [r for r in await db.get_planner_recipes() if query in r['name'].lower()]
+        if not recipes:
+            await update.message.reply_text(f"No he encontrado recetas que coincidan con '{query}'" if query else "Aún no hay recetas.")
+            return
+
+        response = "🍳 **Recetas (por ración):**\n\n"
+        for r in sorted(recipes, key=lambda r: r['name'].lower())[:20]:
+            response += (f"• **{r['name']}**: {round(r['kcal'])} kcal · P {round(r['proteins'])}g"
+                         f" · C {round(r['carbs'])}g · G {round(r['fat'])}g\n")
+        if len(recipes) > 20:
+            response += f"\n_...y {len(recipes) - 20} más._"
+
+        await update.message.reply_text(response, parse_mode="Markdown")
+
     async def stock_update_cmd(self, update: Update, context: ContextTypes.DEFAULT_TYPE, change: int):
         if not self.is_authorized(update.effective_chat.id): return
         
@@ -142,11 +161,10 @@ class TelegramService:
         product = await db.get_product(identifier)
         if not product:
             # Search by name
-            products = await db.get_all_products()
-            matches = [p for p in products if identifier.lower() in p.name.lower()]
-            if len(matches) == 1:
+            matches, total = await db.search_products(identifier, limit=5)
+            if total == 1:
                 product = matches[0]
-            elif len(matches) > 1:
+            elif total > 1:
                 # Ask to be more specific
                 response = f"He encontrado varios productos. Sé más específico:\n"
                 for m in matches[:5]:
@@ -291,7 +309,7 @@ class TelegramService:
         # 2. If no barcode, try OCR for ticket items
         try:
             await status_msg.edit_text("🎫 No veo códigos de barras. Analizando si es un ticket...")
-            text = extract_text_from_image(photo_bytes)
+            text = await worker_pool.run(extract_text_from_image, photo_bytes)
             items = parse_ticket_items(text)
             
             if not items:
@@ -346,6 +364,7 @@ class TelegramService:
         self.application.add_handler(CommandHandler("buscar", self.buscar_cmd))
         self.application.add_handler(CommandHandler("bajo_stock", self.low_stock_cmd))
         self.application.add_handler(CommandHandler("inventario", self.stats_cmd))
+        self.application.add_handler(CommandHandler("recetas", self.recetas_cmd))
         self.application.add_handler(CommandHandler("sumar", lambda u, c: self.stock_update_cmd(u, c, 1)))
         self.application.add_handler(CommandHandler("restar", lambda u, c: self.stock_update_cmd(u, c, -1)))
         
@@ -0,0 +1,88 @@
+"""
+Worker pool for CPU-bound parsing (ticket PDFs, OCR).
+
+pdfplumber and Tesseract pre/post-processing are plain CPU work; run inside an
+async handler they freeze the event loop — and with it the Telegram bot, the
+HA bridge and every other request — for the whole parse. `worker_pool.run()`
+ships the call to a small process pool instead, started lazily on first use
+and shut down in `lifespan`.
+
+Processes come from a `forkserver` context: forking the live server process
+(aiosqlite threads, open sockets) is not safe. If process pools aren't
+available on the host (or can't be started from the current process) the
+call falls back to a thread, which still keeps the loop responsive for the
+PDFium / Tesseract parts that release the GIL.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# A Raspberry Pi has 4 cores and little RAM; each worker imports pdfplumber
+# (and cv2 for OCR), so keep the pool small. Override with PARSE_WORKERS.
+MAX_WORKERS = int(os.getenv("PARSE_WORKERS", str(min(2, os.cpu_count() or 1))))
+
+
+class WorkerPool:
+    def __init__(self) -> None:
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._disabled = False
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self._executor is None and not self._disabled:
+            try:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=MAX_WORKERS,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                )
+                logger.info("Parse worker pool started (%d workers).", MAX_WORKERS)
+            except (OSError, ValueError, NotImplementedError) as e:
+                logger.warning(f"Process pool unavailable, parsing in threads: {e}")
+                self._disabled = True
+        return self._executor
+
+    async def run(self, fn: Callable, *args: Any) -> Any:
+        """Run `fn(*args)` off the event loop. `fn` and its arguments must be
+        picklable (module-level function, bytes/str/dict args)."""
+        executor = self._get_executor()
+        if executor is None:
+            return await asyncio.to_thread(fn, *args)
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(executor, fn, *args)
+        except RuntimeError as e:
+            # Raised by submit() when the pool can't start processes at all,
+            # e.g. in a forkserver child that is still importing an unguarded
+            # __main__ (a script without `if __name__ == "__main__"`). Raised
+            # here and not on await, so it can't be fn's own RuntimeError.
+            # Every retry would fail the same way: use threads from now on.
+            logger.warning(f"Process pool unusable, parsing in threads: {e}")
+            self._executor, self._disabled = None, True
+            executor.shutdown(wait=False, cancel_futures=True)
+            return await asyncio.to_thread(fn, *args)
+        try:
+            return await future
+        except BrokenProcessPool:
+            # A worker died (OOM killer on a small box). Drop the pool so the
+            # next call starts a fresh one, and serve this one in a thread.
+            logger.warning("Parse worker pool broke, restarting it on next use.")
+            self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            return await asyncio.to_thread(fn, *args)
+
+    async def stop(self) -> None:
+        if self._executor is None:
+            return
+        executor, self._executor = self._executor, None
+        await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+        logger.info("Parse worker pool stopped.")
+
+
+worker_pool = WorkerPool()
@@ -0,0 +1,101 @@
+"""
+Write a synthetic corpus of Mercadona-layout ticket PDFs for
+bench/ticket_pdf_backends.py, so its numbers can be reproduced without
+anyone's real receipts. Same header, "Descripción ... Importe" table and
+TOTAL line as a real ticket, one page each, seeded so every run writes the
+same files. No dependencies: the PDFs are written by hand with the built-in
+Courier font. From the `stock-manager` dir:
+
+    python -m bench.make_tickets /tmp/tickets --count 20
+    python -m bench.ticket_pdf_backends /tmp/tickets --repeat 5
+
+Real tickets (the PDFs from the Mercadona app) go through the bench the same
+way: point it at the folder they are in.
+"""
+import argparse
+import random
+from pathlib import Path
+
+FONT_SIZE = 8
+LINE = 10
+WIDTH = 230
+
+
+def _pdf_string(text: str) -> str:
+    escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    # WinAnsiEncoding is cp1252: "Ñ" and "€" become octal escapes of its bytes
+    return "(" + "".join(chr(b) if b < 128 else f"\\{b:03o}" for b in escaped.encode("cp1252")) + ")"
+
+
+def _text(x: float, y: float, text: str, right: bool = False) -> str:
+    if right:
+        x -= len(text) * FONT_SIZE * 0.6    # Courier: every glyph is 600/1000 em
+    return f"BT /F1 {FONT_SIZE} Tf {x:.1f} {y:.1f} Td {_pdf_string(text)} Tj ET"
+
+
+def _euros(value: float) -> str:
+    return f"{value:.2f}".replace(".", ",")
+
+
+def ticket_pdf(seed: int, lines: int) -> bytes:
+    """One ticket with `lines` items, deterministic for `seed`."""
+    rng = random.Random(seed)
+    height = 120 + lines * LINE
+    y = height - 20
+    ops = []
+    for header in ("MERCADONA, S.A. A-46103834", "C/ MAYOR 1",
+                   f"{1 + seed % 28:02d}/03/2025 18:32  OP: 123",
+                   f"FACTURA SIMPLIFICADA: 2154-011-{123450 + seed}"):
+        ops.append(_text(10, y, header))
+        y -= LINE
+    ops += [_text(10, y, "Descripción"), _text(150, y, "P. Unit"), _text(195, y, "Importe")]
+    y -= LINE
+    total = 0.0
+    for i in range(lines):
+        qty = rng.choice([1, 1, 2, 3])
+        unit = rng.randint(50, 600) / 100
+        total += qty * unit
+        ops.append(_text(10, y, f"{qty} PRODUCTO {i} ÑORA"))
+        if qty > 1:
+            ops.append(_text(180, y, _euros(unit), right=True))
+        ops.append(_text(220, y, _euros(qty * unit), right=True))
+        y -= LINE
+    ops += [_text(10, y, "TOTAL (€)"), _text(220, y, _euros(total), right=True)]
+    content = "\n".join(ops).encode("ascii")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {WIDTH} {height}] "
+        f"/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>".encode(),
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for n, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % n + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("folder", type=Path, help="output folder (created if missing)")
+    ap.add_argument("--count", type=int, default=20, help="number of tickets")
+    ap.add_argument("--lines", type=int, default=25, help="items on the first ticket; each next one adds 5, cycling")
+    args = ap.parse_args()
+
+    args.folder.mkdir(parents=True, exist_ok=True)
+    for seed in range(args.count):
+        lines = args.lines + 5 * (seed % 8)
+        (args.folder / f"ticket_{seed:03d}.pdf").write_bytes(ticket_pdf(seed, lines))
+    print(f"{args.count} tickets written to {args.folder}")
+
+
+if __name__ == "__main__":
+    main()
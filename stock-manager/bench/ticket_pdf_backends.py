@@ -0,0 +1,81 @@
+"""
+Benchmark the ticket PDF text backends on a folder of Mercadona PDFs.
+
+For every PDF and backend it times text extraction (best of --repeat runs),
+divides by the page count and reports per-page latency, plus how many items
+`parse_mercadona_ticket` finds — a backend that is fast but loses rows is no
+good. Not shipped in the add-on image; run it from the `stock-manager` dir
+on a folder of real tickets (the PDFs from the Mercadona app):
+
+    python -m bench.ticket_pdf_backends ~/tickets/ --repeat 5
+
+or on the synthetic corpus from bench/make_tickets.py, which anyone can
+regenerate byte for byte:
+
+    python -m bench.make_tickets /tmp/tickets --count 20
+    python -m bench.ticket_pdf_backends /tmp/tickets --repeat 5
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import ticket_pdf_service as tps  # noqa: E402
+
+
+def _page_count(pdf_bytes: bytes) -> int:
+    if tps.pdfium is not None:
+        return len(tps.pdfium.PdfDocument(pdf_bytes))
+    with tps.pdfplumber.open(tps.io.BytesIO(pdf_bytes)) as pdf:
+        return len(pdf.pages)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("folder", type=Path, help="folder with ticket PDFs")
+    ap.add_argument("--repeat", type=int, default=3, help="runs per file and backend (best is kept)")
+    args = ap.parse_args()
+
+    files = sorted(args.folder.glob("*.pdf"))
+    if not files:
+        sys.exit(f"No PDFs in {args.folder}")
+    backends = [b for b in tps.BACKENDS if b != "pdfium" or tps.pdfium is not None]
+
+    per_page = {b: [] for b in backends}
+    mismatches = 0
+    print(f"{'file':<32} {'pages':>5} " + " ".join(f"{b + ' ms/pg':>16} {'items':>5}" for b in backends))
+    for path in files:
+        data = path.read_bytes()
+        pages = _page_count(data) or 1
+        row, items = [], []
+        for b in backends:
+            best = float("inf")
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                text = tps.extract_text_from_pdf(data, backend=b)
+                best = min(best, time.perf_counter() - t0)
+            ms = best * 1000 / pages
+            per_page[b].append(ms)
+            n = len(tps.parse_mercadona_ticket(text)["items"])
+            items.append(n)
+            row.append(f"{ms:>16.2f} {n:>5}")
+        if len(set(items)) > 1:
+            mismatches += 1
+        print(f"{path.name[:32]:<32} {pages:>5} " + " ".join(row))
+
+    print()
+    for b in backends:
+        xs = sorted(per_page[b])
+        p95 = xs[min(len(xs) - 1, int(round(0.95 * (len(xs) - 1))))]
+        print(f"{b:<12} median {statistics.median(xs):8.2f} ms/page   p95 {p95:8.2f} ms/page")
+    if len(backends) > 1:
+        speedup = statistics.median(per_page["pdfplumber"]) / statistics.median(per_page["pdfium"])
+        print(f"pdfium speed-up (median): {speedup:.1f}x")
+    print(f"files where backends disagree on item count: {mismatches}/{len(files)}")
+
+
+if __name__ == "__main__":
+    main()
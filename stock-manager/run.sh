@@ -13,6 +13,7 @@ mkdir -p /data/stock_manager
 # Set database path
 export TELEGRAM_TOKEN=$(bashio::config 'telegram_token')
 export ALLOWED_CHAT_IDS=$(bashio::config 'allowed_chat_ids')
+export VARIABLE_WEIGHT_PREFIXES=$(bashio::config 'variable_weight_prefixes')
 export DATABASE_PATH=/data/stock_manager/stock.db
 export LOG_LEVEL="${LOG_LEVEL}"
 
@@ -0,0 +1,22 @@
+"""Tests run from the `stock-manager` dir: `python -m pytest -q`.
+
+They cover the pure modules (no FastAPI, no network) plus a few Database
+methods against a throwaway SQLite file."""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A Database on a fresh file, schema created."""
+    from app.database import Database
+
+    database = Database()
+    database.db_path = str(tmp_path / "stock.db")
+    asyncio.run(database.init_db())
+    return database
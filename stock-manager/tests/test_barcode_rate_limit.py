@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+from app import barcode_service as bs
+
+
+def test_limiter_spaces_requests():
+    limiter = bs._HostRateLimiter(per_minute=60 * 20)   # 50 ms apart
+
+    async def three():
+        start = time.monotonic()
+        for _ in range(3):
+            await limiter.acquire()
+        return time.monotonic() - start
+
+    assert 0.09 <= asyncio.run(three()) < 0.5
+
+
+def test_scans_do_not_wait_behind_background_lookups(monkeypatch):
+    async def fake_search(barcode, client, api_url, source_name):
+        return {"found": True, "name": barcode}
+
+    monkeypatch.setattr(bs, "_search_facts_api", fake_search)
+    name = bs.SOURCES[0][1]
+    # A back-fill has queued a minute's worth of requests on this host.
+    monkeypatch.setitem(bs._background_limiters, name, bs._HostRateLimiter(bs.BACKGROUND_RATE_PER_MIN))
+    bs._background_limiters[name]._next_at = time.monotonic() + 60
+    monkeypatch.setitem(bs._rate_limiters, name, bs._HostRateLimiter(100))
+
+    async def scan():
+        start = time.monotonic()
+        await bs._timed_search("8410000000000", None, "url", name)
+        return time.monotonic() - start
+
+    assert asyncio.run(scan()) < 0.5
+
+
+def test_split_budget_stays_under_host_limit():
+    name = bs.SOURCES[0][1]
+    per_minute = 60 / bs._rate_limiters[name].interval + 60 / bs._background_limiters[name].interval
+    assert per_minute <= bs.RATE_LIMIT_PER_MIN + 1e-9
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from app.models import BulkStockUpdate, ProductCreate
+
+
+def _stock(db, barcode):
+    return asyncio.run(db.get_product(barcode)).stock
+
+
+@pytest.fixture
+def pantry(db):
+    for barcode, name in (("leche", "Leche"), ("huevos", "Huevos")):
+        asyncio.run(db.create_product(ProductCreate(barcode=barcode, name=name, category="Alimentos")))
+    asyncio.run(db.bulk_update_stock([
+        BulkStockUpdate(barcode="leche", quantity=2, location="nevera"),
+        BulkStockUpdate(barcode="leche", quantity=3, location="despensa"),
+        BulkStockUpdate(barcode="huevos", quantity=6),
+    ]))
+    return db
+
+
+def test_applies_all_lines(pantry):
+    changed = asyncio.run(pantry.bulk_update_stock([
+        BulkStockUpdate(barcode="leche", quantity=-4),
+        BulkStockUpdate(barcode="huevos", quantity=-2),
+    ]))
+    assert {p.barcode: p.stock for p in changed} == {"leche": 1, "huevos": 4}
+
+
+def test_unknown_product_changes_nothing(pantry):
+    with pytest.raises(ValueError, match="Product not found: nope"):
+        asyncio.run(pantry.bulk_update_stock([
+            BulkStockUpdate(barcode="huevos", quantity=-1),
+            BulkStockUpdate(barcode="nope", quantity=1),
+        ]))
+    assert _stock(pantry, "huevos") == 6
+
+
+def test_location_overdraw_is_checked_against_its_batches(pantry):
+    # 5 leche in total, but only 2 in the fridge.
+    with pytest.raises(ValueError, match="Insufficient stock: leche"):
+        asyncio.run(pantry.bulk_update_stock([
+            BulkStockUpdate(barcode="huevos", quantity=-1),
+            BulkStockUpdate(barcode="leche", quantity=-3, location="nevera"),
+        ]))
+    assert _stock(pantry, "leche") == 5 and _stock(pantry, "huevos") == 6
+
+
+def test_later_lines_see_earlier_ones(pantry):
+    # The second removal only fits after the first line adds stock.
+    changed = asyncio.run(pantry.bulk_update_stock([
+        BulkStockUpdate(barcode="huevos", quantity=6),
+        BulkStockUpdate(barcode="huevos", quantity=-10),
+    ]))
+    assert changed[0].stock == 2
+    with pytest.raises(ValueError, match="Insufficient stock: huevos"):
+        asyncio.run(pantry.bulk_update_stock([
+            BulkStockUpdate(barcode="huevos", quantity=-2),
+            BulkStockUpdate(barcode="huevos", quantity=-1),
+        ]))
+    assert _stock(pantry, "huevos") == 2
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from app.charts import build_charts, bucket_means, lttb, trailing_mean
+
+
+def test_lttb_keeps_ends_and_spikes():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[437] = 50.0
+    y[812] = -30.0
+    picked = lttb(x, y, 50)
+    assert len(picked) == 50
+    assert picked[0] == 0 and picked[-1] == 999
+    assert 437 in picked and 812 in picked
+    assert np.all(np.diff(picked) > 0)
+
+
+def test_lttb_short_series_is_untouched():
+    x = np.arange(5, dtype=float)
+    assert list(lttb(x, x, 10)) == [0, 1, 2, 3, 4]
+    assert list(lttb(x, x, 2)) == [0, 1, 2, 3, 4]
+
+
+def test_bucket_means_keep_the_average():
+    values = np.arange(100, dtype=float)
+    idx, means = bucket_means(values, 10)
+    assert list(idx) == list(range(0, 100, 10))
+    assert means.mean() == pytest.approx(values.mean())
+
+
+def test_trailing_mean_uses_calendar_days():
+    # Days 1, 2 and 10: the 7-day window at day 10 only holds day 10.
+    days = np.array([1, 2, 10])
+    values = np.array([70.0, 72.0, 80.0])
+    assert list(trailing_mean(days, values, 7)) == [70.0, 71.0, 80.0]
+
+
+def test_build_charts_weight_average_starts_before_range():
+    weight_rows = [{"date": f"2025-03-0{d}", "weight": w} for d, w in ((1, 70.0), (5, 72.0), (8, 74.0))]
+    price_rows = [{"barcode": "a", "observed_at": "2025-03-01", "unit_price": 1.0},
+                  {"barcode": "a", "observed_at": "2025-03-08", "unit_price": 1.5}]
+    result = build_charts([{"date": "2025-03-08", "kcal": 2000}], weight_rows, price_rows, since="2025-03-05")
+    # 2025-03-01 only feeds the first average, it is not plotted.
+    assert [w["date"] for w in result["weight"]] == ["2025-03-05", "2025-03-08"]
+    assert result["weight"][0]["avg"] == 71.0
+    assert result["kcal_avg"] == 2000.0
+    assert result["price_summary"]["a"] == {"count": 2, "min": 1.0, "max": 1.5, "last": 1.5}
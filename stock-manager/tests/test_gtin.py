@@ -0,0 +1,39 @@
+from app.gtin import (
+    decode_variable_measure, ean_check_digit, gtin_candidates, is_valid_gtin, normalize_gtin,
+)
+
+
+def _ean13(body12):
+    return body12 + str(ean_check_digit(body12))
+
+
+def test_gtin_spellings_collapse():
+    assert is_valid_gtin("8436021419262")
+    assert normalize_gtin("08436021419262") == "8436021419262"
+    assert normalize_gtin(" 036000291452 ") == "0036000291452"
+    assert gtin_candidates("08436021419262")[:2] == ["08436021419262", "8436021419262"]
+
+
+def test_price_label():
+    code = _ean13("230281301250")
+    assert decode_variable_measure(code) == {
+        "prefix": "2302813", "value": 1250, "valid": True, "kind": "price", "price_eur": 12.5,
+    }
+
+
+def test_weight_label_from_configured_prefix():
+    code = _ean13("210281300874")
+    decoded = decode_variable_measure(code, weight_prefixes=("21", "22"))
+    assert decoded["kind"] == "weight"
+    assert decoded["weight_g"] == 874.0
+    assert "price_eur" not in decoded
+    # Same digits outside the configured ranges read as a price.
+    assert decode_variable_measure(code, weight_prefixes=("22",))["kind"] == "price"
+
+
+def test_bad_check_digit_is_flagged_and_other_codes_ignored():
+    code = _ean13("230281301250")
+    misread = code[:-1] + str((int(code[-1]) + 1) % 10)
+    assert decode_variable_measure(misread)["valid"] is False
+    assert decode_variable_measure("8436021419262") is None
+    assert decode_variable_measure("2302813") is None
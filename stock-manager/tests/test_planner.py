@@ -0,0 +1,87 @@
+import numpy as np
+
+from app.planner import DAYS, MEAL_IDS, build_pantry, meal_pools, plan_week
+
+GOALS = {"kcal": 2000, "proteins": 100, "carbs": 250, "fat": 70}
+
+
+def _recipes():
+    rng = np.random.default_rng(0)
+    recipes = []
+    for i in range(30):
+        recipes.append({
+            "id": i + 1,
+            "meal_types": [MEAL_IDS[i % len(MEAL_IDS)]],
+            "tags": [],
+            "kcal": float(rng.uniform(150, 700)),
+            "proteins": float(rng.uniform(5, 40)),
+            "carbs": float(rng.uniform(10, 80)),
+            "fat": float(rng.uniform(2, 30)),
+        })
+    return recipes
+
+
+def test_meal_pools_fall_back_to_everything():
+    recipes = [{"meal_types": ["cena"]}, {"meal_types": ["cena"]}, {"meal_types": ["cena"]},
+               {"meal_types": [], "tags": ["desayuno"]}]
+    pools = meal_pools(recipes)
+    assert list(pools["cena"]) == [0, 1, 2]
+    # Only one breakfast recipe: every recipe is a candidate.
+    assert list(pools["desayuno"]) == [0, 1, 2, 3]
+
+
+def test_same_seed_same_week():
+    a = plan_week(_recipes(), GOALS, seed=42)
+    b = plan_week(_recipes(), GOALS, seed=42)
+    assert a["days"] == b["days"] and a["seed"] == 42
+    assert len(a["days"]) == DAYS
+    by_id = {r["id"]: r for r in _recipes()}
+    for day in a["days"]:
+        assert set(day) == set(MEAL_IDS)
+        for meal, [rid] in day.items():
+            assert meal in by_id[rid]["meal_types"]
+
+
+def test_plan_beats_random_days():
+    recipes = _recipes()
+    plan = plan_week(recipes, GOALS, seed=1)
+    goals = np.array([GOALS[k] for k in ("kcal", "proteins", "carbs", "fat")], dtype=float)
+    macros = np.array([[r[k] for k in ("kcal", "proteins", "carbs", "fat")] for r in recipes])
+    pools = meal_pools(recipes)
+    rng = np.random.default_rng(5)
+    idx = np.column_stack([rng.choice(pools[m], size=500) for m in MEAL_IDS])
+    random_err = (((macros[idx].sum(axis=1) - goals) / goals) ** 2).sum(axis=1)
+    # The first day carries no repetition penalty, so its score is pure macro error.
+    assert plan["scores"][0] <= np.percentile(random_err, 1)
+
+
+def test_empty_recipe_book():
+    plan = plan_week([], GOALS, seed=3)
+    assert plan["days"] == [{} for _ in range(DAYS)] and plan["scores"] == []
+
+
+def test_build_pantry_tracks_soonest_expiry():
+    from datetime import date
+    pantry, barcodes = build_pantry(
+        [1, 2], [(1, "leche", 200.0), (2, "leche", 100.0), (2, "huevos", 2.0)],
+        [{"barcode": "leche", "stock": 1000, "earliest_expiry": "2025-03-05", "expiring_qty": 500},
+         {"barcode": "huevos", "stock": 6, "earliest_expiry": None, "expiring_qty": None}],
+        date(2025, 3, 3),
+    )
+    assert barcodes == ["huevos", "leche"]
+    assert pantry.req.tolist() == [[0.0, 200.0], [2.0, 100.0]]
+    assert pantry.days_left[1] == 2 and np.isinf(pantry.days_left[0])
+
+
+def test_pantry_mode_prefers_expiring_stock():
+    recipes = [dict(r, meal_types=[]) for r in _recipes()[:6]]
+    for r in recipes:
+        r.update(kcal=400.0, proteins=20.0, carbs=50.0, fat=14.0)
+    # Same macros everywhere: only the pantry terms tell recipes apart.
+    requirements = [(1, "yogur", 1.0)] + [(r["id"], "arroz", 100.0) for r in recipes[1:]]
+    budget = [{"barcode": "yogur", "stock": 2, "earliest_expiry": "2025-03-03", "expiring_qty": 2},
+              {"barcode": "arroz", "stock": 5000, "earliest_expiry": None, "expiring_qty": None}]
+    plan = plan_week(recipes, GOALS, seed=7, mode="pantry",
+                     requirements=requirements, budget=budget, start="2025-03-03")
+    assert any(1 in meal for meal in plan["days"][0].values())
+    assert plan["rescued"] == {"yogur": 2.0}
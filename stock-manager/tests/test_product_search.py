@@ -0,0 +1,31 @@
+import asyncio
+import sqlite3
+
+from app.models import ProductCreate
+
+
+def _names(db, query):
+    items, total = asyncio.run(db.search_products(query, limit=20, offset=0))
+    return sorted(p.name for p in items)
+
+
+def test_search_is_accent_and_case_insensitive(db):
+    for barcode, name in (("1", "Piña en almíbar"), ("2", "Leche entera"), ("3", "Pimiento")):
+        asyncio.run(db.create_product(ProductCreate(barcode=barcode, name=name, category="Alimentos")))
+    assert _names(db, "PINA") == ["Piña en almíbar"]
+    assert _names(db, "lech") == ["Leche entera"]
+
+
+def test_restart_repairs_a_drifted_index(db):
+    asyncio.run(db.create_product(ProductCreate(barcode="1", name="Leche entera", category="Lácteos")))
+    # Renamed behind the index's back: same row count, stale contents.
+    conn = sqlite3.connect(db.db_path)
+    conn.execute("DROP TRIGGER products_fts_au")
+    conn.execute("UPDATE products SET name = 'Yogur natural' WHERE barcode = '1'")
+    conn.commit()
+    conn.close()
+    assert _names(db, "yogur") == []
+
+    asyncio.run(db.init_db())
+    assert _names(db, "yogur") == ["Yogur natural"]
+    assert _names(db, "leche") == []
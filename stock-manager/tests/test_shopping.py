@@ -0,0 +1,98 @@
+import itertools
+import math
+import random
+
+import pytest
+
+from app.shopping import build_basket, cheapest_packs
+
+
+def _brute_force(need, offers):
+    """Cheapest covering cost by trying every pack count up to ceil(need/size)."""
+    best = math.inf
+    ranges = [range(math.ceil(need / size) + 1) for _, size, _ in offers]
+    for counts in itertools.product(*ranges):
+        if sum(k * size for k, (_, size, _) in zip(counts, offers)) >= need - 1e-9:
+            best = min(best, sum(k * price for k, (_, _, price) in zip(counts, offers)))
+    return best
+
+
+def test_small_need_buys_the_small_pack():
+    # The 1-pack is the dearest per unit but the cheapest buy for one unit.
+    offers = [('a', 12, 4.8), ('b', 6, 2.7), ('c', 3, 1.5), ('d', 1, 0.6)]
+    assert cheapest_packs(1, offers) == (pytest.approx(0.6), {'d': 1})
+
+
+def test_mixes_packs_when_cheaper():
+    # 7 units: one 6-pack plus one single beats two 6-packs or seven singles.
+    cost, counts = cheapest_packs(7, [('six', 6, 5.0), ('one', 1, 1.0)])
+    assert cost == pytest.approx(6.0)
+    assert counts == {'six': 1, 'one': 1}
+
+
+def test_same_size_keeps_cheaper_offer():
+    cost, counts = cheapest_packs(2, [('x', 1, 1.5), ('y', 1, 1.0)])
+    assert (cost, counts) == (pytest.approx(2.0), {'y': 2})
+
+
+def test_no_need_costs_nothing():
+    assert cheapest_packs(0, [('a', 6, 5.0)]) == (0, {})
+
+
+def test_matches_brute_force():
+    rng = random.Random(7)
+    for _ in range(300):
+        offers = [(str(j), rng.choice([1, 2, 3, 5, 6, 12]), round(rng.uniform(0.3, 9), 2))
+                  for j in range(rng.randint(1, 4))]
+        need = rng.randint(1, 30)
+        cost, counts = cheapest_packs(need, offers)
+        assert cost == pytest.approx(_brute_force(need, offers)), (need, offers)
+        sizes = {key: size for key, size, _ in offers}
+        assert sum(n * sizes[key] for key, n in counts.items()) >= need
+
+
+def test_unit_size_offers_stay_fast():
+    # Used to take seconds: no bound on the remaining need.
+    cost, counts = cheapest_packs(3000, [('a', 1, 1.0), ('b', 1, 1.01), ('c', 1, 1.02)])
+    assert cost == pytest.approx(3000.0)
+    assert counts == {'a': 3000}
+
+
+def _product(barcode, name, **kw):
+    row = {'barcode': barcode, 'name': name, 'category': 'Lácteos', 'unit_type': 'uds',
+           'serving_size': 1, 'weight_g': None, 'min_stock': 0, 'stock': 0,
+           'planned': 0, 'last_price': None}
+    row.update(kw)
+    return row
+
+
+def test_basket_groups_packs_of_the_same_product():
+    catalog = [
+        _product('m1', 'Leche entera', min_stock=2, stock=1, planned=8, last_price=1.0),
+        _product('m6', 'Leche  Entera', serving_size=6, last_price=5.0),
+    ]
+    basket = build_basket(catalog, {})
+    [line] = basket['lines']
+    assert line['needed'] == 9
+    assert line['cost'] == 8.0
+    assert {p['barcode']: p['packs'] for p in line['picks']} == {'m6': 1, 'm1': 3}
+    assert basket['total'] == 8.0 and basket['unpriced'] == 0
+
+
+def test_basket_prices_from_history_median_and_skips_covered():
+    catalog = [
+        _product('ar', 'Arroz', unit_type='g', weight_g=1000, planned=1200, stock=200),
+        _product('sal', 'Sal', unit_type='g', weight_g=500, min_stock=100, stock=300),
+    ]
+    basket = build_basket(catalog, {'ar': [1.2, 1.4, 1.0]})
+    [line] = basket['lines']
+    assert line['barcode'] == 'ar'
+    assert line['picks'][0]['price_source'] == 'price_history'
+    assert line['cost'] == 1.2
+
+
+def test_basket_without_prices_is_counted_unpriced():
+    basket = build_basket([_product('hu', 'Huevos', serving_size=12, min_stock=6)], {})
+    [line] = basket['lines']
+    assert line['packs'] == 1 and line['cost'] is None
+    assert basket['unpriced'] == 1 and basket['total'] == 0
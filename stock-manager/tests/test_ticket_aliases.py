@@ -0,0 +1,46 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.database import normalize_ticket_line
+from app.models import ProductCreate, TicketAliasLink
+
+
+@pytest.mark.parametrize("line, key", [
+    ("2 x LECHE DESN. PROT 1L 1,35", "leche desn prot 1l"),
+    ("LECHE DESN. PROT 1L", "leche desn prot 1l"),
+    ("PLATANO 1,250 kg 2,30", "platano"),
+    ("PLATANO 0,874 kg 1,92", "platano"),
+    ("QUESO 0,250 KG 3,10 €", "queso"),
+    ("1234 PIÑA EN ALMÍBAR", "pina en almibar"),
+    ("", ""),
+])
+def test_normalize_ticket_line(line, key):
+    assert normalize_ticket_line(line) == key
+
+
+def _alias(db, key):
+    conn = sqlite3.connect(db.db_path)
+    try:
+        return conn.execute("SELECT barcode, hits FROM ticket_aliases WHERE line_key = ?", (key,)).fetchone()
+    finally:
+        conn.close()
+
+
+def test_aliases_count_resolutions(db):
+    for barcode in ("platano", "banana"):
+        asyncio.run(db.create_product(ProductCreate(barcode=barcode, name=barcode, category="Fruta")))
+    asyncio.run(db.learn_ticket_aliases([TicketAliasLink(line="PLATANO 1,250 kg 2,30", barcode="platano")]))
+    assert _alias(db, "platano") == ("platano", 0)
+
+    resolved = asyncio.run(db.resolve_ticket_aliases(["PLATANO 0,874 kg 1,92", "PAN"]))
+    assert resolved == {"PLATANO 0,874 kg 1,92": "platano"}
+    asyncio.run(db.resolve_ticket_aliases(["PLATANO 1,1 kg"]))
+    assert _alias(db, "platano") == ("platano", 2)
+
+    # Re-confirming keeps the count; a different product restarts it.
+    asyncio.run(db.learn_ticket_aliases([TicketAliasLink(line="PLATANO", barcode="platano")]))
+    assert _alias(db, "platano") == ("platano", 2)
+    asyncio.run(db.learn_ticket_aliases([TicketAliasLink(line="PLATANO", barcode="banana")]))
+    assert _alias(db, "platano") == ("banana", 0)
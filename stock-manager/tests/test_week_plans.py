@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from app.database import diff_week_plans
+from app.models import DietPlanCreate
+
+MONDAY = "2025-03-03"
+
+
+def _row(id_, date, meal, recipe_id=None, barcode=None, name=None, quantity=1.0, consumed=0):
+    return {"id": id_, "date": date, "meal_type": meal, "recipe_id": recipe_id,
+            "product_barcode": barcode, "custom_name": name, "quantity": quantity,
+            "is_consumed": consumed}
+
+
+def test_diff_keeps_matching_rows_and_swaps_the_rest():
+    stored = [_row(1, MONDAY, "comida", recipe_id=7), _row(2, MONDAY, "cena", recipe_id=8)]
+    entries = [(MONDAY, "comida", 7, None, None, 1), (MONDAY, "cena", 9, None, None, 1.0)]
+    to_delete, to_insert = diff_week_plans(stored, entries)
+    assert to_delete == [2]
+    assert to_insert == [(MONDAY, "cena", 9, None, None, 1.0)]
+
+
+def test_diff_null_quantity_is_not_zero():
+    stored = [_row(1, MONDAY, "comida", name="Fuera", quantity=None)]
+    # Same entry with NULL quantity: kept, nothing rewritten.
+    assert diff_week_plans(stored, [(MONDAY, "comida", None, None, "Fuera", None)]) == ([], [])
+    # 0 is a different entry from NULL, and is inserted as 0 (not None).
+    assert diff_week_plans(stored, [(MONDAY, "comida", None, None, "Fuera", 0)]) == (
+        [1], [(MONDAY, "comida", None, None, "Fuera", 0)])
+
+
+def test_diff_counts_duplicates():
+    stored = [_row(1, MONDAY, "snack", barcode="yog"), _row(2, MONDAY, "snack", barcode="yog")]
+    entry = (MONDAY, "snack", None, "yog", None, 1.0)
+    assert diff_week_plans(stored, [entry]) == ([2], [])
+    assert diff_week_plans(stored, [entry] * 3) == ([], [entry])
+
+
+def test_replace_week_keeps_consumed_rows(db):
+    plans = [DietPlanCreate(date=MONDAY, meal_type="comida", custom_name="Lentejas"),
+             DietPlanCreate(date="2025-03-04", meal_type="cena", custom_name="Tortilla")]
+    saved = asyncio.run(db.replace_week_plans(MONDAY, plans))
+    lentejas = next(p for p in saved if p.custom_name == "Lentejas")
+    asyncio.run(db.update_diet_plan(lentejas.id, True))
+
+    plans[1] = DietPlanCreate(date="2025-03-04", meal_type="cena", custom_name="Pescado")
+    saved = asyncio.run(db.replace_week_plans(MONDAY, plans))
+    by_name = {p.custom_name: p for p in saved}
+    assert set(by_name) == {"Lentejas", "Pescado"}
+    assert by_name["Lentejas"].id == lentejas.id and by_name["Lentejas"].is_consumed
+
+
+def test_replace_week_rejects_dates_outside_the_week(db):
+    with pytest.raises(ValueError):
+        asyncio.run(db.replace_week_plans(MONDAY, [DietPlanCreate(date="2025-03-10", meal_type="comida")]))
+
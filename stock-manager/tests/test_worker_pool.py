@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+from app.worker_pool import WorkerPool
+
+
+class _UnstartableExecutor:
+    """submit() fails like a forkserver child still importing __main__."""
+
+    def submit(self, fn, *args):
+        raise RuntimeError("An attempt has been made to start a new process "
+                           "before the current process has finished its bootstrapping phase.")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def _boom():
+    raise RuntimeError("from fn")
+
+
+def test_unstartable_pool_falls_back_to_threads():
+    pool = WorkerPool()
+    pool._executor = _UnstartableExecutor()
+    assert asyncio.run(pool.run(sum, [1, 2, 3])) == 6
+    assert pool._executor is None and pool._disabled
+    # Later calls go straight to a thread.
+    assert asyncio.run(pool.run(max, [4, 9])) == 9
+
+
+def test_runtime_error_from_fn_is_not_swallowed():
+    pool = WorkerPool()
+    pool._disabled = True
+    with pytest.raises(RuntimeError, match="from fn"):
+        asyncio.run(pool.run(_boom))